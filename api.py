@@ -0,0 +1,243 @@
+"""API JSON do catálogo, só leitura: /api/v1/.
+
+Produtos, categorias e galerias para integrações (catálogo do WhatsApp, feeds de
+marketplaces, um app). Cada página de produtos é uma única consulta com a
+categoria e a galeria carregadas junto, paginada por cursor (keyset), e as
+respostas ficam num cache próprio com ETag forte: um consumidor que repete a
+mesma URL recebe 304 até o catálogo mudar.
+
+    GET /api/v1/produtos?limit=100&fields=id,name,price&updated_since=2026-10-01T00:00:00Z
+    GET /api/v1/produtos?cursor=<next_cursor da página anterior>
+    GET /api/v1/produtos/<id>
+    GET /api/v1/produtos/removidos?updated_since=2026-10-01T00:00:00Z
+    GET /api/v1/categorias
+"""
+import base64
+import json
+
+from flask import Blueprint, abort, jsonify, request, url_for
+from sqlalchemy.orm import joinedload
+from werkzeug.exceptions import HTTPException
+
+from catalog import CatalogCache, CATALOG_VERSION_FILE, cached_page, parse_utc_datetime
+from extensions import db
+from images import image_url
+from models import Category, DeletedProduct, Product
+
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+# Cache separado do das páginas HTML, para que um consumidor percorrendo milhares
+# de cursores não expulse as páginas do site
+API_CACHE_SIZE = 512
+
+api_cache = CatalogCache(CATALOG_VERSION_FILE, maxsize=API_CACHE_SIZE)
+api = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+PRODUCT_FIELDS = ('id', 'name', 'description', 'price', 'promo_price', 'is_featured', 'category_id',
+                  'category', 'image_url', 'images', 'url', 'updated_at')
+CATEGORY_FIELDS = ('id', 'name', 'url', 'updated_at')
+# Parâmetros que cada listagem lê: são a chave do cache e o que vai no link `next`
+PRODUCT_LIST_ARGS = ('fields', 'limit', 'categoria', 'destaque', 'updated_since', 'cursor')
+DELETED_LIST_ARGS = ('limit', 'updated_since', 'cursor')
+
+
+@api.errorhandler(HTTPException)
+def json_error(error):
+    """Erros da API em JSON, não na página HTML do site."""
+    response = jsonify(error=error.description, status=error.code)
+    response.status_code = error.code
+    return response
+
+
+def _isoformat(value):
+    return value.isoformat(timespec='seconds') + 'Z' if value else None
+
+
+def _parse_datetime(value, name):
+    """ISO 8601 (com Z ou fuso) para UTC sem fuso, como nas colunas DateTime."""
+    try:
+        return parse_utc_datetime(value)
+    except ValueError:
+        abort(400, f"'{name}' deve ser uma data ISO 8601, ex.: 2026-10-01T00:00:00Z")
+
+
+def requested_fields(allowed):
+    """Campos pedidos em `fields=` (o id sempre vai junto), ou todos."""
+    value = request.args.get('fields')
+    if not value:
+        return allowed
+    fields = {field.strip() for field in value.split(',') if field.strip()}
+    unknown = fields - set(allowed)
+    if unknown:
+        abort(400, f"Campos desconhecidos: {', '.join(sorted(unknown))}. Disponíveis: {', '.join(allowed)}")
+    return tuple(field for field in allowed if field in fields or field == 'id')
+
+
+def page_size():
+    limit = request.args.get('limit', API_PAGE_SIZE, type=int)
+    return max(1, min(limit, API_MAX_PAGE_SIZE))
+
+
+def next_page_url(endpoint, args, next_cursor):
+    """Link da próxima página com os mesmos parâmetros (só os que a listagem lê)."""
+    if not next_cursor:
+        return None
+    values = {name: request.args[name] for name in args if name in request.args}
+    return url_for(endpoint, **dict(values, cursor=next_cursor), _external=True)
+
+
+def encode_cursor(*values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token, types):
+    """Valores do cursor opaco devolvido em `next_cursor`, um de cada tipo de `types` (400 se for inválido)."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except ValueError:
+        values = None
+    # type() e não isinstance: true/false do JSON não servem como id
+    if (not isinstance(values, list) or len(values) != len(types)
+            or any(type(value) is not expected for value, expected in zip(values, types))):
+        abort(400, "Cursor inválido; use o next_cursor da página anterior.")
+    return values
+
+
+def serialize_product(product, fields):
+    data = {}
+    for field in fields:
+        if field in ('price', 'promo_price'):
+            value = getattr(product, field)
+            data[field] = str(value) if value is not None else None
+        elif field == 'category':
+            data[field] = product.category.name
+        elif field == 'image_url':
+            data[field] = image_url(product.image_file, external=True)
+        elif field == 'images':
+            data[field] = [image_url(image.image_filename, external=True) for image in product.images]
+        elif field == 'url':
+            data[field] = url_for('product_detail', product_id=product.id, _external=True)
+        elif field == 'updated_at':
+            data[field] = _isoformat(product.updated_at)
+        else:
+            data[field] = getattr(product, field)
+    return data
+
+
+def product_query(fields):
+    """Produtos com a categoria e a galeria no mesmo SELECT, só quando os campos pedem."""
+    query = Product.query
+    if 'category' in fields:
+        query = query.options(joinedload(Product.category))
+    if 'images' in fields:
+        query = query.options(joinedload(Product.images))
+    return query
+
+
+@api.route('/produtos')
+@cached_page(cache=api_cache, args=PRODUCT_LIST_ARGS)
+def list_products():
+    """Produtos em ordem de id; com `updated_since`, em ordem de alteração (sincronização incremental).
+
+    Na sincronização, o consumidor guarda o `updated_at` do último produto recebido
+    e o usa como `updated_since` na próxima vez: os produtos alterados naquele mesmo
+    instante vêm de novo, e nada se perde entre uma sincronização e outra.
+    """
+    fields = requested_fields(PRODUCT_FIELDS)
+    limit = page_size()
+    query = product_query(fields)
+    if request.args.get('categoria'):
+        query = query.filter(Product.category_id == request.args.get('categoria', type=int))
+    if request.args.get('destaque') == '1':
+        query = query.filter(Product.is_featured.is_(True))
+
+    updated_since = request.args.get('updated_since')
+    cursor = request.args.get('cursor')
+    if updated_since:
+        # O índice (updated_at, id) atende o filtro e a ordem
+        query = query.filter(Product.updated_at >= _parse_datetime(updated_since, 'updated_since'))
+        query = query.order_by(Product.updated_at, Product.id)
+        if cursor:
+            last_updated, last_id = decode_cursor(cursor, (str, int))
+            query = query.filter(db.tuple_(Product.updated_at, Product.id)
+                                 > (_parse_datetime(last_updated, 'cursor'), last_id))
+    else:
+        query = query.order_by(Product.id)
+        if cursor:
+            query = query.filter(Product.id > decode_cursor(cursor, (int,))[0])
+
+    # Um item a mais só para saber se existe uma próxima página
+    products = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(products) > limit:
+        last = products[limit - 1]
+        next_cursor = (encode_cursor(last.updated_at.isoformat(), last.id) if updated_since
+                       else encode_cursor(last.id))
+    return jsonify(
+        data=[serialize_product(product, fields) for product in products[:limit]],
+        next_cursor=next_cursor,
+        next=next_page_url('.list_products', PRODUCT_LIST_ARGS, next_cursor),
+    )
+
+
+@api.route('/produtos/removidos')
+@cached_page(cache=api_cache, args=DELETED_LIST_ARGS)
+def list_deleted_products():
+    """Ids dos produtos apagados, em ordem de remoção, para quem sincroniza por `updated_since`.
+
+    Use o mesmo `updated_since` da sincronização dos produtos. Um id que voltou a
+    existir (o SQLite pode reaproveitar o último id) não aparece aqui.
+    """
+    limit = page_size()
+    query = (db.session.query(DeletedProduct.product_id, DeletedProduct.deleted_at)
+             .filter(~db.exists().where(Product.id == DeletedProduct.product_id))
+             .order_by(DeletedProduct.deleted_at, DeletedProduct.product_id))
+    if request.args.get('updated_since'):
+        query = query.filter(DeletedProduct.deleted_at >= _parse_datetime(request.args['updated_since'], 'updated_since'))
+    if request.args.get('cursor'):
+        last_deleted, last_id = decode_cursor(request.args['cursor'], (str, int))
+        query = query.filter(db.tuple_(DeletedProduct.deleted_at, DeletedProduct.product_id)
+                             > (_parse_datetime(last_deleted, 'cursor'), last_id))
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        last_id, last_deleted = rows[limit - 1]
+        next_cursor = encode_cursor(last_deleted.isoformat(), last_id)
+    return jsonify(
+        data=[{'id': product_id, 'deleted_at': _isoformat(deleted_at)} for product_id, deleted_at in rows[:limit]],
+        next_cursor=next_cursor,
+        next=next_page_url('.list_deleted_products', DELETED_LIST_ARGS, next_cursor),
+    )
+
+
+@api.route('/produtos/<int:product_id>')
+@cached_page(cache=api_cache, args=('fields',))
+def get_product(product_id):
+    fields = requested_fields(PRODUCT_FIELDS)
+    product = product_query(fields).filter(Product.id == product_id).first()
+    if product is None:
+        abort(404, "Produto não encontrado.")
+    return jsonify(data=serialize_product(product, fields))
+
+
+@api.route('/categorias')
+@cached_page(cache=api_cache, args=('fields', 'updated_since'))
+def list_categories():
+    """Todas as categorias (são poucas), em ordem de id."""
+    fields = requested_fields(CATEGORY_FIELDS)
+    query = Category.query.order_by(Category.id)
+    if request.args.get('updated_since'):
+        query = query.filter(Category.updated_at >= _parse_datetime(request.args['updated_since'], 'updated_since'))
+    data = []
+    for category in query:
+        item = {}
+        for field in fields:
+            if field == 'url':
+                item[field] = url_for('category_page', category_id=category.id, _external=True)
+            elif field == 'updated_at':
+                item[field] = _isoformat(category.updated_at)
+            else:
+                item[field] = getattr(category, field)
+        data.append(item)
+    return jsonify(data=data, next_cursor=None, next=None)
@@ -1,234 +1,255 @@
+"""Site e painel: as rotas ficam aqui, em cima do app criado por `factory.create_app`.
+
+Este é o módulo carregado pelo gunicorn. Modelos, formulários, imagens, catálogo e
+senhas vivem em módulos próprios, que os comandos do `manage.py` importam sem
+carregar as rotas.
+"""
 import os
 import secrets
-from dotenv import load_dotenv
-from PIL import Image
-from flask import Flask, render_template, request, redirect, url_for, flash, session, make_response, jsonify
+import time
+from flask import render_template, request, redirect, url_for, flash, session, g, make_response, jsonify, abort, Response, stream_with_context, stream_template, send_from_directory
 from datetime import datetime, timedelta
-from flask_sqlalchemy import SQLAlchemy
-from flask_wtf import FlaskForm
-# Novo import para upload múltiplo
-from flask_wtf.file import FileField, FileAllowed, MultipleFileField
-from wtforms import StringField, TextAreaField, DecimalField, SubmitField, PasswordField, BooleanField, SelectField
-from wtforms.validators import DataRequired, Length, ValidationError, Optional
-from flask_bcrypt import Bcrypt
-from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user, login_required
-from flask import Flask, render_template, request, redirect, url_for, send_from_directory
-
-load_dotenv() # Carrega as variáveis de ambiente do arquivo .env
-
-app = Flask(__name__)
-
-# --- CONFIGURAÇÃO ---
-# Usa variáveis de ambiente para segurança e flexibilidade
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'uma-chave-secreta-padrao-para-desenvolvimento')
-
-# --- Configurações de Cookie para maior segurança e compatibilidade ---
-# Isso é crucial para que o login funcione corretamente em todos os navegadores,
-# especialmente em dispositivos móveis e em produção (HTTPS).
-app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
-app.config['REMEMBER_COOKIE_SAMESITE'] = 'Lax'
-
-# Em produção (como no Render), o tráfego é via HTTPS, então os cookies devem ser 'Secure'.
-if not app.debug:
-    app.config['SESSION_COOKIE_SECURE'] = True
-    app.config['REMEMBER_COOKIE_SECURE'] = True
-
-# Pega a URL do banco de dados do ambiente, com um fallback para o SQLite local
-database_url = os.environ.get('DATABASE_URL', 'sqlite:///suportesmart.db')
-
-# Garante que a URL do PostgreSQL seja compatível com o SQLAlchemy, pois alguns serviços usam "postgres://"
-if database_url.startswith("postgres://"):
-    database_url = database_url.replace("postgres://", "postgresql://", 1)
-
-app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-# Aumenta o tamanho máximo de upload para permitir várias imagens
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024 # 16 MB
-
-db = SQLAlchemy(app)
-bcrypt = Bcrypt(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
-login_manager.login_message_category = 'info'
-login_manager.login_message = 'Por favor, faça login para aceder a esta página.'
-
-# --- MODELOS DO BANCO DE DADOS ---
-@login_manager.user_loader
-def load_user(user_id):
-    return db.session.get(User, int(user_id))
-
-class User(db.Model, UserMixin):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(20), unique=True, nullable=False)
-    password = db.Column(db.String(60), nullable=False)
-
-class Category(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50), unique=True, nullable=False)
-    products = db.relationship('Product', backref='category', lazy=True)
-
-class Product(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    description = db.Column(db.Text, nullable=True) # Alterado para Text para descrições mais longas
-    price = db.Column(db.Numeric(10, 2), nullable=False)
-    promo_price = db.Column(db.Numeric(10, 2), nullable=True)
-    # Esta será a imagem principal/de capa
-    image_file = db.Column(db.String(100), nullable=False, default='placeholder.png')
-    is_featured = db.Column(db.Boolean, nullable=False, default=False)
-    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
-    # Relação com a nova tabela de imagens
-    images = db.relationship('ProductImage', backref='product', lazy=True, cascade="all, delete-orphan")
-
-# NOVA TABELA PARA A GALERIA DE IMAGENS
-class ProductImage(db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    image_filename = db.Column(db.String(100), nullable=False)
-    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+from decimal import Decimal
+from flask_login import login_user, logout_user, current_user, login_required
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import ObjectDeletedError
+import image_storage
+from catalog import (bump_catalog_version, cached_categories, cached_category, cached_catalog_page, category_stats,
+                     cached_featured_products, cached_page, cached_page_response, make_cached_page, catalog_cache,
+                     catalog_query, get_search_index, page_cache, refresh_related, reindex_product, related_products, unindex_product,
+                     iter_export, iter_export_rows, iter_gzip, parse_utc_datetime, EXPORT_FORMATS, PAGE_CACHE_MAX_AGE, SEARCH_RESULTS_LIMIT, SEARCH_SUGGESTIONS_LIMIT)
+from api import api
+from bulk_edit import (BulkChange, BulkEditError, Selection, apply_bulk_edit, preview_bulk_edit, recent_bulk_edits,
+                       selection_clauses, undo_bulk_edit)
+from sorteio import sorteio
+from extensions import db, login_manager, metrics
+from factory import create_app
+from forms import ProductForm, BulkEditForm, ImageUploadForm, LoginForm, UserForm, CategoryForm
+from images import (audit_pictures, delete_picture, discard_uploads, image_dhash, image_srcset, image_srcsets, image_url,
+                    process_uploads, purge_quarantine, quarantine_orphans, restore_quarantine, save_picture,
+                    IMAGE_SIMILARITY_BITS, QUARANTINE_DAYS, QUARANTINE_DIR)
+from models import User, Category, DeletedProduct, Product, ProductImage, Cart, utcnow
+from passwords import (PasswordBusy, hash_password, verify_password, login_retry_after, login_failed, login_succeeded,
+                       prepare_dummy_hash)
+from sqlite_tuning import is_busy_error, retry_on_busy
+
+app = create_app()
+
+# Token opcional para o Prometheus ler /admin/metrics sem login
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Derivados responsivos das imagens (veja images.py), usados nos templates
+app.add_template_global(image_srcset)
+app.add_template_global(image_srcsets)
+app.add_template_global(image_url)
+
+# API JSON do catálogo (/api/v1/), veja api.py
+app.register_blueprint(api)
+# Páginas e inscrições do sorteio (/sorteio/), veja sorteio.py
+app.register_blueprint(sorteio)
+
 
 # --- PROCESSADOR DE CONTEXTO ---
 @app.context_processor
 def inject_context():
-    all_categories = Category.query.order_by(Category.name).all()
-    cart = session.get('cart', {})
-    # Usamos .get('quantity', 0) para segurança caso a estrutura do item seja inesperada
-    cart_item_count = sum(item.get('quantity', 0) for item in cart.values())
-    return dict(all_categories=all_categories, cart_item_count=cart_item_count)
-
-
-# --- FORMULÁRIOS ---
-class ProductForm(FlaskForm):
-    name = StringField('Nome do Produto', validators=[DataRequired(), Length(min=2, max=100)])
-    description = TextAreaField('Descrição')
-    price = DecimalField('Preço (ex: 1299.90)', validators=[DataRequired()])
-    promo_price = DecimalField('Preço Promocional (Opcional)', validators=[Optional()])
-    # Este campo agora só atualiza a imagem principal
-    picture = FileField('Atualizar Imagem Principal', validators=[FileAllowed(['jpg', 'png', 'jpeg'])])
-    category = SelectField('Categoria', coerce=int, validators=[DataRequired()])
-    is_featured = BooleanField('Marcar como Destaque')
-    submit = SubmitField('Salvar Produto')
-
-# NOVO FORMULÁRIO PARA UPLOAD MÚLTIPLO
-class ImageUploadForm(FlaskForm):
-    pictures = MultipleFileField('Adicionar Imagens', validators=[DataRequired(), FileAllowed(['jpg', 'png', 'jpeg'])])
-    submit = SubmitField('Enviar Imagens')
-
-class LoginForm(FlaskForm):
-    username = StringField('Utilizador', validators=[DataRequired()])
-    password = PasswordField('Senha', validators=[DataRequired()])
-    remember = BooleanField('Lembrar de mim')
-    submit = SubmitField('Entrar')
-
-class UserForm(FlaskForm):
-    username = StringField('Nome de Usuário', validators=[DataRequired(), Length(min=4, max=20)])
-    password = PasswordField('Senha', validators=[DataRequired(), Length(min=6)])
-    submit = SubmitField('Adicionar Usuário')
-
-    def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user:
-            raise ValidationError('Este nome de usuário já está em uso. Por favor, escolha outro.')
-
-class CategoryForm(FlaskForm):
-    name = StringField('Nome da Categoria', validators=[DataRequired(), Length(min=2, max=50)])
-    submit = SubmitField('Salvar Categoria')
-
-    def validate_name(self, name):
-        # Garante que a validação não ocorra num formulário já preenchido
-        if request.endpoint == 'edit_category' and request.method == 'GET':
-            return
-        category = Category.query.filter_by(name=name.data).first()
-        if category:
-            raise ValidationError('Essa categoria já existe. Por favor, escolha um nome diferente.')
-
-
-# --- FUNÇÃO HELPER PARA SALVAR IMAGENS ---
-def save_picture(form_picture):
-    random_hex = secrets.token_hex(8)
-    _, f_ext = os.path.splitext(form_picture.filename)
-    picture_fn = random_hex + f_ext
-    picture_path = os.path.join(app.root_path, 'static/product_pics', picture_fn)
-    output_size = (800, 800)
-    i = Image.open(form_picture)
-    i.thumbnail(output_size)
-    i.save(picture_path)
-    return picture_fn
-
-def delete_picture(filename):
-    """Apaga um arquivo de imagem da pasta static/product_pics."""
-    # Não apagar a imagem padrão
-    if filename and filename != 'placeholder.png':
-        try:
-            picture_path = os.path.join(app.root_path, 'static/product_pics', filename)
-            if os.path.exists(picture_path):
-                os.remove(picture_path)
-        except Exception as e:
-            # Em um app de produção, seria bom logar este erro
-            print(f"Erro ao apagar a imagem {filename}: {e}")
+    # A sessão não é lida aqui de propósito: as páginas públicas ficam em cache e
+    # não podem depender do usuário. O contador do carrinho vem do cookie 'cart_count'.
+    all_categories = cached_categories()
+    return dict(all_categories=all_categories, category_stats=category_stats)
 
 
 # --- ROTAS DO SITE PÚBLICO ---
 @app.route('/')
+@cached_page
 def home():
-    products = Product.query.filter_by(is_featured=True).order_by(Product.id.desc()).all()
+    products = cached_featured_products()
     return render_template('index.html', products=products)
 
 @app.route('/loja')
+@cached_page(args=('cursor',))
 def loja():
-    products = Product.query.order_by(Product.id.desc()).all()
-    return render_template('loja.html', products=products, title="Nossa Loja")
+    products, next_cursor = cached_catalog_page(cursor=request.args.get('cursor', type=int))
+    return render_template('loja.html', products=products, next_cursor=next_cursor, title="Nossa Loja")
 
 @app.route('/categoria/<int:category_id>')
+@cached_page(args=('cursor',))
 def category_page(category_id):
-    category = db.get_or_404(Category, category_id)
-    return render_template('loja.html', products=category.products, title=f"Categoria: {category.name}", category=category)
+    category = cached_category(category_id)
+    if category is None:
+        abort(404)
+    products, next_cursor = cached_catalog_page(category.id, request.args.get('cursor', type=int))
+    return render_template('loja.html', products=products, next_cursor=next_cursor, title=f"Categoria: {category.name}", category=category)
+
+@app.route('/loja/produtos')
+def catalog_fragment():
+    """Próxima página do catálogo em JSON, usada pelo botão "Carregar mais"."""
+    products, next_cursor = cached_catalog_page(request.args.get('categoria', type=int), request.args.get('cursor', type=int))
+    html = render_template('_product_list.html', products=products)
+    return jsonify(html=html, next_cursor=next_cursor)
 
 @app.route('/produto/<int:product_id>')
+@cached_page
 def product_detail(product_id):
     # .get_or_404 é a melhor forma de buscar: ele retorna o produto
     # ou mostra uma página de erro 404 (Não Encontrado) automaticamente.
     product = Product.query.get_or_404(product_id)
 
-    # Lógica para o botão "Voltar" inteligente
-    referrer = request.referrer
-    # Define um URL de retorno padrão para a seção de loja na página inicial
-    back_url = url_for('home', _anchor='loja')
-
-    # Se o usuário veio da página da loja ou de uma categoria, usamos esse URL de referência
-    if referrer and ('/loja' in referrer or '/categoria/' in referrer):
-        back_url = referrer
+    # O botão "Voltar" inteligente é resolvido no navegador (document.referrer),
+    # para que a página seja a mesma para todos e possa ficar em cache.
+    return render_template("product_detail.html", title=product.name, product=product,
+                           related=related_products(product.id))
+
+# --- SITEMAP ---
+# O sitemap é gerado em streaming a partir de updated_at (então o <lastmod> só muda
+# quando o produto muda de verdade) e fica no cache do catálogo até a próxima
+# alteração. Acima de 50 mil URLs (limite do protocolo) vira um índice de sitemaps.
+SITE_URL = "https://www.suportesmartparagominas.com.br"
+SITEMAP_MAX_URLS = 50000
+SITEMAP_CHUNK_SIZE = 64 * 1024
+
+def _lastmod(value):
+    return value.date().isoformat() if value else None
+
+def _sitemap_layout():
+    """Quantos produtos cabem no primeiro sitemap (que também leva as páginas fixas e as
+    categorias) e quantos sitemaps há; fica no cache do catálogo até a próxima alteração."""
+    def load():
+        category_count = db.session.scalar(db.select(db.func.count(Category.id)))
+        product_count = db.session.scalar(db.select(db.func.count(Product.id)))
+        first_shard_products = max(0, SITEMAP_MAX_URLS - 2 - category_count)
+        extra_shards = max(0, -(-(product_count - first_shard_products) // SITEMAP_MAX_URLS))
+        return first_shard_products, 1 + extra_shards
+    return catalog_cache.get_or_load(('sitemap_layout',), load)
+
+def _product_id_at(offset):
+    """Id do produto na posição `offset` (em ordem de id), ou None se passar do fim."""
+    return db.session.scalar(db.select(Product.id).order_by(Product.id).offset(offset).limit(1))
+
+def iter_sitemap_pages(shard, first_shard_products):
+    """URLs de um sitemap (com lastmod e imagens), lidas do banco em blocos."""
+    if shard == 0:
+        catalog_lastmod = _lastmod(db.session.scalar(db.select(db.func.max(Product.updated_at))))
+        yield {'loc': f"{SITE_URL}/", 'lastmod': catalog_lastmod, 'images': ()}
+        yield {'loc': f"{SITE_URL}/loja", 'lastmod': catalog_lastmod, 'images': ()}
+        for category_id, updated_at in db.session.execute(db.select(Category.id, Category.updated_at).order_by(Category.id)):
+            yield {'loc': f"{SITE_URL}/categoria/{category_id}", 'lastmod': _lastmod(updated_at), 'images': ()}
+        start_offset, limit = 0, first_shard_products
+    else:
+        start_offset, limit = first_shard_products + (shard - 1) * SITEMAP_MAX_URLS, SITEMAP_MAX_URLS
+
+    # Faixa de ids deste sitemap, resolvida com duas consultas pontuais
+    start_id = _product_id_at(start_offset)
+    if start_id is None:
+        return
+    end_id = _product_id_at(start_offset + limit)
+    id_range = [Product.id >= start_id] + ([Product.id < end_id] if end_id else [])
+    image_range = [ProductImage.product_id >= start_id] + ([ProductImage.product_id < end_id] if end_id else [])
+
+    products = db.session.execute(
+        db.select(Product.id, Product.image_file, Product.updated_at).where(*id_range).order_by(Product.id)
+        .execution_options(yield_per=1000)
+    )
+    # A galeria vem numa segunda consulta, na mesma ordem, e é "intercalada" com os produtos
+    gallery = db.session.execute(
+        db.select(ProductImage.product_id, ProductImage.image_filename).where(*image_range)
+        .order_by(ProductImage.product_id, ProductImage.id).execution_options(yield_per=1000)
+    )
+    pending = next(gallery, None)
+    for product_id, image_file, updated_at in products:
+        images = [image_file] if image_file and image_file != 'placeholder.png' else []
+        while pending is not None and pending[0] <= product_id:
+            if pending[0] == product_id:
+                images.append(pending[1])
+            pending = next(gallery, None)
+        yield {
+            'loc': f"{SITE_URL}/produto/{product_id}",
+            'lastmod': _lastmod(updated_at),
+            'images': [SITE_URL + url_for('static', filename='product_pics/' + name) for name in images],
+        }
 
-    return render_template("product_detail.html", title=product.name, product=product, back_url=back_url)
+def _buffered(chunks, size=SITEMAP_CHUNK_SIZE):
+    """Junta os pedacinhos gerados pelo Jinja em blocos maiores antes de enviar."""
+    buffer, length = [], 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield ''.join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+def streamed_xml(key, render):
+    """Serve um XML do cache; se não estiver lá, envia em streaming e guarda ao terminar."""
+    version = page_cache.version()
+    page = page_cache.get(key)
+    if page is not None:
+        return cached_page_response(page)
+
+    def generate():
+        parts = []
+        for chunk in _buffered(render()):
+            parts.append(chunk)
+            yield chunk
+        page_cache.set(key, make_cached_page(''.join(parts).encode('utf-8'), 'application/xml'), version)
+
+    response = Response(stream_with_context(generate()), mimetype='application/xml')
+    response.cache_control.public = True
+    response.cache_control.max_age = PAGE_CACHE_MAX_AGE
+    return response
 
 @app.route('/sitemap.xml')
 def sitemap():
-    """Gera o sitemap.xml para o site com o domínio correto."""
-    
-    # Define a URL base oficial do site
-    base_url = "https://www.suportesmartparagominas.com.br"
-    
-    pages = []
-    last_mod = datetime.now().date().isoformat()
-
-    # Páginas estáticas
-    pages.append({'loc': f"{base_url}/", 'lastmod': last_mod})
-    pages.append({'loc': f"{base_url}/loja", 'lastmod': last_mod})
-
-    # Páginas de produtos
-    products = Product.query.all()
-    for product in products:
-        pages.append({'loc': f"{base_url}/produto/{product.id}", 'lastmod': last_mod})
-
-    # Páginas de categorias
-    categories = Category.query.all()
-    for category in categories:
-        pages.append({'loc': f"{base_url}/categoria/{category.id}", 'lastmod': last_mod})
-
-    sitemap_template = render_template('sitemap.xml', pages=pages)
-    response = make_response(sitemap_template)
-    response.headers["Content-Type"] = "application/xml"
-    return response
+    """Gera o sitemap.xml para o site com o domínio correto (ou o índice, se for grande demais)."""
+    def render():
+        first_shard_products, shard_count = _sitemap_layout()
+        if shard_count > 1:
+            lastmod = _lastmod(db.session.scalar(db.select(db.func.max(Product.updated_at))))
+            sitemaps = [{'loc': f"{SITE_URL}/sitemap-{shard}.xml", 'lastmod': lastmod} for shard in range(shard_count)]
+            return stream_template('sitemap_index.xml', sitemaps=sitemaps)
+        return stream_template('sitemap.xml', pages=iter_sitemap_pages(0, first_shard_products))
+    return streamed_xml(('sitemap', None), render)
+
+@app.route('/sitemap-<int:shard>.xml')
+def sitemap_shard(shard):
+    """Sitemap filho do índice, com até SITEMAP_MAX_URLS URLs."""
+    first_shard_products, shard_count = _sitemap_layout()
+    if shard_count == 1 and shard == 0:
+        # Com um sitemap só, ele é o próprio /sitemap.xml
+        return redirect(url_for('sitemap'), 301)
+    if shard >= shard_count:
+        abort(404)
+    pages = iter_sitemap_pages(shard, first_shard_products)
+    return streamed_xml(('sitemap', shard), lambda: stream_template('sitemap.xml', pages=pages))
+
+@app.route('/busca')
+@cached_page(args=('q',))
+def search():
+    query = request.args.get('q', '').strip()
+    product_ids = get_search_index().search(query, limit=SEARCH_RESULTS_LIMIT) if query else []
+    products = []
+    if product_ids:
+        found = {p.id: p for p in catalog_query().filter(Product.id.in_(product_ids))}
+        # Mantém a ordem de relevância devolvida pelo índice
+        products = [found[product_id] for product_id in product_ids if product_id in found]
+    return render_template('busca.html', products=products, query=query, title=f"Busca: {query}" if query else "Busca")
+
+@app.route('/busca/sugestoes')
+def search_suggestions():
+    """Sugestões em JSON para a busca enquanto se digita."""
+    query = request.args.get('q', '').strip()
+    index = get_search_index()
+    suggestions = []
+    for product_id in index.search(query, limit=SEARCH_SUGGESTIONS_LIMIT) if query else []:
+        doc = index.document(product_id)
+        suggestions.append({
+            'id': product_id,
+            'name': doc['name'],
+            'url': url_for('product_detail', product_id=product_id),
+            'image': image_url(doc['image_file'], 96),
+        })
+    return jsonify(query=query, suggestions=suggestions)
 
 @app.route('/robots.txt')
 def robots_txt():
@@ -239,69 +260,191 @@ def robots_txt():
 def debug_route():
     return "<h1>Atualizacao do sitemap - Teste final.</h1>"
 
+# --- CARRINHO NO SERVIDOR ---
+# O cookie 'cart_id' leva só um id aleatório; os itens ficam na tabela cart. Assim
+# o cookie de sessão não cresce a cada produto e os preços nunca ficam velhos: a
+# página do carrinho relê todos os produtos do banco numa única consulta.
+# Cada alteração é gravada com um UPDATE condicional no updated_at lido; se outra
+# requisição (outra aba, um clique duplo) gravou o carrinho no meio tempo, ele é
+# relido e a alteração aplicada de novo, e nenhum item se perde.
+CART_COOKIE = 'cart_id'
+CART_MAX_AGE = timedelta(days=30)
+CART_SWEEP_INTERVAL = 3600 # segundos entre limpezas de carrinhos expirados, por worker
+CART_UPDATE_RETRIES = 5
+_last_cart_sweep = None
+
+def get_cart(create=False):
+    """Carrinho do visitante atual (ou None), carregado uma vez por requisição."""
+    if 'cart' not in g:
+        cart_id = request.cookies.get(CART_COOKIE)
+        g.cart = db.session.get(Cart, cart_id) if cart_id else None
+        legacy = session.pop('cart', None) if 'cart' in session else None
+        if legacy:
+            # Carrinho antigo, guardado no cookie de sessão: passa para o servidor
+            g.cart = g.cart or Cart(id=secrets.token_urlsafe(32), items={})
+            def merge(items):
+                for product_id, item in legacy.items():
+                    items[product_id] = items.get(product_id, 0) + item.get('quantity', 0)
+            update_cart(merge)
+    if g.cart is None and create:
+        g.cart = Cart(id=secrets.token_urlsafe(32), items={})
+    return g.cart
+
+def cart_items():
+    return dict(g.cart.items) if g.get('cart') else {}
+
+def update_cart(change):
+    """Aplica `change(items)` (que altera o dict recebido) ao carrinho de `g.cart` e grava.
+
+    Marca a resposta para renovar os cookies e devolve os itens gravados.
+    """
+    cart = g.cart
+    for _ in range(CART_UPDATE_RETRIES):
+        items = dict(cart.items)
+        change(items)
+        if not sa_inspect(cart).persistent:
+            # Carrinho novo: o id é aleatório, então ninguém mais o grava
+            cart.items = items
+            cart.updated_at = utcnow()
+            db.session.add(cart)
+            db.session.commit()
+            break
+        seen = cart.updated_at
+        # Sempre um valor novo, mesmo que o relógio não tenha andado desde a última gravação
+        now = max(utcnow(), seen + timedelta(microseconds=1))
+        result = db.session.execute(
+            db.update(Cart).where(Cart.id == cart.id, Cart.updated_at == seen).values(items=items, updated_at=now)
+            .execution_options(synchronize_session=False))
+        if result.rowcount:
+            db.session.commit()
+            break
+        # Outra requisição gravou (ou a limpeza apagou) o carrinho: relê e tenta de novo
+        db.session.rollback()
+        try:
+            db.session.refresh(cart)
+        except ObjectDeletedError:
+            db.session.expunge(cart)
+            cart = g.cart = Cart(id=cart.id, items={})
+    else:
+        abort(409)
+    g.cart_saved = True
+    sweep_expired_carts()
+    return items
+
+def sweep_expired_carts():
+    """Apaga, de tempos em tempos, os carrinhos parados há mais de CART_MAX_AGE."""
+    global _last_cart_sweep
+    if _last_cart_sweep is not None and time.monotonic() - _last_cart_sweep < CART_SWEEP_INTERVAL:
+        return
+    _last_cart_sweep = time.monotonic()
+    try:
+        db.session.execute(db.delete(Cart).where(Cart.updated_at < utcnow() - CART_MAX_AGE))
+        db.session.commit()
+    except OperationalError as error:
+        db.session.rollback()
+        if not is_busy_error(error):
+            raise
+        _last_cart_sweep = None # Banco ocupado: tenta de novo no próximo carrinho salvo
+
+def cart_item_count(items):
+    return sum(items.values())
+
+@app.after_request
+def sync_cart_cookies(response):
+    """Renova o cookie do carrinho e o 'cart_count' (lido pelo JavaScript do cabeçalho)."""
+    if g.get('cart_saved'):
+        secure = app.config.get('SESSION_COOKIE_SECURE', False)
+        response.set_cookie(CART_COOKIE, g.cart.id, max_age=CART_MAX_AGE,
+                            secure=secure, httponly=True, samesite='Lax')
+        response.set_cookie('cart_count', str(cart_item_count(g.cart.items)),
+                            max_age=CART_MAX_AGE, secure=secure, samesite='Lax')
+    return response
+
+def _quantity(value, default=1):
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        return default
+
+
 # --- ROTAS DO CARRINHO DE COMPRAS ---
 @app.route('/carrinho/adicionar/<int:product_id>', methods=['POST'])
+@retry_on_busy
 def add_to_cart(product_id):
-    product = Product.query.get_or_404(product_id)
-    cart = session.get('cart', {})
-    
-    try:
-        quantity = int(request.form.get('quantity', 1))
-        if quantity < 1:
-            quantity = 1
-    except (ValueError, TypeError):
-        quantity = 1
+    product = db.get_or_404(Product, product_id)
+    quantity = max(_quantity(request.form.get('quantity', 1)), 1)
 
+    get_cart(create=True)
     product_id_str = str(product_id)
-
-    if product_id_str in cart:
-        cart[product_id_str]['quantity'] += quantity
-    else:
-        cart[product_id_str] = {
-            'quantity': quantity,
-            'name': product.name,
-            'price': float(product.promo_price if product.promo_price else product.price),
-            'image': product.image_file
-        }
-    
-    session['cart'] = cart
-    session.modified = True
-    
-    # Calcula a nova contagem de itens no carrinho
-    cart_item_count = sum(item.get('quantity', 0) for item in cart.values())
+    def add(items):
+        items[product_id_str] = items.get(product_id_str, 0) + quantity
+    items = update_cart(add)
 
     # Retorna uma resposta JSON para ser processada pelo JavaScript no front-end
     return jsonify(success=True, 
                    message=f'"{product.name}" foi adicionado ao seu carrinho!', 
-                   cart_item_count=cart_item_count)
+                   cart_item_count=cart_item_count(items))
 
 @app.route('/carrinho')
+@retry_on_busy
 def view_cart():
-    cart = session.get('cart', {})
-    total_price = sum(item['quantity'] * item['price'] for item in cart.values())
-    return render_template('cart.html', title="Carrinho de Compras", cart=cart, total_price=total_price)
+    get_cart()
+    items = cart_items()
+    # Revalida todos os itens com uma única consulta (IN) e preços atuais em Decimal
+    products = {}
+    if items:
+        ids = [int(product_id) for product_id in items]
+        products = {p.id: p for p in Product.query.filter(Product.id.in_(ids))}
+
+    lines = {}
+    total_price = Decimal('0')
+    for product_id, quantity in items.items():
+        product = products.get(int(product_id))
+        if product is None:
+            continue
+        price = product.promo_price if product.promo_price else product.price
+        lines[product_id] = {
+            'quantity': quantity,
+            'name': product.name,
+            'price': price,
+            'image': product.image_file,
+            'subtotal': price * quantity,
+        }
+        total_price += price * quantity
+
+    if len(lines) < len(items):
+        # Produtos apagados do catálogo saem do carrinho
+        missing = set(items) - set(lines)
+        def drop_missing(items):
+            for product_id in missing:
+                items.pop(product_id, None)
+        update_cart(drop_missing)
+        flash('Alguns produtos não estão mais disponíveis e foram removidos do seu carrinho.', 'warning')
+    return render_template('cart.html', title="Carrinho de Compras", cart=lines, total_price=total_price)
 
 @app.route('/carrinho/atualizar/<string:product_id>', methods=['POST'])
+@retry_on_busy
 def update_cart_item(product_id):
-    cart = session.get('cart', {})
-    if product_id in cart:
-        quantity = int(request.form.get('quantity', 1))
-        if quantity > 0:
-            cart[product_id]['quantity'] = quantity
-        else: # Remove if quantity is 0 or less
-            del cart[product_id]
-    session['cart'] = cart
-    session.modified = True
+    get_cart()
+    if product_id in cart_items():
+        def set_quantity(items):
+            if product_id not in items:
+                return
+            quantity = _quantity(request.form.get('quantity', 1), default=items[product_id])
+            if quantity > 0:
+                items[product_id] = quantity
+            else: # Remove if quantity is 0 or less
+                del items[product_id]
+        update_cart(set_quantity)
     return redirect(url_for('view_cart'))
 
 @app.route('/carrinho/remover/<string:product_id>', methods=['POST'])
+@retry_on_busy
 def remove_from_cart(product_id):
-    cart = session.get('cart', {})
-    if product_id in cart:
-        del cart[product_id]
+    get_cart()
+    if product_id in cart_items():
         # flash('Produto removido do carrinho.', 'success') # Mensagem removida conforme solicitado
-    session['cart'] = cart
-    session.modified = True
+        update_cart(lambda items: items.pop(product_id, None))
     return redirect(url_for('view_cart'))
 
 
@@ -311,15 +454,31 @@ def login():
     if current_user.is_authenticated:
         return redirect(url_for('admin_dashboard'))
     form = LoginForm()
+    status, retry_after = 200, None
     if form.validate_on_submit():
-        user = User.query.filter_by(username=form.username.data).first()
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
-            login_user(user, remember=form.remember.data)
-            next_page = request.args.get('next')
-            return redirect(next_page) if next_page else redirect(url_for('admin_dashboard'))
+        retry_after = login_retry_after(form.username.data)
+        if retry_after:
+            status = 429
+            flash(f'Muitas tentativas de login. Tente de novo em {retry_after} segundos.', 'danger')
         else:
-            flash('Login falhou. Verifique o utilizador e a senha.', 'danger')
-    return render_template('login.html', title='Login', form=form)
+            user = User.query.filter_by(username=form.username.data).first()
+            try:
+                ok = verify_password(user, form.password.data)
+            except PasswordBusy:
+                ok, status, retry_after = False, 503, 1
+                flash('O servidor está ocupado. Tente de novo em alguns segundos.', 'warning')
+            if ok:
+                login_succeeded(form.username.data)
+                login_user(user, remember=form.remember.data)
+                next_page = request.args.get('next')
+                return redirect(next_page) if next_page else redirect(url_for('admin_dashboard'))
+            elif status == 200:
+                login_failed(form.username.data)
+                flash('Login falhou. Verifique o utilizador e a senha.', 'danger')
+    response = make_response(render_template('login.html', title='Login', form=form), status)
+    if retry_after:
+        response.headers['Retry-After'] = str(retry_after)
+    return response
 
 @app.route('/logout')
 def logout():
@@ -331,17 +490,79 @@ def logout():
 @app.route('/admin')
 @login_required
 def admin_dashboard():
-    """Página principal do painel administrativo."""
-    products = Product.query.order_by(Product.id.desc()).all()
-    return render_template('admin_dashboard.html', products=products, title="Painel de Produtos")
+    """Página principal do painel administrativo, com o filtro e a edição em massa."""
+    name, category_id, featured = request.args.get('q', ''), request.args.get('categoria', type=int), request.args.get('destaque', '')
+    products = catalog_query().filter(*selection_clauses(_product_filter(name, category_id, featured))).all()
+    form = _bulk_edit_form(where_name=name, where_category=category_id, where_featured=featured)
+    return render_template('admin_dashboard.html', products=products, form=form, bulk_edits=recent_bulk_edits(5),
+                           filters=dict(q=name, categoria=category_id, destaque=featured), title="Painel de Produtos")
+
+def _product_filter(name, category_id, featured):
+    """Seleção do filtro do painel: parte do nome, categoria e destaque ('1', '0' ou vazio)."""
+    return Selection(category_id=category_id or None, featured={'1': True, '0': False}.get(featured),
+                     name=(name or '').strip() or None, everything=True)
+
+def _bulk_edit_form(**kwargs):
+    form = BulkEditForm(**kwargs)
+    form.category.choices = [(0, 'Não alterar')] + [(c.id, c.name) for c in cached_categories()]
+    return form
+
+# EDIÇÃO EM MASSA: pré-visualiza (SELECT com os novos valores) e, confirmada, aplica
+# num único UPDATE (veja bulk_edit.py)
+@app.route('/admin/produtos/em-massa', methods=['POST'])
+@login_required
+@retry_on_busy
+def bulk_edit_products():
+    form = _bulk_edit_form()
+    filters = dict(q=form.where_name.data or None, categoria=form.where_category.data, destaque=form.where_featured.data or None)
+    if not form.validate_on_submit():
+        for errors in form.errors.values():
+            flash(' '.join(errors), 'warning')
+        return redirect(url_for('admin_dashboard', **filters))
+    if form.scope.data == 'selected':
+        selection = Selection(ids=form.ids.data or [])
+    else:
+        selection = _product_filter(form.where_name.data, form.where_category.data, form.where_featured.data)
+    try:
+        change = BulkChange(
+            price_mode=form.price_mode.data or None, price=form.price_value.data,
+            promo_mode=form.promo_mode.data or None, promo=form.promo_value.data,
+            featured={'1': True, '0': False}.get(form.featured.data), category_id=form.category.data,
+        )
+        if form.apply.data:
+            edit = apply_bulk_edit(selection, change, current_user.username)
+            flash(f'{edit.product_count} produto(s) alterado(s) de uma vez ({edit.description}). '
+                  'Se precisar, desfaça em "Últimas edições em massa".', 'success')
+            return redirect(url_for('admin_dashboard', **filters))
+        preview = preview_bulk_edit(selection, change)
+    except BulkEditError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('admin_dashboard', **filters))
+    return render_template('admin_bulk_edit.html', form=form, preview=preview, change=change, filters=filters,
+                           title="Edição em Massa")
+
+@app.route('/admin/produtos/em-massa/<int:edit_id>/desfazer', methods=['POST'])
+@login_required
+@retry_on_busy
+def undo_bulk_edit_products(edit_id):
+    try:
+        edit, restored, skipped = undo_bulk_edit(edit_id)
+    except BulkEditError as e:
+        flash(str(e), 'warning')
+        return redirect(url_for('admin_dashboard'))
+    flash(f'Edição em massa desfeita: {restored} produto(s) voltaram aos valores de antes.', 'success')
+    if skipped:
+        flash(f'{skipped} produto(s) não voltaram: foram alterados depois da edição ou a categoria antiga já não existe.', 'warning')
+    return redirect(url_for('admin_dashboard'))
 
 # ROTA ADICIONAR PRODUTO
 @app.route('/admin/produto/adicionar', methods=['GET', 'POST'])
 @login_required
+@retry_on_busy
 def add_product():
     """Adiciona um novo produto ao banco de dados."""
     form = ProductForm()
-    form.category.choices = [(c.id, c.name) for c in Category.query.order_by('name').all()]
+    form.category.choices = [(c.id, c.name) for c in cached_categories()]
     if form.validate_on_submit():
         new_product = Product(
             name=form.name.data,
@@ -353,9 +574,14 @@ def add_product():
         )
         if form.picture.data:
             new_product.image_file = save_picture(form.picture.data)
+            if new_product.image_file is None:
+                new_product.image_file = 'placeholder.png'
+                flash('A imagem enviada não pôde ser lida; o produto ficou com a imagem padrão.', 'warning')
         
         db.session.add(new_product)
         db.session.commit()
+        refresh_related(new_product.id)
+        reindex_product(new_product)
         flash('Produto adicionado! Agora pode adicionar mais imagens na galeria.', 'success')
         return redirect(url_for('manage_gallery', product_id=new_product.id))
     return render_template('add_edit_product.html', title='Adicionar Novo Produto', form=form)
@@ -363,16 +589,20 @@ def add_product():
 # ROTA EDITAR PRODUTO
 @app.route('/admin/produto/editar/<int:product_id>', methods=['GET', 'POST'])
 @login_required
+@retry_on_busy
 def edit_product(product_id):
     """Edita um produto existente."""
     product = db.get_or_404(Product, product_id)
     form = ProductForm(obj=product)
-    form.category.choices = [(c.id, c.name) for c in Category.query.order_by('name').all()]
+    form.category.choices = [(c.id, c.name) for c in cached_categories()]
     if form.validate_on_submit():
         old_image = product.image_file
         if form.picture.data:
-            delete_picture(old_image)
-            product.image_file = save_picture(form.picture.data)
+            new_image = save_picture(form.picture.data)
+            if new_image:
+                product.image_file = new_image
+            else:
+                flash('A imagem enviada não pôde ser lida; a imagem atual foi mantida.', 'warning')
         product.name = form.name.data
         product.description = form.description.data
         product.price = form.price.data
@@ -380,6 +610,10 @@ def edit_product(product_id):
         product.is_featured = form.is_featured.data
         product.category_id = form.category.data
         db.session.commit()
+        if product.image_file != old_image:
+            delete_picture(old_image)
+        refresh_related(product.id)
+        reindex_product(product)
         flash('Produto atualizado com sucesso!', 'success')
         return redirect(url_for('admin_dashboard'))
     
@@ -389,36 +623,68 @@ def edit_product(product_id):
 # ROTA APAGAR PRODUTO
 @app.route('/admin/produto/apagar/<int:product_id>', methods=['POST'])
 @login_required
+@retry_on_busy
 def delete_product(product_id):
     """Apaga um produto e todas as suas imagens associadas."""
     product = db.get_or_404(Product, product_id)
-    
-    # Apagar imagem principal do sistema de arquivos
-    delete_picture(product.image_file)
-    
-    # Apagar imagens da galeria do sistema de arquivos
-    for image in product.images:
-        delete_picture(image.image_filename)
-        
+    # Imagem principal e da galeria: os arquivos só saem do disco depois do commit,
+    # e apenas os que nenhum outro produto usa
+    filenames = {product.image_file} | {image.image_filename for image in product.images}
+
     db.session.delete(product)
+    # Aviso para quem sincroniza pela API (/api/v1/produtos/removidos)
+    db.session.merge(DeletedProduct(product_id=product_id, deleted_at=utcnow()))
     db.session.commit()
+    for filename in filenames:
+        delete_picture(filename)
+    refresh_related(product_id)
+    unindex_product(product_id)
     flash('Produto e todas as suas imagens foram apagados!', 'danger')
     return redirect(url_for('admin_dashboard'))
 
 # NOVA ROTA: GERIR GALERIA DE IMAGENS
 @app.route('/admin/produto/galeria/<int:product_id>', methods=['GET', 'POST'])
 @login_required
+@retry_on_busy
 def manage_gallery(product_id):
     """Página para gerir a galeria de imagens de um produto."""
     product = db.get_or_404(Product, product_id)
     form = ImageUploadForm()
     if form.validate_on_submit():
-        for pic in form.pictures.data:
-            filename = save_picture(pic)
-            new_image = ProductImage(image_filename=filename, product_id=product.id)
-            db.session.add(new_image)
-        db.session.commit()
-        flash('Imagens adicionadas à galeria com sucesso!', 'success')
+        existing = [product.image_file] + [image.image_filename for image in product.images]
+        fingerprints = [(name, image_dhash(name)) for name in existing]
+        added, invalid, repeated, similar = 0, 0, 0, []
+        for result in process_uploads(form.pictures.data):
+            if result is None:
+                invalid += 1
+                continue
+            filename, fingerprint, _ = result
+            if any(filename == name for name, _ in fingerprints):
+                repeated += 1
+                continue
+            if IMAGE_SIMILARITY_BITS and fingerprint is not None and any(
+                    other is not None and bin(fingerprint ^ other).count('1') <= IMAGE_SIMILARITY_BITS
+                    for _, other in fingerprints):
+                similar.append(result)
+                continue
+            db.session.add(ProductImage(image_filename=filename, product_id=product.id))
+            fingerprints.append((filename, fingerprint))
+            added += 1
+        if added:
+            # A galeria entra no sitemap do produto, então conta como alteração dele
+            product.updated_at = utcnow()
+            db.session.commit()
+            bump_catalog_version()
+            flash(f'{added} imagem(ns) adicionada(s) à galeria com sucesso!', 'success')
+        # Fotos quase iguais às do produto não entram; apaga os arquivos que este envio
+        # gravou, se ninguém os usa
+        discard_uploads(similar)
+        if repeated:
+            flash(f'{repeated} imagem(ns) ignorada(s): já estão neste produto.', 'warning')
+        if similar:
+            flash(f'{len(similar)} imagem(ns) ignorada(s): muito parecidas com outra foto do produto.', 'warning')
+        if invalid:
+            flash(f'{invalid} arquivo(s) ignorado(s): não são imagens válidas.', 'warning')
         return redirect(url_for('manage_gallery', product_id=product.id))
     
     return render_template('manage_gallery.html', title='Gerir Galeria', product=product, form=form)
@@ -426,21 +692,24 @@ def manage_gallery(product_id):
 # NOVA ROTA: APAGAR IMAGEM DA GALERIA
 @app.route('/admin/imagem/apagar/<int:image_id>', methods=['POST'])
 @login_required
+@retry_on_busy
 def delete_image(image_id):
     """Apaga uma imagem específica da galeria de um produto."""
     image = db.get_or_404(ProductImage, image_id)
-    product_id = image.product_id
-    # Apagar o arquivo físico da imagem
-    delete_picture(image.image_filename)
-    
+    product_id, filename = image.product_id, image.image_filename
+    image.product.updated_at = utcnow()
     db.session.delete(image)
     db.session.commit()
+    # Apagar o arquivo físico da imagem (se nenhum outro produto a usa)
+    delete_picture(filename)
+    bump_catalog_version()
     flash('Imagem apagada da galeria.', 'danger')
     return redirect(url_for('manage_gallery', product_id=product_id))
 
 # ROTAS DE CATEGORIA
 @app.route('/admin/categorias', methods=['GET', 'POST'])
 @login_required
+@retry_on_busy
 def admin_categories():
     """Página para gerir as categorias de produtos."""
     form = CategoryForm()
@@ -448,6 +717,7 @@ def admin_categories():
         new_category = Category(name=form.name.data)
         db.session.add(new_category)
         db.session.commit()
+        bump_catalog_version()
         flash('Categoria adicionada com sucesso!', 'success')
         return redirect(url_for('admin_categories'))
     
@@ -456,27 +726,99 @@ def admin_categories():
 
 @app.route('/admin/categoria/apagar/<int:category_id>', methods=['POST'])
 @login_required
+@retry_on_busy
 def delete_category(category_id):
     """Apaga uma categoria, se ela não tiver produtos associados."""
     category = db.get_or_404(Category, category_id)
-    product_count = len(category.products)
-    if product_count > 0:
+    # EXISTS no banco em vez de carregar todos os produtos da categoria
+    if db.session.query(db.exists().where(Product.category_id == category.id)).scalar():
+        # A contagem vem das estatísticas em cache (as mesmas da lista de categorias)
+        product_count = category_stats(category.id).products
         flash(f'Não pode apagar "{category.name}", pois ela contém {product_count} produto(s). Mova-os para outra categoria primeiro.', 'warning')
         return redirect(url_for('admin_categories'))
         
     db.session.delete(category)
     db.session.commit()
+    bump_catalog_version()
     flash(f'Categoria "{category.name}" apagada com sucesso!', 'danger')
     return redirect(url_for('admin_categories'))
 
+@app.route('/admin/exportar')
+@login_required
+def export_catalog():
+    """Baixa o catálogo em CSV ou NDJSON (opcionalmente gzip), gerado em streaming."""
+    fmt = request.args.get('formato', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        abort(400)
+    use_gzip = request.args.get('gzip') == '1'
+    since = None
+    if request.args.get('desde'):
+        # Só os produtos criados ou alterados desde a data (ISO 8601, UTC)
+        try:
+            since = parse_utc_datetime(request.args['desde'])
+        except ValueError:
+            abort(400)
+    chunks = iter_export(iter_export_rows(request.args.get('apos_id', type=int), since), fmt)
+    filename = f"produtos_{datetime.now():%Y%m%d_%H%M%S}.{fmt}"
+    if use_gzip:
+        chunks = iter_gzip(chunks)
+        filename += '.gz'
+    response = Response(stream_with_context(chunks), mimetype='application/gzip' if use_gzip else EXPORT_FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@app.route('/admin/armazenamento', methods=['GET', 'POST'])
+@login_required
+def admin_storage():
+    """Auditoria de static/product_pics: arquivos faltando, órfãos e quarentena."""
+    if request.method == 'POST':
+        action = request.form.get('action')
+        if action == 'quarentena':
+            _, moved = quarantine_orphans(audit_pictures())
+            flash(f'{moved} arquivo(s) órfão(s) movido(s) para a quarentena.', 'success' if moved else 'info')
+        elif action == 'restaurar':
+            batch = request.form.get('lote', '')
+            if batch not in {name for name, _, _ in image_storage.quarantine_batches(QUARANTINE_DIR)}:
+                abort(404)
+            flash(f'{restore_quarantine(batch)} arquivo(s) restaurado(s) do lote {batch}.', 'success')
+        elif action == 'esvaziar':
+            purged = purge_quarantine()
+            flash(f'{len(purged)} lote(s) com mais de {QUARANTINE_DAYS} dias apagado(s) da quarentena.', 'danger' if purged else 'info')
+        return redirect(url_for('admin_storage'))
+
+    report = audit_pictures()
+    largest = report.largest_products()
+    # A lista de arquivos faltando pode ser enorme depois de uma importação ruim
+    missing = report.missing[:100]
+    ids = {product_id for product_id, _ in largest} | {product_id for product_id, _ in missing}
+    names = dict(db.session.execute(db.select(Product.id, Product.name).where(Product.id.in_(ids))).all())
+    return render_template('admin_storage.html', title='Armazenamento de Imagens', report=report,
+                           largest=largest, missing=missing, names=names, quarantine=image_storage.quarantine_batches(QUARANTINE_DIR),
+                           quarantine_days=QUARANTINE_DAYS)
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    """Métricas de todos os workers no formato do Prometheus (login ou METRICS_TOKEN)."""
+    token = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if not current_user.is_authenticated and not (METRICS_TOKEN and secrets.compare_digest(token, METRICS_TOKEN)):
+        return login_manager.unauthorized()
+    response = Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+    response.cache_control.no_store = True
+    return response
+
 # --- ROTAS DE GESTÃO DE USUÁRIOS ---
 @app.route('/admin/usuarios', methods=['GET', 'POST'])
 @login_required
+@retry_on_busy
 def admin_users():
     """Página para gerir os usuários administradores."""
     form = UserForm()
     if form.validate_on_submit():
-        hashed_password = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        try:
+            hashed_password = hash_password(form.password.data)
+        except PasswordBusy:
+            flash('O servidor está ocupado. Tente de novo em alguns segundos.', 'warning')
+            return redirect(url_for('admin_users'))
         new_user = User(username=form.username.data, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
@@ -488,6 +830,7 @@ def admin_users():
 
 @app.route('/admin/usuario/apagar/<int:user_id>', methods=['POST'])
 @login_required
+@retry_on_busy
 def delete_user(user_id):
     """Apaga um usuário administrador."""
     user_to_delete = db.get_or_404(User, user_id)
@@ -505,5 +848,32 @@ def delete_user(user_id):
     flash(f'Usuário "{user_to_delete.username}" apagado com sucesso!', 'danger')
     return redirect(url_for('admin_users'))
 
+# --- AQUECIMENTO ---
+# Rotas pedidas antes do primeiro cliente: montam o índice de busca, as páginas em
+# cache e compilam os templates. Com `gunicorn --preload` isso roda uma vez no
+# processo mestre e os workers herdam tudo pronto (veja gunicorn.conf.py).
+WARM_UP_PATHS = ('/', '/loja', '/busca/sugestoes?q=a')
+
+def warm_up():
+    """Prepara caches e templates; devolve o tempo gasto em segundos."""
+    if not app.config['WARM_UP']:
+        return 0.0
+    started = time.perf_counter()
+    for name in app.jinja_env.list_templates(extensions=('html', 'xml')):
+        app.jinja_env.get_template(name)
+    client = app.test_client()
+    for path in WARM_UP_PATHS:
+        response = client.get(path)
+        # Uma falha aqui (ex.: banco ainda sem migrações) só gera um aviso; o app sobe mesmo assim
+        if response.status_code >= 500:
+            app.logger.warning("Aquecimento: %s respondeu %d", path, response.status_code)
+    # O hash usado nos logins de usuários que não existem fica pronto antes da primeira tentativa
+    prepare_dummy_hash()
+    # As requisições do aquecimento não entram nas métricas
+    metrics.reset()
+    elapsed = time.perf_counter() - started
+    app.logger.info("Aquecimento concluído em %.0f ms", elapsed * 1000)
+    return elapsed
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,336 @@
+"""Edição em massa de produtos: preço, promoção, destaque e categoria de uma vez.
+
+Os produtos são escolhidos pelos ids (os marcados no painel) ou por um filtro
+(categoria, destaque, parte do nome), e a alteração é um único UPDATE, numa
+transação, com os novos valores calculados pelo banco (ex.: `price = round(price *
+1.10, 2)`). A pré-visualização é um SELECT com essas mesmas expressões, então
+mostra exatamente o que o UPDATE vai gravar, e só os produtos que de fato mudam
+são alterados (os outros não ganham um updated_at novo).
+
+Na mesma transação do UPDATE, os valores de antes de cada produto alterado ficam
+guardados em product_bulk_edit, e `undo_bulk_edit` os devolve. Produtos mexidos
+de novo depois da edição (no painel, por outra edição em massa ainda valendo,
+pela importação) ficam como estão: desfazer não apaga o que veio depois.
+
+Usado pelo painel (/admin) e pelo `python manage.py bulk`.
+"""
+from collections import namedtuple
+from datetime import datetime
+from decimal import Decimal
+
+from sqlalchemy import Boolean, Integer, Numeric, and_, bindparam, case, false, func, literal, null, or_, select, update
+from sqlalchemy.orm import defer
+
+from catalog import bump_catalog_version, update_related
+from extensions import db
+from models import Category, Product, ProductBulkEdit, utcnow
+
+# Linhas mostradas na pré-visualização (os totais são contados à parte)
+PREVIEW_ROWS = 200
+# Ids por IN (...) ao desfazer
+UNDO_BATCH = 500
+CENTS = Decimal('0.01')
+MONEY = Numeric(10, 2)
+# Fator dos ajustes percentuais, com folga de casas antes do arredondamento
+FACTOR = Numeric(12, 6)
+
+
+class BulkEditError(Exception):
+    """Seleção vazia, alteração inválida ou que deixaria algum preço inconsistente."""
+
+
+# Quais produtos: os ids, ou os que passam em todos os filtros informados. Sem
+# ids nem filtros, só com everything=True (o catálogo inteiro, de propósito)
+Selection = namedtuple('Selection', 'ids category_id featured name everything',
+                       defaults=(None, None, None, None, False))
+
+Preview = namedtuple('Preview', 'rows matched changed conflicts')
+PreviewRow = namedtuple('PreviewRow', 'id name price new_price promo_price new_promo_price '
+                                      'is_featured new_is_featured category new_category conflict')
+
+
+def selection_clauses(selection):
+    """Condições do WHERE para a seleção; sem ids nem filtros, nenhuma (todos os produtos)."""
+    if selection.ids is not None:
+        return [Product.id.in_(sorted(set(selection.ids)))]
+    clauses = []
+    if selection.category_id:
+        clauses.append(Product.category_id == selection.category_id)
+    if selection.featured is not None:
+        clauses.append(Product.is_featured.is_(selection.featured))
+    if selection.name:
+        clauses.append(Product.name.icontains(selection.name, autoescape=True))
+    return clauses
+
+
+def describe_selection(selection):
+    if selection.ids is not None:
+        return f"{len(set(selection.ids))} produto(s) marcado(s)"
+    parts = []
+    if selection.category_id:
+        category = db.session.get(Category, selection.category_id)
+        parts.append(f'categoria "{category.name if category else selection.category_id}"')
+    if selection.featured is not None:
+        parts.append('em destaque' if selection.featured else 'fora dos destaques')
+    if selection.name:
+        parts.append(f'nome com "{selection.name}"')
+    return ', '.join(parts) or 'todo o catálogo'
+
+
+class BulkChange:
+    """O que muda nos produtos escolhidos; cada parte é opcional (None: não muda).
+
+    `price_mode` 'set' grava `price` como o novo preço e 'percent' ajusta o preço
+    em `price` por cento (negativo para baixar). `promo_mode` 'set' grava `promo`,
+    'percent' põe a promoção `promo` por cento abaixo do preço (do novo preço, se
+    ele também mudar) e 'clear' remove a promoção. Valores inválidos levantam
+    BulkEditError.
+    """
+
+    def __init__(self, price_mode=None, price=None, promo_mode=None, promo=None, featured=None, category_id=None):
+        if price_mode not in (None, 'set', 'percent') or promo_mode not in (None, 'set', 'percent', 'clear'):
+            raise BulkEditError(f"Operação desconhecida: {price_mode or promo_mode!r}.")
+        self.price_mode, self.promo_mode = price_mode, promo_mode
+        self.price = self._check(price_mode, price, "o preço", "ajuste do preço")
+        self.promo = self._check(promo_mode, promo, "o preço promocional", "desconto da promoção")
+        if price_mode == 'percent' and self.price <= -100:
+            raise BulkEditError("O preço não pode baixar 100% ou mais.")
+        if promo_mode == 'percent' and not 0 < self.promo < 100:
+            raise BulkEditError("O desconto da promoção deve ficar entre 0% e 100%.")
+        self.featured = featured
+        self.category_id = category_id or None
+        if not (price_mode or promo_mode or featured is not None or self.category_id):
+            raise BulkEditError("Escolha pelo menos uma alteração.")
+
+    @staticmethod
+    def _check(mode, value, amount_label, percent_label):
+        if mode is None or mode == 'clear':
+            return None
+        if value is None:
+            raise BulkEditError(f"Informe {'o ' + percent_label if mode == 'percent' else amount_label}.")
+        value = Decimal(value)
+        if mode == 'set':
+            value = value.quantize(CENTS)
+            if value <= 0:
+                raise BulkEditError(f"{amount_label.capitalize()} deve ser maior que zero.")
+        elif value == 0:
+            raise BulkEditError(f"O {percent_label} não pode ser 0%.")
+        return value
+
+    @property
+    def touches_prices(self):
+        return self.price_mode is not None or self.promo_mode is not None
+
+    def describe(self):
+        parts = []
+        if self.price_mode == 'set':
+            parts.append(f"preço R$ {_money(self.price)}")
+        elif self.price_mode == 'percent':
+            parts.append(f"preço {self.price:+g}%")
+        if self.promo_mode == 'set':
+            parts.append(f"promoção R$ {_money(self.promo)}")
+        elif self.promo_mode == 'percent':
+            parts.append(f"promoção {self.promo:g}% abaixo do preço")
+        elif self.promo_mode == 'clear':
+            parts.append("sem promoção")
+        if self.featured is not None:
+            parts.append("em destaque" if self.featured else "fora dos destaques")
+        if self.category_id:
+            category = db.session.get(Category, self.category_id)
+            parts.append(f'para a categoria "{category.name if category else self.category_id}"')
+        return ', '.join(parts)
+
+    def new_values(self):
+        """{coluna: expressão do novo valor} das colunas que mudam, para o UPDATE e o SELECT."""
+        values = {}
+        price = Product.price
+        if self.price_mode == 'set':
+            price = values['price'] = literal(self.price, MONEY)
+        elif self.price_mode == 'percent':
+            factor = literal(1 + self.price / 100, FACTOR)
+            price = values['price'] = func.round(Product.price * factor, 2, type_=MONEY)
+        if self.promo_mode == 'set':
+            values['promo_price'] = literal(self.promo, MONEY)
+        elif self.promo_mode == 'percent':
+            factor = literal(1 - self.promo / 100, FACTOR)
+            values['promo_price'] = func.round(price * factor, 2, type_=MONEY)
+        elif self.promo_mode == 'clear':
+            values['promo_price'] = null()
+        if self.featured is not None:
+            values['is_featured'] = literal(self.featured, Boolean)
+        if self.category_id:
+            values['category_id'] = literal(self.category_id, Integer)
+        return values
+
+
+def _money(value):
+    return f"{value:.2f}".replace('.', ',')
+
+
+def _prepare(selection, change):
+    """(WHERE da seleção, novos valores, condição "o produto muda", condição "preço inconsistente")."""
+    where = selection_clauses(selection)
+    if selection.ids is not None and not selection.ids:
+        raise BulkEditError("Nenhum produto marcado.")
+    if not where and not selection.everything:
+        raise BulkEditError("Escolha os produtos: pelos ids ou por um filtro (ou o catálogo inteiro, de propósito).")
+    if change.category_id and db.session.get(Category, change.category_id) is None:
+        raise BulkEditError(f"A categoria {change.category_id} não existe.")
+    values = change.new_values()
+    changed = or_(*(getattr(Product, column).is_distinct_from(value) for column, value in values.items()))
+    conflict = false()
+    if change.touches_prices:
+        # Preço zerado pelo arredondamento, ou promoção que não fica abaixo do preço
+        new_price = values.get('price', Product.price)
+        new_promo = values.get('promo_price', Product.promo_price)
+        conflict = or_(new_price <= 0, and_(new_promo.is_not(None), or_(new_promo <= 0, new_promo >= new_price)))
+    return where, values, changed, conflict
+
+
+def preview_bulk_edit(selection, change, limit=PREVIEW_ROWS):
+    """O que a edição faria, sem gravar: as primeiras `limit` linhas de antes/depois e os totais.
+
+    Preview.matched conta os produtos da seleção, .changed os que mudariam e
+    .conflicts os que ficariam com um preço inconsistente (e impedem a edição).
+    """
+    where, values, changed, conflict = _prepare(selection, change)
+    matched, changed_count, conflicts = db.session.execute(
+        select(func.count(), func.sum(case((changed, 1), else_=0)),
+               func.sum(case((and_(changed, conflict), 1), else_=0)))
+        .select_from(Product).where(*where)).one()
+    new_category = db.session.get(Category, change.category_id).name if change.category_id else None
+    rows = db.session.execute(
+        select(Product.id, Product.name,
+               Product.price, values.get('price', Product.price),
+               Product.promo_price, values.get('promo_price', Product.promo_price),
+               Product.is_featured, values.get('is_featured', Product.is_featured),
+               Category.name, conflict)
+        .join(Product.category).where(*where, changed)
+        # Os inconsistentes primeiro, para aparecerem mesmo numa seleção grande
+        .order_by(case((conflict, 0), else_=1), Product.id.desc()).limit(limit))
+    rows = [PreviewRow(*row[:9], new_category or row[8], bool(row[9])) for row in rows]
+    return Preview(rows, matched, changed_count or 0, conflicts or 0)
+
+
+def apply_bulk_edit(selection, change, username=None):
+    """Aplica a edição num único UPDATE e guarda o snapshot para desfazer; devolve o ProductBulkEdit."""
+    where, values, changed, conflict = _prepare(selection, change)
+    # Os valores de antes, lidos na mesma transação (no PostgreSQL, com as linhas
+    # travadas até o commit)
+    rows = db.session.execute(
+        select(Product.id, Product.price, Product.promo_price, Product.is_featured, Product.category_id,
+               Product.updated_at, conflict)
+        .where(*where, changed).with_for_update()).all()
+    conflicts = sum(1 for row in rows if row[6])
+    if conflicts:
+        db.session.rollback()
+        raise BulkEditError(f"{conflicts} produto(s) ficariam com o preço zerado ou com a promoção igual "
+                            "ou acima do preço. Ajuste a alteração ou tire-os da seleção.")
+    if not rows:
+        db.session.rollback()
+        raise BulkEditError("Nenhum produto da seleção mudaria com essa alteração.")
+    now = utcnow()
+    db.session.execute(update(Product).where(*where, changed).values(**values, updated_at=now)
+                       .execution_options(synchronize_session=False))
+    edit = ProductBulkEdit(
+        created_at=now,
+        username=username,
+        description=f"{describe_selection(selection)}: {change.describe()}"[:255],
+        product_count=len(rows),
+        snapshot=[[product_id, str(price), None if promo_price is None else str(promo_price), is_featured, category_id,
+                   updated_at.isoformat() if updated_at else None]
+                  for product_id, price, promo_price, is_featured, category_id, updated_at, _ in rows],
+    )
+    db.session.add(edit)
+    db.session.commit()
+    # Destaque não entra na similaridade; preço e categoria entram
+    if change.touches_prices or change.category_id:
+        update_related([row[0] for row in rows])
+    bump_catalog_version()
+    return edit
+
+
+def undo_bulk_edit(edit_id=None):
+    """Devolve os valores de antes de uma edição (sem id: a última ainda não desfeita).
+
+    Só volta os produtos que continuam como a edição os deixou e cuja categoria
+    antiga ainda existe. "Como a edição os deixou" é o updated_at igual ao da
+    edição, ou o de um "desfazer" de uma edição posterior que devolveu o produto
+    a esse estado: desfazer a edição 2 e depois a 1 restaura os dois passos. O
+    desfazer grava um updated_at novo (e não o antigo) para que a sincronização
+    da API por `updated_since` veja os valores devolvidos. Devolve (edição,
+    restaurados, ignorados).
+    """
+    if edit_id is None:
+        edit = db.session.scalars(select(ProductBulkEdit).where(ProductBulkEdit.undone_at.is_(None))
+                                  .order_by(ProductBulkEdit.id.desc()).limit(1)).first()
+        if edit is None:
+            raise BulkEditError("Nenhuma edição em massa para desfazer.")
+    else:
+        edit = db.session.get(ProductBulkEdit, edit_id)
+        if edit is None:
+            raise BulkEditError(f"A edição em massa {edit_id} não existe.")
+    if edit.undone_at is not None:
+        raise BulkEditError(f"A edição em massa {edit.id} já foi desfeita.")
+
+    # {momento em que uma edição posterior foi desfeita: {id: updated_at de antes dela}}
+    undone_later = {}
+    for later in db.session.scalars(select(ProductBulkEdit).where(
+            ProductBulkEdit.id > edit.id, ProductBulkEdit.undone_at.is_not(None))):
+        undone_later[later.undone_at] = {row[0]: datetime.fromisoformat(row[5])
+                                         for row in later.snapshot if len(row) > 5 and row[5]}
+
+    def as_left_by_edit(product_id, stamp):
+        # Segue os "desfazer" posteriores até chegar ao updated_at da edição (os
+        # updated_at de antes de cada edição só diminuem, então o laço termina)
+        while stamp != edit.created_at:
+            stamp = undone_later.get(stamp, {}).get(product_id)
+            if stamp is None:
+                return False
+        return True
+
+    snapshot = {row[0]: row for row in edit.snapshot}
+    product_ids = sorted(snapshot)
+    categories = set(db.session.scalars(select(Category.id)))
+    current = {}
+    for start in range(0, len(product_ids), UNDO_BATCH):
+        for row in db.session.execute(
+                select(Product.id, Product.price, Product.promo_price, Product.category_id, Product.updated_at)
+                .where(Product.id.in_(product_ids[start:start + UNDO_BATCH]))):
+            if as_left_by_edit(row[0], row[4]):
+                current[row[0]] = tuple(row)
+    restore = [{
+        'b_id': product_id,
+        'b_price': Decimal(price),
+        'b_promo_price': None if promo_price is None else Decimal(promo_price),
+        'b_is_featured': is_featured,
+        'b_category_id': category_id,
+        'b_seen': current[product_id][4],
+    } for product_id, price, promo_price, is_featured, category_id, *_ in snapshot.values()
+        if product_id in current and category_id in categories]
+
+    now = utcnow()
+    if restore:
+        table = Product.__table__
+        # Cada linha só muda se o updated_at ainda for o lido acima
+        db.session.execute(
+            update(table)
+            .where(table.c.id == bindparam('b_id'), table.c.updated_at == bindparam('b_seen'))
+            .values(price=bindparam('b_price'), promo_price=bindparam('b_promo_price'),
+                    is_featured=bindparam('b_is_featured'), category_id=bindparam('b_category_id'), updated_at=now),
+            restore)
+    edit.undone_at = now
+    db.session.commit()
+    if restore:
+        related = [row['b_id'] for row in restore
+                   if current[row['b_id']][1:4] != (row['b_price'], row['b_promo_price'], row['b_category_id'])]
+        if related:
+            update_related(related)
+        bump_catalog_version()
+    return edit, len(restore), len(snapshot) - len(restore)
+
+
+def recent_bulk_edits(limit=10):
+    """As últimas edições em massa, sem carregar os snapshots."""
+    return (ProductBulkEdit.query.options(defer(ProductBulkEdit.snapshot))
+            .order_by(ProductBulkEdit.id.desc()).limit(limit).all())
@@ -0,0 +1,521 @@
+"""Catálogo: cache por versão, páginas em cache, busca, relacionados, paginação e exportação.
+
+Nada aqui depende das rotas, de formulários ou do Pillow, então os comandos do
+`manage.py` (importação, exportação, reindexação) usam este módulo direto.
+"""
+import csv
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import make_response, request, session
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import joinedload
+
+from config import INSTANCE_DIR
+from extensions import db
+from models import Category, Product, ProductRelated
+from related_index import RelatedIndex
+from search_index import SearchIndex
+
+# --- CACHE DO CATÁLOGO ---
+# O catálogo só muda quando um admin edita algo, então categorias e listagens
+# ficam em cache na memória de cada worker. A coerência entre os workers do
+# gunicorn vem de um arquivo de "versão do catálogo" compartilhado: toda escrita
+# do admin incrementa a versão, e as entradas de cache são chaveadas por ela.
+CATALOG_VERSION_FILE = os.environ.get('CATALOG_VERSION_FILE', os.path.join(INSTANCE_DIR, 'catalog_version'))
+CATALOG_CACHE_SIZE = 256
+CATALOG_CACHE_TTL = 300 # segundos; limite de segurança caso a versão não seja incrementada
+
+class CatalogCache:
+    """Cache LRU com expiração (TTL), chaveado pela versão atual do catálogo."""
+
+    def __init__(self, version_file, maxsize=CATALOG_CACHE_SIZE, ttl=CATALOG_CACHE_TTL):
+        self.version_file = version_file
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._version = 0
+
+    def version(self):
+        """Lê a versão do arquivo, mas só quando ele mudou (um stat por chamada)."""
+        try:
+            st = os.stat(self.version_file)
+        except FileNotFoundError:
+            return 0
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if stamp != self._stamp:
+            try:
+                with open(self.version_file) as f:
+                    self._version = int(f.read().strip() or 0)
+            except (OSError, ValueError):
+                self._version = 0
+            self._stamp = stamp
+        return self._version
+
+    def bump(self):
+        """Incrementa a versão; a troca atômica do arquivo é vista por todos os workers."""
+        with self._lock:
+            os.makedirs(os.path.dirname(self.version_file), exist_ok=True)
+            # Usa o relógio (e não só +1) para que dois workers incrementando ao
+            # mesmo tempo não acabem gravando o mesmo número
+            new_version = max(time.time_ns(), self.version() + 1)
+            tmp_path = f"{self.version_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(str(new_version))
+            os.replace(tmp_path, self.version_file)
+            self._entries.clear()
+        return new_version
+
+    def last_modified(self):
+        """Momento da última alteração do catálogo (ou None se nunca foi alterado)."""
+        try:
+            return datetime.fromtimestamp(os.stat(self.version_file).st_mtime, timezone.utc)
+        except FileNotFoundError:
+            return None
+
+    def get(self, key, default=None):
+        version = self.version()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version and time.monotonic() - entry[1] < self.ttl:
+                self._entries.move_to_end(key)
+                return entry[2]
+        return default
+
+    def set(self, key, value, version=None):
+        """Guarda o valor; `version` permite gravar com a versão lida antes de calculá-lo."""
+        if version is None:
+            version = self.version()
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key, loader):
+        missing = object()
+        # A versão é lida antes de carregar: se o catálogo mudar no meio do caminho,
+        # o valor fica gravado com a versão antiga e é descartado na próxima leitura
+        version = self.version()
+        value = self.get(key, missing)
+        if value is missing:
+            value = loader()
+            self.set(key, value, version)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+catalog_cache = CatalogCache(CATALOG_VERSION_FILE)
+
+def bump_catalog_version():
+    """Deve ser chamada depois de todo commit que altera produtos, imagens ou categorias."""
+    return catalog_cache.bump()
+
+def _detached(objects):
+    """Desliga os objetos (e suas categorias) da sessão para poderem ser reusados entre requisições."""
+    for obj in objects:
+        category = obj.__dict__.get('category') if isinstance(obj, Product) else None
+        if category is not None and category in db.session:
+            db.session.expunge(category)
+        if obj in db.session:
+            db.session.expunge(obj)
+    return objects
+
+def cached_categories():
+    return catalog_cache.get_or_load(
+        ('categories',),
+        lambda: _detached(Category.query.order_by(Category.name).all())
+    )
+
+def cached_category(category_id):
+    return next((c for c in cached_categories() if c.id == category_id), None)
+
+# Números de cada categoria: produtos, destaques e faixa de preço efetivo (a
+# promoção, quando houver). Saem de um único GROUP BY guardado no cache do
+# catálogo, então são recalculados uma vez por versão e não a cada página.
+CategoryStats = namedtuple('CategoryStats', 'products featured min_price max_price')
+EMPTY_CATEGORY_STATS = CategoryStats(0, 0, None, None)
+
+def _load_category_stats():
+    price = db.func.coalesce(Product.promo_price, Product.price)
+    rows = db.session.query(
+        Product.category_id,
+        db.func.count(Product.id),
+        db.func.sum(db.case((Product.is_featured.is_(True), 1), else_=0)),
+        db.func.min(price),
+        db.func.max(price),
+    ).group_by(Product.category_id)
+    return {category_id: CategoryStats(products, featured or 0, min_price, max_price)
+            for category_id, products, featured, min_price, max_price in rows}
+
+def cached_category_stats():
+    """{id da categoria: CategoryStats}; categorias sem produtos não aparecem."""
+    return catalog_cache.get_or_load(('category_stats',), _load_category_stats)
+
+def category_stats(category_id):
+    return cached_category_stats().get(category_id, EMPTY_CATEGORY_STATS)
+
+
+# --- ÍNDICE DE BUSCA ---
+# O índice invertido vive na memória de cada worker. Quem faz a alteração no admin
+# atualiza só o produto afetado; os outros workers percebem a mudança pela versão
+# do catálogo e reconstroem o índice inteiro (uma única consulta leve).
+SEARCH_RESULTS_LIMIT = 48
+SEARCH_SUGGESTIONS_LIMIT = 8
+
+search_index = SearchIndex()
+_search_index_lock = threading.Lock()
+
+def _index_product(product_id, name, description, category_name, image_file):
+    search_index.add(
+        product_id,
+        {'name': name, 'description': description, 'category': category_name},
+        meta={'name': name, 'image_file': image_file}
+    )
+
+def get_search_index():
+    """Devolve o índice de busca, reconstruindo-o se o catálogo mudou em outro worker."""
+    version = catalog_cache.version()
+    if search_index.version != version:
+        with _search_index_lock:
+            if search_index.version != version:
+                rows = db.session.query(
+                    Product.id, Product.name, Product.description, Category.name, Product.image_file
+                ).join(Category).all()
+                search_index.clear()
+                for row in rows:
+                    _index_product(*row)
+                search_index.version = version
+    return search_index
+
+def _patch_search_index(patch):
+    """Incrementa a versão do catálogo e aplica `patch` no índice deste worker; devolve a nova versão.
+
+    O índice só é remendado se estava em dia com a versão de antes do incremento:
+    se outro worker alterou o catálogo depois que ele foi montado, remendar só o
+    produto daqui e carimbar a versão nova esconderia a alteração do outro. Nesse
+    caso o índice fica como está e a próxima busca o reconstrói.
+    """
+    with _search_index_lock:
+        previous = catalog_cache.version()
+        version = bump_catalog_version()
+        if search_index.version is not None and search_index.version == previous:
+            patch()
+            search_index.version = version
+    return version
+
+def reindex_product(product):
+    """Atualiza um produto no índice depois de uma alteração feita neste worker.
+
+    Chame no lugar de bump_catalog_version (ela já incrementa a versão).
+    """
+    def patch():
+        category = db.session.get(Category, product.category_id)
+        _index_product(product.id, product.name, product.description, category.name, product.image_file)
+    return _patch_search_index(patch)
+
+def unindex_product(product_id):
+    """Tira um produto apagado do índice; como reindex_product, já incrementa a versão."""
+    return _patch_search_index(lambda: search_index.remove(product_id))
+
+
+# --- PRODUTOS RELACIONADOS ---
+# Os vizinhos de cada produto ("Você também pode gostar") ficam pré-calculados na
+# tabela product_related, e a página do produto só faz uma leitura pela chave.
+# O índice de similaridade (related_index.py) só é usado por quem escreve: o admin,
+# ao salvar um produto, recalcula esse produto e os poucos que ele afeta, e a
+# importação e `python manage.py related` recalculam tudo.
+RELATED_TOP_K = 8
+# Quantos aparecem na página; os vizinhos de reserva cobrem produtos apagados até a
+# próxima atualização
+RELATED_SHOWN = 4
+# Ids por IN (...) em cada DELETE
+RELATED_BATCH = 500
+# Até quantos produtos alterados de uma vez os relacionados são atualizados só em
+# volta deles; acima disso, recalcular a tabela inteira sai mais barato
+RELATED_REFRESH_LIMIT = 20
+
+related_index = RelatedIndex()
+_related_lock = threading.Lock()
+
+def _related_query():
+    """(id, nome, descrição, categoria, preço efetivo, updated_at) de cada produto."""
+    return db.session.query(
+        Product.id, Product.name, Product.description, Product.category_id,
+        db.func.coalesce(Product.promo_price, Product.price), Product.updated_at
+    )
+
+def sync_related_index():
+    """Deixa o índice igual ao banco, relendo só os produtos alterados desde a última vez.
+
+    Compara o updated_at de cada produto com o guardado no índice (uma consulta só
+    de id e data), então alterações feitas por outros workers também entram.
+    """
+    if not len(related_index):
+        related_index.add_many(_related_query().all())
+        return
+    stamps = dict(db.session.query(Product.id, Product.updated_at).all())
+    for product_id in related_index.ids() - stamps.keys():
+        related_index.remove(product_id)
+    changed = [product_id for product_id, stamp in stamps.items()
+               if product_id not in related_index or related_index.stamp(product_id) != stamp]
+    for start in range(0, len(changed), RELATED_BATCH):
+        for row in _related_query().filter(Product.id.in_(changed[start:start + RELATED_BATCH])):
+            related_index.add(*row)
+
+def _store_related(product_ids):
+    """Troca as linhas de product_related destes produtos pelos vizinhos atuais do índice."""
+    product_ids = sorted(product_ids)
+    rows = [
+        {'product_id': product_id, 'rank': rank, 'related_id': related_id, 'score': round(score, 4)}
+        for product_id in product_ids if product_id in related_index
+        for rank, (related_id, score) in enumerate(related_index.neighbours(product_id, RELATED_TOP_K))
+    ]
+    for start in range(0, len(product_ids), RELATED_BATCH):
+        db.session.execute(delete(ProductRelated).where(
+            ProductRelated.product_id.in_(product_ids[start:start + RELATED_BATCH])))
+    if rows:
+        db.session.execute(insert(ProductRelated), rows)
+    db.session.commit()
+    return len(rows)
+
+def refresh_related(*product_ids):
+    """Atualiza os relacionados depois de uma alteração (já gravada) nestes produtos.
+
+    Chame antes de bump_catalog_version, para que as páginas regeradas já vejam a
+    tabela nova. Além dos produtos alterados, só são recalculados os que podem ter
+    mudado por causa deles: os que já os sugeriam e os que passam a tê-los entre os
+    K mais parecidos. Um produto apagado simplesmente some do índice e da tabela.
+    """
+    with _related_lock:
+        sync_related_index()
+        affected = set(product_ids) | set(db.session.scalars(
+            db.select(ProductRelated.product_id).where(ProductRelated.related_id.in_(product_ids))))
+        # Quantos vizinhos cada produto tem e a nota do último deles
+        lowest = {product_id: (count, score) for product_id, count, score in db.session.execute(
+            db.select(ProductRelated.product_id, db.func.count(), db.func.min(ProductRelated.score))
+            .group_by(ProductRelated.product_id))}
+        for product_id in product_ids:
+            for other, score in related_index.scores(product_id).items():
+                count, threshold = lowest.get(other, (0, 0.0))
+                # A nota gravada é arredondada: compara no mesmo arredondamento
+                if count < RELATED_TOP_K or round(score, 4) >= threshold:
+                    affected.add(other)
+        return _store_related(affected)
+
+def rebuild_related():
+    """Recalcula a tabela inteira, com o IDF do catálogo atual. Devolve (produtos, linhas)."""
+    with _related_lock:
+        related_index.add_many(_related_query().all())
+        # Linhas de produtos que já não existem (o SQLite sem foreign_keys não apaga em cascata)
+        db.session.execute(delete(ProductRelated).where(ProductRelated.product_id.not_in(db.select(Product.id))))
+        product_ids = sorted(related_index.ids())
+        rows = 0
+        for start in range(0, len(product_ids), RELATED_BATCH):
+            rows += _store_related(product_ids[start:start + RELATED_BATCH])
+        return len(product_ids), rows
+
+def update_related(product_ids):
+    """refresh_related para poucos produtos, rebuild_related para muitos (importação, edição em massa).
+
+    Devolve o (produtos, linhas) do rebuild_related, ou None se só atualizou em volta deles.
+    """
+    if len(product_ids) > RELATED_REFRESH_LIMIT:
+        return rebuild_related()
+    refresh_related(*product_ids)
+    return None
+
+def related_products(product_id, limit=RELATED_SHOWN):
+    """Os produtos sugeridos na página de um produto, em ordem: um SELECT pela chave da tabela."""
+    return (Product.query.options(joinedload(Product.category))
+            .join(ProductRelated, ProductRelated.related_id == Product.id)
+            .filter(ProductRelated.product_id == product_id)
+            .order_by(ProductRelated.rank).limit(limit).all())
+
+
+# --- PAGINAÇÃO DO CATÁLOGO ---
+# Paginação por cursor (keyset): em vez de OFFSET, cada página pede os produtos
+# com id menor que o último exibido, então o custo não cresce com o catálogo.
+CATALOG_PAGE_SIZE = 24
+
+def catalog_query():
+    """Consulta base de produtos, já trazendo a categoria no mesmo SELECT (evita N+1)."""
+    return Product.query.options(joinedload(Product.category)).order_by(Product.id.desc())
+
+def paginate_catalog(query, cursor=None, page_size=CATALOG_PAGE_SIZE):
+    """Devolve (produtos, próximo_cursor) a partir do cursor informado."""
+    if cursor:
+        query = query.filter(Product.id < cursor)
+    # Busca um item a mais só para saber se existe uma próxima página
+    products = query.limit(page_size + 1).all()
+    next_cursor = products[page_size - 1].id if len(products) > page_size else None
+    return products[:page_size], next_cursor
+
+
+def cached_catalog_page(category_id=None, cursor=None):
+    """Página do catálogo (geral ou de uma categoria) servida pelo cache do catálogo."""
+    def load():
+        query = catalog_query()
+        if category_id:
+            query = query.filter(Product.category_id == category_id)
+        products, next_cursor = paginate_catalog(query, cursor)
+        return _detached(products), next_cursor
+    return catalog_cache.get_or_load(('catalog', category_id, cursor), load)
+
+def cached_featured_products():
+    return catalog_cache.get_or_load(
+        ('featured',),
+        lambda: _detached(catalog_query().filter(Product.is_featured.is_(True)).all())
+    )
+
+
+# --- CACHE DE PÁGINAS PÚBLICAS ---
+# As páginas públicas renderizadas ficam num cache próprio (chaveadas pela rota,
+# pelos parâmetros que a view lê e pela versão do catálogo) e são servidas com ETag
+# forte, então navegadores, crawlers e proxies revalidam com um 304 quase sem custo.
+# Separado do catalog_cache para que um crawler percorrendo todos os produtos não
+# expulse as categorias e listagens que toda requisição lê.
+PAGE_CACHE_MAX_AGE = 60 # segundos
+PAGE_CACHE_SIZE = 512
+
+page_cache = CatalogCache(CATALOG_VERSION_FILE, maxsize=PAGE_CACHE_SIZE)
+
+def cached_page(view=None, cache=None, args=()):
+    """Decorator para rotas públicas cujo conteúdo não depende do usuário.
+
+    `args` são os parâmetros da query string que a view lê: só eles entram na
+    chave, então `?utm_source=...` e afins reaproveitam a mesma página em vez de
+    encher o cache. `@cached_page(cache=outro_cache)` guarda as respostas em
+    outro cache em vez de `page_cache`.
+    """
+    if view is None:
+        return lambda view: cached_page(view, cache, args)
+    cache = cache or page_cache
+
+    @wraps(view)
+    def wrapper(*args_, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(*args_, **kwargs)
+        # O host entra porque as páginas têm URLs absolutas (canonical, links da API)
+        key = ('page', request.root_url, request.endpoint, tuple(sorted(kwargs.items())),
+               tuple(request.args.get(name) for name in args))
+        version = cache.version()
+        page = cache.get(key)
+        if page is None:
+            response = make_response(view(*args_, **kwargs))
+            # Só respostas completas e sem cookies podem ser compartilhadas (o cookie
+            # da sessão só é gravado depois, então a sessão alterada conta como cookie)
+            if response.status_code != 200 or session.modified or response.headers.get('Set-Cookie'):
+                return response
+            page = make_cached_page(response.get_data(), response.headers['Content-Type'])
+            cache.set(key, page, version)
+        return cached_page_response(page)
+    return wrapper
+
+def make_cached_page(body, content_type):
+    return (body, content_type, hashlib.sha256(body).hexdigest()[:32])
+
+def cached_page_response(page):
+    """Resposta de uma página em cache, com ETag e tratamento de GET condicional (304)."""
+    body, content_type, etag = page
+    response = make_response(body)
+    response.headers['Content-Type'] = content_type
+    response.set_etag(etag)
+    response.last_modified = catalog_cache.last_modified()
+    response.cache_control.public = True
+    response.cache_control.max_age = PAGE_CACHE_MAX_AGE
+    return response.make_conditional(request)
+
+# --- EXPORTAÇÃO DO CATÁLOGO ---
+# A exportação é um pipeline em streaming: uma única consulta com JOIN lida em
+# blocos (cursor do lado do servidor no PostgreSQL), convertida linha a linha para
+# CSV ou NDJSON e, opcionalmente, comprimida com gzip. Nada é montado inteiro na
+# memória, então o custo não cresce com o tamanho do catálogo.
+# As colunas do CSV são as que scripts/import_products.py espera.
+EXPORT_COLUMNS = ['name', 'description', 'price', 'promo_price', 'image_file', 'is_featured', 'category_name', 'id']
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+EXPORT_CHUNK_ROWS = 500
+
+def parse_utc_datetime(value):
+    """Data ISO 8601 (com Z ou fuso; sem fuso vale como UTC) para UTC sem fuso, como nas colunas DateTime.
+
+    Levanta ValueError se o texto não for uma data.
+    """
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (TypeError, AttributeError) as e:
+        raise ValueError(f"data inválida: {value!r}") from e
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+def iter_export_rows(after_id=None, since=None):
+    """Produtos com o nome da categoria, em ordem de id, lidos em blocos.
+
+    Com `since` (UTC, sem fuso), só os criados ou alterados desde então, em ordem de
+    alteração (índice `(updated_at, id)`): é a exportação incremental que também
+    pega os produtos editados, e não só os novos como `after_id`.
+    """
+    stmt = db.select(
+        Product.id, Product.name, Product.description, Product.price, Product.promo_price,
+        Product.image_file, Product.is_featured, Category.name.label('category_name'), Product.updated_at
+    ).join(Category)
+    if since:
+        stmt = stmt.where(Product.updated_at >= since).order_by(Product.updated_at, Product.id)
+    else:
+        stmt = stmt.order_by(Product.id)
+    if after_id:
+        stmt = stmt.where(Product.id > after_id)
+    result = db.session.execute(stmt.execution_options(yield_per=EXPORT_CHUNK_ROWS))
+    yield from result.mappings()
+
+def iter_export(rows, fmt='csv'):
+    """Serializa as linhas em pedaços de texto de cerca de EXPORT_CHUNK_ROWS linhas."""
+    buffer = io.StringIO()
+    if fmt == 'csv':
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(rows, start=1):
+        if fmt == 'csv':
+            writer.writerow([
+                row['name'],
+                row['description'] or '',
+                str(row['price']),
+                str(row['promo_price']) if row['promo_price'] else '',
+                row['image_file'],
+                row['is_featured'],
+                row['category_name'],
+                row['id'],
+            ])
+        else:
+            record = {column: row[column] for column in EXPORT_COLUMNS}
+            record['price'] = str(row['price'])
+            record['promo_price'] = str(row['promo_price']) if row['promo_price'] else None
+            buffer.write(json.dumps(record, ensure_ascii=False) + '\n')
+        if count % EXPORT_CHUNK_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def iter_gzip(chunks):
+    """Comprime pedaços de texto em um único stream gzip, sem juntar tudo antes."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits=31: cabeçalho gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
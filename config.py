@@ -0,0 +1,125 @@
+"""Perfis de configuração do app, escolhidos pela variável APP_PROFILE.
+
+- `production` (padrão): cookies seguros, pool de conexões ajustado para o
+  PostgreSQL do Render (ou SQLite em modo WAL, sem DATABASE_URL) e aquecimento
+  dos caches antes do primeiro cliente;
+- `development` (padrão quando FLASK_DEBUG=1): cookies sem `Secure`, para
+  funcionar em http://localhost;
+- `testing`: banco SQLite em memória, CSRF desligado e bcrypt barato.
+
+Tudo vem de variáveis de ambiente (ou do arquivo .env).
+"""
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv() # Carrega as variáveis de ambiente do arquivo .env
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+INSTANCE_DIR = os.path.join(ROOT_DIR, 'instance')
+
+
+def database_url():
+    # Pega a URL do banco de dados do ambiente, com um fallback para o SQLite local
+    url = os.environ.get('DATABASE_URL', 'sqlite:///suportesmart.db')
+    # Garante que a URL do PostgreSQL seja compatível com o SQLAlchemy, pois alguns serviços usam "postgres://"
+    if url.startswith("postgres://"):
+        url = url.replace("postgres://", "postgresql://", 1)
+    return url
+
+
+def engine_options(url):
+    """Pool de conexões por worker.
+
+    O Render encerra conexões ociosas, então as conexões são recicladas antes
+    disso e testadas (pre-ping) ao sair do pool. Com workers de threads, o pool
+    precisa de pelo menos uma conexão por thread.
+    """
+    if url.startswith('sqlite'):
+        # O Flask-SQLAlchemy já escolhe o pool certo para o SQLite
+        return {}
+    threads = int(os.environ.get('GUNICORN_THREADS', 1))
+    return {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE', max(5, threads))),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 5)),
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 280)),
+        'pool_timeout': int(os.environ.get('DB_POOL_TIMEOUT', 10)),
+        'pool_pre_ping': True,
+    }
+
+
+def sqlite_pragmas():
+    """PRAGMAs de cada conexão do SQLite (veja sqlite_tuning.py).
+
+    SQLITE_TUNING=0 volta ao modo padrão do SQLite (journal "delete").
+    """
+    if os.environ.get('SQLITE_TUNING', '1') != '1':
+        return {}
+    return {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000)), # ms
+        'foreign_keys': 'ON',
+    }
+
+
+class Config:
+    # Usa variáveis de ambiente para segurança e flexibilidade
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'uma-chave-secreta-padrao-para-desenvolvimento')
+
+    # --- Configurações de Cookie para maior segurança e compatibilidade ---
+    # Isso é crucial para que o login funcione corretamente em todos os navegadores,
+    # especialmente em dispositivos móveis e em produção (HTTPS).
+    SESSION_COOKIE_SAMESITE = 'Lax'
+    REMEMBER_COOKIE_SAMESITE = 'Lax'
+    # Em produção (como no Render), o tráfego é via HTTPS, então os cookies devem ser 'Secure'.
+    SESSION_COOKIE_SECURE = True
+    REMEMBER_COOKIE_SECURE = True
+
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Só valem quando o banco é SQLite (o fallback local sem DATABASE_URL)
+    SQLITE_PRAGMAS = sqlite_pragmas()
+    # Custo do bcrypt (2^n rodadas). Senhas gravadas com outro custo são refeitas no próximo login
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    # Aumenta o tamanho máximo de upload para permitir várias imagens
+    MAX_CONTENT_LENGTH = 16 * 1024 * 1024 # 16 MB
+
+    # Atrás de um proxy (o Render tem um), o IP do cliente vem no X-Forwarded-For.
+    # TRUSTED_PROXIES diz quantos proxies confiáveis existem na frente do app
+    TRUSTED_PROXIES = int(os.environ.get('TRUSTED_PROXIES', 0))
+    # Monta caches e compila templates antes de atender o primeiro cliente (veja gunicorn.conf.py)
+    WARM_UP = os.environ.get('WARM_UP', '1') == '1'
+
+
+class ProductionConfig(Config):
+    pass
+
+
+class DevelopmentConfig(Config):
+    SESSION_COOKIE_SECURE = False
+    REMEMBER_COOKIE_SECURE = False
+    WARM_UP = False
+
+
+class TestingConfig(DevelopmentConfig):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    WTF_CSRF_ENABLED = False
+    BCRYPT_LOG_ROUNDS = 4
+
+
+PROFILES = {
+    'production': ProductionConfig,
+    'development': DevelopmentConfig,
+    'testing': TestingConfig,
+}
+
+
+def default_profile():
+    if os.environ.get('APP_PROFILE'):
+        return os.environ['APP_PROFILE']
+    return 'development' if os.environ.get('FLASK_DEBUG') in ('1', 'true', 'True') else 'production'
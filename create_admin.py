@@ -1,20 +1,26 @@
 import os
-from app import app, db, User, bcrypt
+from extensions import db
+from factory import create_app
+from models import User
+from passwords import hash_password
 
-# Pega as credenciais das variáveis de ambiente
-admin_user = os.environ.get('ADMIN_USERNAME', 'admin')
-admin_pass = os.environ.get('ADMIN_PASSWORD', 'password')
-
-with app.app_context():
+def create_admin(admin_user, admin_pass):
+    """Cria o usuário administrador, se ainda não existir. Precisa de um contexto do app."""
     # Verifica se o usuário já existe
     user_exists = User.query.filter_by(username=admin_user).first()
-    
+
     if not user_exists:
         print(f"Criando usuário administrador: {admin_user}...")
-        hashed_password = bcrypt.generate_password_hash(admin_pass).decode('utf-8')
+        hashed_password = hash_password(admin_pass)
         user = User(username=admin_user, password=hashed_password)
         db.session.add(user)
         db.session.commit()
         print("Usuário administrador criado com sucesso!")
-    else:
-        print(f"Usuário '{admin_user}' já existe. Nenhuma ação foi tomada.")
\ No newline at end of file
+        return True
+    print(f"Usuário '{admin_user}' já existe. Nenhuma ação foi tomada.")
+    return False
+
+if __name__ == '__main__':
+    # Pega as credenciais das variáveis de ambiente
+    with create_app().app_context():
+        create_admin(os.environ.get('ADMIN_USERNAME', 'admin'), os.environ.get('ADMIN_PASSWORD', 'password'))
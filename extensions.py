@@ -0,0 +1,30 @@
+"""Extensões do Flask, criadas sem app e ligadas a ele em `factory.create_app`."""
+import os
+
+from flask_bcrypt import Bcrypt
+from flask_login import LoginManager
+from flask_sqlalchemy import SQLAlchemy
+
+from config import ROOT_DIR, INSTANCE_DIR
+from instrumentation import Instrumentation
+from static_assets import AssetManifest
+
+db = SQLAlchemy()
+# O Flask-Migrate (e com ele o alembic) não é criado aqui: veja factory.init_migrations
+bcrypt = Bcrypt()
+login_manager = LoginManager()
+login_manager.login_view = 'login'
+login_manager.login_message_category = 'info'
+login_manager.login_message = 'Por favor, faça login para aceder a esta página.'
+
+# --- MÉTRICAS DE DESEMPENHO ---
+METRICS_DIR = os.environ.get('METRICS_DIR', os.path.join(INSTANCE_DIR, 'metrics'))
+# Quantas vezes a mesma consulta pode se repetir numa requisição antes do aviso de N+1
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 10))
+metrics = Instrumentation(directory=METRICS_DIR, n_plus_one_threshold=N_PLUS_ONE_THRESHOLD)
+
+# --- ARQUIVOS ESTÁTICOS ---
+SORTEIO_FOLDER = os.path.join(ROOT_DIR, 'sorteio')
+static_manifest = AssetManifest(os.path.join(ROOT_DIR, 'static'), os.path.join(INSTANCE_DIR, 'static_manifest.json'))
+# As páginas HTML do sorteio não entram: só os arquivos que elas carregam
+sorteio_manifest = AssetManifest(SORTEIO_FOLDER, os.path.join(INSTANCE_DIR, 'sorteio_manifest.json'), exclude=('.html',))
@@ -0,0 +1,84 @@
+"""Fábrica do app: configuração por perfil, extensões e camadas WSGI.
+
+`create_app` não registra rotas; `app.py` cria o app por aqui e declara as rotas
+em cima dele, e o `manage.py` usa o app sem rotas nenhuma.
+"""
+import os
+
+import click
+from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+from config import PROFILES, ROOT_DIR, INSTANCE_DIR, default_profile
+from extensions import db, bcrypt, login_manager, metrics, static_manifest, sorteio_manifest
+from sqlite_tuning import init_sqlite
+from static_assets import StaticFiles
+
+
+MIGRATIONS_DIR = os.path.join(ROOT_DIR, 'migrations')
+
+
+def init_migrations(app):
+    """Liga o Flask-Migrate ao app (comandos `flask db ...` e scripts/upgrade_db.py).
+
+    O import do Flask-Migrate carrega o alembic e os dialetos de todos os bancos
+    (~0,2s); o servidor e o manage.py não precisam de nada disso.
+    """
+    if 'migrate' not in app.extensions:
+        from flask_migrate import Migrate
+        # render_as_batch permite ALTER TABLE no SQLite
+        Migrate(app, db, directory=MIGRATIONS_DIR, render_as_batch=True)
+    return app
+
+
+def create_app(profile=None, migrations=None):
+    """Cria o app com o perfil pedido (ou o do ambiente, veja config.default_profile).
+
+    `migrations=None` liga o Flask-Migrate só quando o app é carregado pelo comando
+    `flask` (ex.: `flask --app app db upgrade`), que roda dentro de um contexto do click.
+    """
+    profile = profile or default_profile()
+    app = Flask('app', root_path=ROOT_DIR, instance_path=INSTANCE_DIR)
+    app.config.from_object(PROFILES[profile])
+    app.config['PROFILE'] = profile
+
+    # Registradas antes dos outros ganchos para que o after_request delas rode por
+    # último e a latência medida inclua todo o processamento da requisição.
+    metrics.init_app(app)
+    db.init_app(app)
+    init_sqlite(app)
+    if migrations or (migrations is None and click.get_current_context(silent=True) is not None):
+        init_migrations(app)
+    bcrypt.init_app(app)
+    login_manager.init_app(app)
+
+    # static/ e os estilos do sorteio são servidos por uma camada WSGI antes do Flask,
+    # com o hash do conteúdo no nome (cache de um ano) e versões .gz/.br pré-comprimidas.
+    # O manifesto é atualizado aqui na inicialização (só os arquivos alterados são
+    # relidos); no deploy, `python scripts/build_assets.py` deixa tudo pronto antes.
+    static_manifest.build()
+    sorteio_manifest.build()
+    if app.config['TRUSTED_PROXIES']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXIES'])
+    app.wsgi_app = StaticFiles(app.wsgi_app, {
+        app.static_url_path + '/': static_manifest,
+        '/sorteio/': sorteio_manifest,
+    })
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        """Faz url_for('static', filename=...) apontar para o nome com hash."""
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = static_manifest.url_path(values['filename'])
+
+    # Com `gunicorn --preload` o app (e o pool de conexões) é criado no processo
+    # mestre antes do fork. Cada worker descarta as conexões herdadas, sem
+    # fechá-las (elas ainda são do mestre), e abre as suas.
+    if hasattr(os, 'register_at_fork'):
+        def dispose_engines():
+            with app.app_context():
+                for engine in db.engines.values():
+                    engine.dispose(close=False)
+        os.register_at_fork(after_in_child=dispose_engines)
+
+    return app
@@ -0,0 +1,78 @@
+"""Formulários do painel e do login (Flask-WTF)."""
+from flask import request
+from flask_wtf import FlaskForm
+from flask_wtf.file import FileField, FileAllowed, MultipleFileField
+from wtforms import (StringField, TextAreaField, DecimalField, SubmitField, PasswordField, BooleanField, SelectField,
+                     SelectMultipleField, RadioField, HiddenField, IntegerField)
+from wtforms.widgets import HiddenInput
+from wtforms.validators import DataRequired, Length, ValidationError, Optional
+
+from models import Category, User
+
+
+class ProductForm(FlaskForm):
+    name = StringField('Nome do Produto', validators=[DataRequired(), Length(min=2, max=100)])
+    description = TextAreaField('Descrição')
+    price = DecimalField('Preço (ex: 1299.90)', validators=[DataRequired()])
+    promo_price = DecimalField('Preço Promocional (Opcional)', validators=[Optional()])
+    # Este campo agora só atualiza a imagem principal
+    picture = FileField('Atualizar Imagem Principal', validators=[FileAllowed(['jpg', 'png', 'jpeg'])])
+    category = SelectField('Categoria', coerce=int, validators=[DataRequired()])
+    is_featured = BooleanField('Marcar como Destaque')
+    submit = SubmitField('Salvar Produto')
+
+# Edição em massa (veja bulk_edit.py): as caixas de seleção da tabela do painel
+# apontam para este formulário (atributo form="..."), e o filtro atual do painel
+# vai nos campos escondidos
+class BulkEditForm(FlaskForm):
+    ids = SelectMultipleField(coerce=int, validate_choice=False)
+    scope = RadioField('Aplicar a', choices=[('selected', 'Produtos marcados'), ('filter', 'Todos os produtos do filtro')],
+                       default='selected')
+    where_name = HiddenField()
+    where_category = IntegerField(widget=HiddenInput(), validators=[Optional()])
+    where_featured = HiddenField()
+    price_mode = SelectField('Preço', choices=[('', 'Não alterar'), ('set', 'Novo preço (R$)'),
+                                               ('percent', 'Ajustar em % (ex: 10 ou -15)')], default='')
+    price_value = DecimalField('Valor do preço', validators=[Optional()])
+    promo_mode = SelectField('Preço Promocional', choices=[('', 'Não alterar'), ('set', 'Novo preço promocional (R$)'),
+                                                           ('percent', '% de desconto sobre o preço'),
+                                                           ('clear', 'Remover a promoção')], default='')
+    promo_value = DecimalField('Valor da promoção', validators=[Optional()])
+    featured = SelectField('Destaque', choices=[('', 'Não alterar'), ('1', 'Marcar como destaque'),
+                                                ('0', 'Tirar dos destaques')], default='')
+    category = SelectField('Mover para a Categoria', coerce=int, default=0)
+    preview = SubmitField('Pré-visualizar')
+    apply = SubmitField('Aplicar Alterações')
+
+# NOVO FORMULÁRIO PARA UPLOAD MÚLTIPLO
+class ImageUploadForm(FlaskForm):
+    pictures = MultipleFileField('Adicionar Imagens', validators=[DataRequired(), FileAllowed(['jpg', 'png', 'jpeg'])])
+    submit = SubmitField('Enviar Imagens')
+
+class LoginForm(FlaskForm):
+    username = StringField('Utilizador', validators=[DataRequired()])
+    password = PasswordField('Senha', validators=[DataRequired()])
+    remember = BooleanField('Lembrar de mim')
+    submit = SubmitField('Entrar')
+
+class UserForm(FlaskForm):
+    username = StringField('Nome de Usuário', validators=[DataRequired(), Length(min=4, max=20)])
+    password = PasswordField('Senha', validators=[DataRequired(), Length(min=6)])
+    submit = SubmitField('Adicionar Usuário')
+
+    def validate_username(self, username):
+        user = User.query.filter_by(username=username.data).first()
+        if user:
+            raise ValidationError('Este nome de usuário já está em uso. Por favor, escolha outro.')
+
+class CategoryForm(FlaskForm):
+    name = StringField('Nome da Categoria', validators=[DataRequired(), Length(min=2, max=50)])
+    submit = SubmitField('Salvar Categoria')
+
+    def validate_name(self, name):
+        # Garante que a validação não ocorra num formulário já preenchido
+        if request.endpoint == 'edit_category' and request.method == 'GET':
+            return
+        category = Category.query.filter_by(name=name.data).first()
+        if category:
+            raise ValidationError('Essa categoria já existe. Por favor, escolha um nome diferente.')
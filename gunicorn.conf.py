@@ -0,0 +1,53 @@
+# gunicorn.conf.py
+# Configuração do gunicorn, lida do ambiente (o Procfile usa este arquivo).
+#
+#   GUNICORN_WORKER_CLASS  sync (padrão), gthread ou gevent
+#   WEB_CONCURRENCY        número de workers (padrão 2)
+#   GUNICORN_THREADS       threads por worker no modo gthread (padrão 4)
+#   GUNICORN_PRELOAD       1 (padrão) carrega o app no mestre antes do fork
+#
+# Veja "Servidor de produção" no README para os números de cada combinação.
+import os
+
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'sync')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+if worker_class == 'gthread':
+    threads = int(os.environ.get('GUNICORN_THREADS', 4))
+    # O pool de conexões de cada worker precisa de uma conexão por thread
+    os.environ.setdefault('GUNICORN_THREADS', str(threads))
+if worker_class == 'gevent':
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 100))
+# Com gevent o app precisa ser importado depois do monkey-patching, que acontece no worker
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1' and worker_class != 'gevent'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+accesslog = os.environ.get('GUNICORN_ACCESSLOG')
+
+
+def on_starting(server):
+    # Retratos de métricas de execuções anteriores (e de comandos avulsos) não valem mais
+    from extensions import metrics
+    metrics.clear()
+
+
+def when_ready(server):
+    # Com preload, o aquecimento roda uma vez no mestre e os workers herdam os caches
+    if preload_app:
+        from app import warm_up
+        warm_up()
+
+
+def post_fork(server, worker):
+    if worker_class == 'gevent':
+        try:
+            # O psycopg2 só coopera com o gevent com este ajuste
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            pass
+
+
+def post_worker_init(worker):
+    if not preload_app:
+        from app import warm_up
+        warm_up()
@@ -0,0 +1,205 @@
+"""Pacote do catálogo para levar produtos e imagens de um ambiente a outro.
+
+Não depende do Flask nem do banco (como o image_storage.py). O pacote é um tar com:
+
+- `manifest.json`: as galerias de cada produto e o SHA-256 e o tamanho de cada
+  imagem que o catálogo usa (originais, derivados e o placeholder);
+- `produtos.csv`: os produtos, no formato de scripts/export_product.py;
+- `product_pics/<arquivo>`: só as imagens que o destino ainda não tem iguais.
+
+O tar é escrito e lido em modo de streaming (`w|`/`r|`): as imagens passam do
+disco para o pacote, e do pacote para o disco, em blocos, então o pacote pode ir
+direto por um pipe (ssh) sem ficar inteiro na memória nem em um arquivo.
+Na leitura, cada imagem é gravada numa pasta temporária e conferida pelo SHA-256
+do manifesto antes de qualquer coisa ir para o lugar.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import tarfile
+from datetime import datetime, timezone
+
+BUNDLE_FORMAT = 1
+MANIFEST_NAME = 'manifest.json'
+PRODUCTS_NAME = 'produtos.csv'
+PICTURES_PREFIX = 'product_pics/'
+CHUNK_SIZE = 64 * 1024
+
+
+class BundleError(Exception):
+    """Pacote inválido, incompleto ou com uma imagem que não confere."""
+
+
+def file_digest(path):
+    """(SHA-256 em hex, tamanho) do arquivo, lido em blocos."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(block)
+            size += len(block)
+    return digest.hexdigest(), size
+
+
+class HashCache:
+    """SHA-256 dos arquivos de uma pasta, salvo em JSON entre execuções.
+
+    Como no manifesto dos estáticos (static_assets.AssetManifest), cada entrada
+    guarda tamanho e data de modificação, e só os arquivos que mudaram são relidos:
+    com a cache em dia, conferir 10 mil imagens é só um `stat` de cada uma.
+    """
+
+    def __init__(self, directory, cache_path):
+        self.directory = directory
+        self.cache_path = cache_path
+        try:
+            with open(cache_path, encoding='utf-8') as f:
+                self._entries = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._entries = {}
+
+    def digest(self, name):
+        """(SHA-256, tamanho) do arquivo, ou None se ele não existir."""
+        try:
+            stat = os.stat(os.path.join(self.directory, name))
+        except FileNotFoundError:
+            self._entries.pop(name, None)
+            return None
+        entry = self._entries.get(name)
+        if entry is None or entry[2] != stat.st_size or entry[3] != stat.st_mtime_ns:
+            digest, size = file_digest(os.path.join(self.directory, name))
+            # O tamanho lido (não o do stat) é o que entra no hash
+            entry = self._entries[name] = [digest, size, stat.st_size, stat.st_mtime_ns]
+        return entry[0], entry[1]
+
+    def record(self, name, digest, size):
+        """Guarda o hash já conferido de um arquivo recém-gravado, sem relê-lo."""
+        stat = os.stat(os.path.join(self.directory, name))
+        self._entries[name] = [digest, size, stat.st_size, stat.st_mtime_ns]
+
+    def scan(self):
+        """{arquivo: (SHA-256, tamanho)} de todos os arquivos da pasta."""
+        result = {}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith('.') and not entry.name.endswith('.tmp'):
+                    result[entry.name] = self.digest(entry.name)
+        for name in set(self._entries) - set(result):
+            del self._entries[name]
+        return result
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.cache_path)
+
+
+def inventory(files):
+    """O que um ambiente já tem: o conteúdo do `--against` da exportação."""
+    return {'format': BUNDLE_FORMAT, 'files': {name: list(entry) for name, entry in sorted(files.items())}}
+
+
+def load_inventory(stream):
+    """{arquivo: (SHA-256, tamanho)} de um inventário ou do manifesto de um pacote."""
+    data = json.load(stream)
+    if data.get('format') != BUNDLE_FORMAT:
+        raise BundleError(f"Inventário em formato desconhecido: {data.get('format')!r}")
+    return {name: tuple(entry) for name, entry in data['files'].items()}
+
+
+def make_manifest(files, galleries, included):
+    return {
+        'format': BUNDLE_FORMAT,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'galleries': galleries,
+        'files': {name: list(entry) for name, entry in sorted(files.items())},
+        'included': sorted(included),
+    }
+
+
+def _member(name, size, mtime=None):
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = int(mtime if mtime is not None else datetime.now().timestamp())
+    info.mode = 0o644
+    return info
+
+
+def write_bundle(stream, manifest, products_csv, directory, compress=False):
+    """Escreve o pacote em `stream` (arquivo aberto em binário ou pipe).
+
+    `products_csv` é um arquivo binário já preenchido (ex.: SpooledTemporaryFile):
+    o tar precisa do tamanho de cada membro antes do conteúdo. As imagens de
+    `manifest['included']` são copiadas de `directory` em blocos.
+    """
+    with tarfile.open(fileobj=stream, mode='w|gz' if compress else 'w|', format=tarfile.PAX_FORMAT) as tar:
+        data = json.dumps(manifest, ensure_ascii=False).encode('utf-8')
+        tar.addfile(_member(MANIFEST_NAME, len(data)), io.BytesIO(data))
+        size = products_csv.seek(0, os.SEEK_END)
+        products_csv.seek(0)
+        tar.addfile(_member(PRODUCTS_NAME, size), products_csv)
+        for name in manifest['included']:
+            path = os.path.join(directory, name)
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                tar.addfile(_member(PICTURES_PREFIX + name, stat.st_size, stat.st_mtime), f)
+
+
+def _copy_verified(source, path):
+    """Copia `source` para `path` em blocos; devolve (SHA-256, tamanho) do que foi gravado."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'wb') as f:
+        for block in iter(lambda: source.read(CHUNK_SIZE), b''):
+            digest.update(block)
+            size += len(block)
+            f.write(block)
+    return digest.hexdigest(), size
+
+
+def read_bundle(stream, staging_dir, products_csv):
+    """Lê o pacote de `stream`, gravando as imagens em `staging_dir` e o CSV em `products_csv`.
+
+    Cada imagem é conferida pelo SHA-256 e pelo tamanho do manifesto; qualquer
+    diferença, membro inesperado ou pacote cortado no meio levanta BundleError.
+    Devolve (manifesto, {arquivo: (SHA-256, tamanho)} das imagens recebidas).
+    """
+    manifest, received, has_products = None, {}, False
+    try:
+        with tarfile.open(fileobj=stream, mode='r|*') as tar:
+            for member in tar:
+                if member.name == MANIFEST_NAME and manifest is None:
+                    manifest = json.load(tar.extractfile(member))
+                    if manifest.get('format') != BUNDLE_FORMAT:
+                        raise BundleError(f"Pacote em formato desconhecido: {manifest.get('format')!r}")
+                elif manifest is None:
+                    raise BundleError("O pacote não começa pelo manifesto.")
+                elif member.name == PRODUCTS_NAME and member.isfile():
+                    shutil.copyfileobj(tar.extractfile(member), products_csv, CHUNK_SIZE)
+                    has_products = True
+                elif member.name.startswith(PICTURES_PREFIX) and member.isfile():
+                    name = member.name[len(PICTURES_PREFIX):]
+                    expected = manifest['files'].get(name)
+                    if (expected is None or name in received or name.startswith('.')
+                            or '/' in name or '\\' in name):
+                        raise BundleError(f"Arquivo inesperado no pacote: {member.name}")
+                    path = os.path.join(staging_dir, name)
+                    received[name] = _copy_verified(tar.extractfile(member), path)
+                    if received[name] != tuple(expected):
+                        raise BundleError(f"{name}: o conteúdo não confere com o manifesto "
+                                          f"(SHA-256 {received[name][0][:12]}…, esperado {expected[0][:12]}…).")
+                else:
+                    raise BundleError(f"Arquivo inesperado no pacote: {member.name}")
+    except (tarfile.TarError, EOFError, ValueError, KeyError) as e:
+        raise BundleError(f"Pacote ilegível ou incompleto: {e}") from e
+    if manifest is None or not has_products:
+        raise BundleError("Pacote incompleto: faltam o manifesto ou os produtos.")
+    missing = set(manifest['included']) - set(received)
+    if missing:
+        raise BundleError(f"Pacote incompleto: {len(missing)} imagens anunciadas não vieram "
+                          f"(ex.: {', '.join(sorted(missing)[:5])}).")
+    return manifest, received
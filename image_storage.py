@@ -0,0 +1,179 @@
+"""Auditoria e coleta de lixo da pasta de imagens dos produtos.
+
+Não depende do Flask nem do banco: o app passa as referências (pares id do
+produto, nome do arquivo) lidas numa única consulta, e `audit` as cruza com uma
+única passada pela pasta. O relatório aponta arquivos referenciados que não
+existem, arquivos que ninguém referencia (órfãos), o espaço total e o
+recuperável, e quanto cada produto ocupa.
+
+Órfãos não são apagados de imediato: `quarantine` os move em lotes para uma
+pasta de quarentena (uma subpasta por execução, com a data e um sufixo único), de onde `restore` os traz de
+volta e `purge` os apaga de vez depois de alguns dias.
+"""
+import os
+import shutil
+import tempfile
+import time
+from collections import defaultdict
+
+# Arquivos que nunca são órfãos, mesmo sem referência no banco
+PROTECTED_FILES = {'placeholder.png'}
+# Uploads são gravados antes do commit: arquivos mais novos que isso ainda podem
+# estar a caminho de uma linha no banco e não contam como órfãos
+DEFAULT_MIN_AGE = 3600
+DEFAULT_BATCH_SIZE = 500
+BATCH_FORMAT = '%Y%m%d-%H%M%S'
+BATCH_FORMAT_LENGTH = len(time.strftime(BATCH_FORMAT, time.gmtime(0)))
+
+
+class StorageReport:
+    def __init__(self):
+        self.files = 0
+        self.total_bytes = 0
+        self.missing = []            # (id do produto, arquivo) sem arquivo no disco
+        self.orphans = []            # (arquivo, bytes) sem referência no banco
+        self.recent = 0              # sem referência, mas novos demais para serem órfãos
+        self.product_bytes = defaultdict(int)
+
+    @property
+    def reclaimable_bytes(self):
+        return sum(size for _, size in self.orphans)
+
+    def largest_products(self, limit=20):
+        """Produtos que mais ocupam espaço: [(id, bytes)], do maior para o menor."""
+        return sorted(self.product_bytes.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+
+def variant_base(name, widths):
+    """Nome-base ("abc") de um derivado ("abc_320.webp"), ou None se não for derivado."""
+    stem = os.path.splitext(name)[0]
+    base, sep, width = stem.rpartition('_')
+    if sep and width.isdigit() and int(width) in widths:
+        return base
+    return None
+
+
+def audit(directory, references, variant_widths, min_age=DEFAULT_MIN_AGE, now=None):
+    """Cruza a pasta com as referências do banco e devolve um `StorageReport`.
+
+    Um arquivo está em uso se o nome é referenciado ou se é derivado
+    ("<nome>_<largura>.<ext>") de um arquivo referenciado.
+    """
+    now = time.time() if now is None else now
+    owners = defaultdict(set)         # arquivo referenciado -> produtos
+    stems = defaultdict(set)          # nome sem extensão -> produtos
+    for product_id, filename in references:
+        owners[filename].add(product_id)
+        stems[os.path.splitext(filename)[0]].add(product_id)
+
+    report = StorageReport()
+    present = set()
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name.startswith('.'):
+                continue
+            stat = entry.stat()
+            report.files += 1
+            report.total_bytes += stat.st_size
+            present.add(entry.name)
+
+            products = owners.get(entry.name)
+            if products is None:
+                base = variant_base(entry.name, variant_widths)
+                products = stems.get(base) if base is not None else None
+            if products:
+                for product_id in products:
+                    report.product_bytes[product_id] += stat.st_size
+            elif entry.name in PROTECTED_FILES:
+                continue
+            elif now - stat.st_mtime < min_age:
+                report.recent += 1
+            else:
+                report.orphans.append((entry.name, stat.st_size))
+
+    report.orphans.sort()
+    report.missing = sorted(
+        (product_id, filename)
+        for filename, products in owners.items() if filename not in present
+        for product_id in products
+    )
+    return report
+
+
+def quarantine(directory, quarantine_dir, filenames, batch_size=DEFAULT_BATCH_SIZE, on_batch=None, keep=None):
+    """Move os arquivos para uma nova subpasta da quarentena, em lotes.
+
+    `keep(nomes)` devolve, antes de cada lote, os nomes que não devem sair do
+    lugar; `on_batch(nomes)` é chamado depois de cada lote (para atualizar caches
+    ou mostrar o progresso). Devolve (pasta do lote, arquivos movidos).
+    """
+    os.makedirs(quarantine_dir, exist_ok=True)
+    # Uma pasta só desta execução: outra (do painel ou da linha de comando) no mesmo
+    # segundo ganha a sua, e o --restore de uma não traz os arquivos da outra
+    batch_dir = tempfile.mkdtemp(prefix=time.strftime(BATCH_FORMAT) + '-', dir=quarantine_dir)
+    moved = 0
+    filenames = list(filenames)
+    for start in range(0, len(filenames), batch_size):
+        batch = []
+        chunk = filenames[start:start + batch_size]
+        skip = keep(chunk) if keep is not None else ()
+        for name in chunk:
+            if name in skip:
+                continue
+            try:
+                shutil.move(os.path.join(directory, name), os.path.join(batch_dir, name))
+            except FileNotFoundError:
+                continue
+            batch.append(name)
+        moved += len(batch)
+        if on_batch is not None and batch:
+            on_batch(batch)
+    if not moved:
+        os.rmdir(batch_dir)
+    return batch_dir, moved
+
+
+def quarantine_batches(quarantine_dir):
+    """Lotes na quarentena: [(nome, arquivos, bytes)], do mais antigo ao mais novo."""
+    batches = []
+    if not os.path.isdir(quarantine_dir):
+        return batches
+    for name in sorted(os.listdir(quarantine_dir)):
+        path = os.path.join(quarantine_dir, name)
+        if not os.path.isdir(path):
+            continue
+        with os.scandir(path) as entries:
+            sizes = [entry.stat().st_size for entry in entries if entry.is_file()]
+        batches.append((name, len(sizes), sum(sizes)))
+    return batches
+
+
+def restore(directory, quarantine_dir, batch):
+    """Devolve à pasta de imagens os arquivos de um lote da quarentena."""
+    batch_dir = os.path.join(quarantine_dir, os.path.basename(batch))
+    restored = 0
+    for name in os.listdir(batch_dir):
+        target = os.path.join(directory, name)
+        # Um arquivo com o mesmo nome pode ter sido enviado de novo nesse meio-tempo
+        if os.path.exists(target):
+            os.remove(os.path.join(batch_dir, name))
+        else:
+            shutil.move(os.path.join(batch_dir, name), target)
+            restored += 1
+    os.rmdir(batch_dir)
+    return restored
+
+
+def purge(quarantine_dir, older_than_days, now=None):
+    """Apaga de vez os lotes da quarentena mais antigos que `older_than_days`."""
+    now = time.time() if now is None else now
+    purged = []
+    for name, files, size in quarantine_batches(quarantine_dir):
+        try:
+            created = time.mktime(time.strptime(name[:BATCH_FORMAT_LENGTH], BATCH_FORMAT))
+        except ValueError:
+            continue
+        if now - created >= older_than_days * 86400:
+            shutil.rmtree(os.path.join(quarantine_dir, name))
+            purged.append((name, files, size))
+    return purged
@@ -0,0 +1,405 @@
+"""Imagens dos produtos: derivados responsivos, uploads e auditoria da pasta.
+
+O Pillow só é importado quando uma imagem é de fato aberta ou gravada: as páginas
+públicas e os comandos que não mexem em imagens não pagam por ele.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import lru_cache
+
+from flask import current_app, url_for
+
+import image_storage
+from config import INSTANCE_DIR, ROOT_DIR
+from extensions import db, metrics, static_manifest
+from models import Product, ProductImage
+
+try:
+    import fcntl
+except ImportError: # Windows: a trava vale só dentro do processo
+    fcntl = None
+
+# --- FUNÇÃO HELPER PARA SALVAR IMAGENS ---
+# Cada upload gera, além do arquivo principal (até 800px), versões menores e em
+# formatos modernos. Os derivados seguem a convenção <nome>_<largura>.<ext>, para
+# que nenhuma coluna nova seja necessária no banco (como em static/category_pics).
+PICTURES_DIR = 'static/product_pics'
+IMAGE_VARIANT_WIDTHS = (96, 320, 800)
+IMAGE_MAX_SIZE = (IMAGE_VARIANT_WIDTHS[-1], IMAGE_VARIANT_WIDTHS[-1])
+# Formatos modernos procurados no disco, em ordem de preferência dos templates
+IMAGE_MODERN_FORMATS = ('avif', 'webp')
+IMAGE_QUALITY = {'jpeg': 82, 'webp': 80, 'avif': 60}
+
+@lru_cache(maxsize=1)
+def variant_formats():
+    """Formatos modernos gerados nos uploads.
+
+    AVIF comprime melhor, mas leva ~0,5s por imagem para codificar; por isso só é
+    gerado quando IMAGE_AVIF=1 e o Pillow instalado tiver suporte ao formato.
+    """
+    from PIL import features
+    return tuple(
+        fmt for fmt in IMAGE_MODERN_FORMATS
+        if features.check(fmt) and (fmt != 'avif' or os.environ.get('IMAGE_AVIF') == '1')
+    )
+
+def _picture_path(filename):
+    return os.path.join(ROOT_DIR, PICTURES_DIR, filename)
+
+def variant_filename(filename, width, ext=None):
+    """Nome do derivado de `filename` com a largura e extensão indicadas."""
+    stem, f_ext = os.path.splitext(filename)
+    return f"{stem}_{width}{ext or f_ext}"
+
+def _save_image(image, path, fmt):
+    """Grava a imagem sem metadados (EXIF) e com compressão ajustada ao formato.
+
+    O arquivo é escrito com outro nome e renomeado no fim, então quem o encontrar
+    no disco sempre o verá completo.
+    """
+    fmt = fmt.lower()
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    if fmt in ('jpeg', 'jpg'):
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        image.save(tmp_path, 'JPEG', quality=IMAGE_QUALITY['jpeg'], optimize=True, progressive=True)
+    elif fmt == 'webp':
+        image.save(tmp_path, 'WEBP', quality=IMAGE_QUALITY['webp'], method=6)
+    elif fmt == 'avif':
+        image.save(tmp_path, 'AVIF', quality=IMAGE_QUALITY['avif'])
+    elif fmt == 'png':
+        image.save(tmp_path, 'PNG', optimize=True)
+    else:
+        image.save(tmp_path, fmt.upper())
+    os.replace(tmp_path, path)
+
+def save_image_variants(image, filename):
+    """Gera os derivados responsivos de uma imagem já carregada."""
+    _, f_ext = os.path.splitext(filename)
+    fallback_fmt = f_ext.lstrip('.').lower()
+    for width in IMAGE_VARIANT_WIDTHS:
+        resized = image.copy()
+        resized.thumbnail((width, width))
+        # A maior largura no formato original é o próprio arquivo principal
+        if width != IMAGE_VARIANT_WIDTHS[-1]:
+            _save_image(resized, _picture_path(variant_filename(filename, width)), fallback_fmt)
+        for fmt in variant_formats():
+            _save_image(resized, _picture_path(variant_filename(filename, width, '.' + fmt)), fmt)
+
+# --- PROCESSAMENTO DOS UPLOADS ---
+# As fotos de um envio são decodificadas e redimensionadas em paralelo num pool de
+# threads limitado (o Pillow libera o GIL nesse trabalho). O nome do arquivo é o
+# hash do conteúdo enviado: a mesma foto enviada de novo reaproveita o arquivo já
+# processado, e o arquivo só é apagado quando nenhum produto ou galeria o usa mais.
+# Reaproveitar e apagar passam pela mesma trava (entre threads e processos): quem
+# reaproveita renova a data do arquivo, e arquivos renovados há menos de
+# IMAGE_REUSE_GRACE segundos não são apagados, pois o produto que vai usá-lo pode
+# ainda não ter sido gravado. Se nada o referenciar, a auditoria o recolhe depois.
+IMAGE_WORKERS = int(os.environ.get('IMAGE_WORKERS', min(4, os.cpu_count() or 1)))
+# Distância máxima (em bits, de 64) entre os hashes perceptuais de duas fotos do
+# mesmo produto para serem consideradas quase iguais; 0 desliga a verificação
+IMAGE_SIMILARITY_BITS = int(os.environ.get('IMAGE_SIMILARITY_BITS', 5))
+_image_pool = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='imagens')
+IMAGE_REUSE_GRACE = 600 # segundos
+# Extensão gravada para cada formato detectado pelo Pillow (MPO é o JPEG de várias
+# câmeras de celular); os demais são convertidos para PNG, sem perda
+UPLOAD_FORMAT_EXTENSIONS = {'JPEG': '.jpg', 'MPO': '.jpg', 'PNG': '.png'}
+_pictures_thread_lock = threading.Lock()
+
+@contextmanager
+def _pictures_lock():
+    with _pictures_thread_lock:
+        if fcntl is None:
+            yield
+            return
+        directory = os.path.join(INSTANCE_DIR, 'locks')
+        os.makedirs(directory, exist_ok=True)
+        fd = os.open(os.path.join(directory, 'product_pics.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # Fechar o arquivo solta a trava
+            os.close(fd)
+
+# created: a data de modificação (ns) do arquivo que este upload gravou, ou None
+# se ele reaproveitou um arquivo que já estava na pasta
+UploadResult = namedtuple('UploadResult', 'filename fingerprint created')
+
+def content_filename(data, ext):
+    """Nome do arquivo a partir do conteúdo: 16 dígitos hex do SHA-256 + extensão."""
+    return hashlib.sha256(data).hexdigest()[:16] + ext
+
+def upload_extension(data):
+    """Extensão do arquivo gravado, pelo formato que o Pillow detecta no conteúdo (e
+    não pelo nome enviado). Levanta OSError se não for uma imagem."""
+    from PIL import Image
+    with Image.open(io.BytesIO(data)) as image:
+        return UPLOAD_FORMAT_EXTENSIONS.get(image.format, '.png')
+
+def _reuse_picture(filename):
+    """Renova a data do arquivo e dos derivados, se existir; chamar com a trava."""
+    path = _picture_path(filename)
+    if not os.path.exists(path):
+        return False
+    for name in [filename] + [name for found in image_variants(filename).values() for _, name in found]:
+        try:
+            os.utime(_picture_path(name))
+        except FileNotFoundError:
+            pass
+    return True
+
+def dhash(image, size=8):
+    """Hash perceptual (diferença entre pixels vizinhos) de 64 bits.
+
+    Fotos quase iguais (recomprimidas, redimensionadas, com outro brilho) têm
+    hashes a poucos bits de distância.
+    """
+    from PIL import Image
+    small = image.convert('L').resize((size + 1, size), Image.Resampling.LANCZOS)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            offset = row * (size + 1) + col
+            bits = (bits << 1) | (pixels[offset] > pixels[offset + 1])
+    return bits
+
+@lru_cache(maxsize=4096)
+def _stored_dhash(filename):
+    # O conteúdo de um nome nunca muda, então o hash pode ficar em cache
+    from PIL import Image
+    found = image_variants(filename).get('fallback')
+    with Image.open(_picture_path(found[0][1] if found else filename)) as image:
+        return dhash(image)
+
+def image_dhash(filename):
+    """Hash perceptual de uma imagem já salva, ou None se o arquivo não abrir."""
+    try:
+        return _stored_dhash(filename)
+    except OSError:
+        return None
+
+def _process_image(data, filename):
+    """Decodifica, corrige a rotação, redimensiona e grava a imagem e seus derivados."""
+    from PIL import Image, ImageOps
+    with metrics.timed('image_processing_seconds', operation='process'):
+        image = Image.open(io.BytesIO(data))
+        # Aplica a rotação do EXIF antes de descartá-lo, senão fotos de celular ficam deitadas
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(IMAGE_MAX_SIZE)
+        fingerprint = dhash(image)
+        save_image_variants(image, filename)
+        # O arquivo principal vai por último: se ele existe, os derivados também
+        _save_image(image, _picture_path(filename), os.path.splitext(filename)[1].lstrip('.'))
+        return fingerprint
+
+def process_uploads(files):
+    """Processa um lote de uploads em paralelo.
+
+    Devolve, na ordem dos arquivos, um UploadResult ou None para os que não são
+    imagens válidas. Fotos repetidas (no lote ou já salvas) são processadas uma
+    vez só.
+    """
+    from PIL import Image
+    invalid = (OSError, ValueError, Image.DecompressionBombError)
+    jobs, names, fingerprints, created = {}, [], {}, {}
+    with metrics.timed('image_processing_seconds', operation='upload_batch'):
+        for storage in files:
+            data = storage.read()
+            try:
+                filename = content_filename(data, upload_extension(data))
+            except invalid:
+                current_app.logger.warning("Upload ignorado: %s não é uma imagem válida", storage.filename, exc_info=True)
+                names.append(None)
+                continue
+            names.append(filename)
+            if filename in jobs:
+                continue
+            with _pictures_lock():
+                reused = _reuse_picture(filename)
+            if not reused:
+                jobs[filename] = _image_pool.submit(_process_image, data, filename)
+
+        for filename, job in jobs.items():
+            try:
+                fingerprints[filename] = job.result()
+                created[filename] = os.stat(_picture_path(filename)).st_mtime_ns
+            except invalid:
+                current_app.logger.warning("Upload ignorado: %s não é uma imagem válida", filename, exc_info=True)
+                fingerprints[filename] = None
+
+    results = []
+    for name in names:
+        if name is None:
+            results.append(None)
+        elif name not in jobs:
+            results.append(UploadResult(name, image_dhash(name), None))
+        elif fingerprints[name] is None:
+            results.append(None)
+        else:
+            results.append(UploadResult(name, fingerprints[name], created[name]))
+    return results
+
+def save_picture(form_picture):
+    """Processa a imagem principal de um produto; devolve o nome do arquivo (ou None)."""
+    result = process_uploads([form_picture])[0]
+    return result[0] if result else None
+
+def image_variants(filename):
+    """Devolve os derivados existentes de uma imagem, agrupados por formato.
+
+    Imagens antigas (anteriores aos derivados) simplesmente não têm entradas,
+    e os templates caem de volta para o arquivo original. O resultado fica em
+    cache até a pasta mudar: a data de modificação dela (que muda a cada arquivo
+    criado, renomeado ou apagado, por qualquer worker) faz parte da chave.
+    """
+    try:
+        stamp = os.stat(os.path.join(ROOT_DIR, PICTURES_DIR)).st_mtime_ns
+    except OSError:
+        stamp = None
+    return _image_variants(filename, stamp)
+
+@lru_cache(maxsize=4096)
+def _image_variants(filename, stamp):
+    variants = {}
+    if not filename:
+        return variants
+    _, f_ext = os.path.splitext(filename)
+    # Procura todos os formatos modernos (e não só os gerados hoje): o que vale é o que está no disco
+    for fmt, ext in [(fmt, '.' + fmt) for fmt in IMAGE_MODERN_FORMATS] + [('fallback', f_ext)]:
+        found = []
+        for width in IMAGE_VARIANT_WIDTHS:
+            name = variant_filename(filename, width, ext)
+            if fmt == 'fallback' and width == IMAGE_VARIANT_WIDTHS[-1]:
+                name = filename
+            if os.path.exists(_picture_path(name)):
+                found.append((width, name))
+        if found:
+            variants[fmt] = tuple(found)
+    return variants
+
+def image_srcset(filename, fmt='fallback'):
+    """Monta o atributo srcset de uma imagem para o formato pedido."""
+    return ', '.join(
+        f"{url_for('static', filename='product_pics/' + name)} {width}w"
+        for width, name in image_variants(filename).get(fmt, ())
+    )
+
+def image_srcsets(filename):
+    """srcset de cada formato que a imagem tem, em ordem de preferência ('fallback' por último)."""
+    return {fmt: image_srcset(filename, fmt) for fmt in image_variants(filename)}
+
+def image_url(filename, width=None, external=False):
+    """URL do menor derivado com pelo menos `width` pixels (ou do original)."""
+    if width:
+        for variant_width, name in image_variants(filename).get('fallback', ()):
+            if variant_width >= width:
+                return url_for('static', filename='product_pics/' + name, _external=external)
+    return url_for('static', filename='product_pics/' + filename, _external=external)
+
+def picture_refcount(filename):
+    """Quantos produtos e imagens de galeria usam o arquivo."""
+    return (db.session.scalar(db.select(db.func.count()).where(Product.image_file == filename))
+            + db.session.scalar(db.select(db.func.count()).where(ProductImage.image_filename == filename)))
+
+def delete_picture(filename):
+    """Apaga um arquivo de imagem (e seus derivados) da pasta static/product_pics,
+    se nenhum produto ou galeria o usa mais nem um upload acabou de reaproveitá-lo.
+    Chamar depois do commit."""
+    # Não apagar a imagem padrão
+    if not filename or filename == 'placeholder.png':
+        return
+    with _pictures_lock():
+        try:
+            age = time.time() - os.path.getmtime(_picture_path(filename))
+        except OSError:
+            return
+        if age < IMAGE_REUSE_GRACE or picture_refcount(filename):
+            return
+        _remove_picture(filename)
+
+def discard_uploads(results):
+    """Apaga os arquivos que os uploads acabaram de gravar e que ficaram sem uso (ex.:
+    fotos recusadas por serem quase iguais). Chamar depois do commit.
+
+    Sem o prazo de `delete_picture`: um arquivo só é apagado se ainda tem a data
+    que o upload gravou, ou seja, se nenhum outro upload o reaproveitou depois.
+    """
+    with _pictures_lock():
+        for result in results:
+            if result is None or result.created is None:
+                continue
+            try:
+                stamp = os.stat(_picture_path(result.filename)).st_mtime_ns
+            except OSError:
+                continue
+            if stamp == result.created and not picture_refcount(result.filename):
+                _remove_picture(result.filename)
+
+def _remove_picture(filename):
+    """Apaga o arquivo e seus derivados; chamar com a trava."""
+    names = [filename] + [name for found in image_variants(filename).values() for _, name in found]
+    for name in set(names):
+        try:
+            picture_path = _picture_path(name)
+            if os.path.exists(picture_path):
+                os.remove(picture_path)
+            static_manifest.forget('product_pics/' + name)
+        except OSError:
+            current_app.logger.exception("Erro ao apagar a imagem %s", name)
+
+
+# --- AUDITORIA DAS IMAGENS ---
+# Órfãos (arquivos sem referência no banco) vão primeiro para a quarentena, de
+# onde podem ser restaurados; depois de IMAGE_QUARANTINE_DAYS dias são apagados.
+QUARANTINE_DIR = os.environ.get('IMAGE_QUARANTINE_DIR', os.path.join(INSTANCE_DIR, 'quarentena', 'product_pics'))
+QUARANTINE_DAYS = int(os.environ.get('IMAGE_QUARANTINE_DAYS', 7))
+UPLOAD_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+def picture_references():
+    """(id do produto, arquivo) de todas as imagens principais e de galeria, numa consulta."""
+    return db.session.execute(db.union_all(
+        db.select(Product.id, Product.image_file),
+        db.select(ProductImage.product_id, ProductImage.image_filename),
+    ))
+
+def audit_pictures(min_age=image_storage.DEFAULT_MIN_AGE):
+    """Cruza static/product_pics com o banco (veja image_storage.audit)."""
+    return image_storage.audit(os.path.join(ROOT_DIR, PICTURES_DIR), picture_references(),
+                               IMAGE_VARIANT_WIDTHS, min_age=min_age)
+
+def _referenced(filenames):
+    """Quais dos arquivos (ou dos originais dos derivados) voltaram a ser usados."""
+    originals = {}
+    for name in filenames:
+        base = image_storage.variant_base(name, IMAGE_VARIANT_WIDTHS)
+        originals[name] = {name} | ({base + ext for ext in UPLOAD_EXTENSIONS} if base is not None else set())
+    candidates = set().union(*originals.values())
+    used = set(db.session.scalars(db.select(Product.image_file).where(Product.image_file.in_(candidates))))
+    used.update(db.session.scalars(
+        db.select(ProductImage.image_filename).where(ProductImage.image_filename.in_(candidates))))
+    return {name for name, names in originals.items() if names & used}
+
+def quarantine_orphans(report, batch_size=image_storage.DEFAULT_BATCH_SIZE):
+    """Move os órfãos do relatório para a quarentena; devolve (lote, arquivos movidos)."""
+    orphans = [name for name, _ in report.orphans]
+    def forget(batch):
+        for name in batch:
+            static_manifest.forget('product_pics/' + name)
+    # Cada lote é conferido de novo no banco logo antes de sair do lugar: uma foto
+    # igual pode ter sido enviada (e referenciada) depois da auditoria
+    return image_storage.quarantine(os.path.join(ROOT_DIR, PICTURES_DIR), QUARANTINE_DIR, orphans,
+                                    batch_size, on_batch=forget, keep=_referenced)
+
+def restore_quarantine(batch):
+    return image_storage.restore(os.path.join(ROOT_DIR, PICTURES_DIR), QUARANTINE_DIR, batch)
+
+def purge_quarantine(older_than_days=QUARANTINE_DAYS):
+    return image_storage.purge(QUARANTINE_DIR, older_than_days)
@@ -0,0 +1,391 @@
+"""Métricas de desempenho por requisição: SQL, templates, imagens e latência.
+
+`Instrumentation` se liga aos eventos do SQLAlchemy (toda consulta executada) e
+ao ciclo de vida das requisições do Flask, e registra:
+
+- histograma de latência por endpoint e total de requisições por status;
+- número e tempo de consultas SQL por requisição;
+- tempo de renderização de cada template;
+- tempo de processamento de imagens (trechos marcados com `timed`).
+
+Cada resposta leva um cabeçalho `Server-Timing` (visível no DevTools), e uma
+mesma consulta repetida muitas vezes na requisição gera um aviso de N+1 no log.
+
+Cada worker do gunicorn grava de tempos em tempos um retrato das suas métricas
+em um arquivo próprio em `directory` (só processos que atenderam requisições:
+comandos do manage.py e scripts não gravam nada); `render_prometheus` soma os
+arquivos de todos os workers e devolve o texto no formato do Prometheus. Os
+retratos de workers que já terminaram são somados num único arquivo arquivado,
+para que os contadores nunca diminuam; o mestre do gunicorn limpa a pasta ao
+subir (`clear`).
+"""
+import atexit
+import glob
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import fcntl
+except ImportError: # Windows: sem trava entre processos
+    fcntl = None
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+ARCHIVE_FILE = 'archived.json'
+
+# nome: (tipo, descrição, buckets do histograma)
+METRICS = {
+    'http_requests_total': ('counter', 'Requisições atendidas pelo Flask.', None),
+    'http_request_duration_seconds': ('histogram', 'Latência das requisições por endpoint.', LATENCY_BUCKETS),
+    'db_queries_per_request': ('histogram', 'Consultas SQL por requisição.', QUERY_COUNT_BUCKETS),
+    'db_query_duration_seconds_total': ('counter', 'Tempo total gasto em consultas SQL.', None),
+    'db_n_plus_one_warnings_total': ('counter', 'Requisições que repetiram a mesma consulta além do limite.', None),
+    'template_render_seconds': ('histogram', 'Tempo de renderização por template.', LATENCY_BUCKETS),
+    'image_processing_seconds': ('histogram', 'Tempo de processamento de imagens por operação.', LATENCY_BUCKETS),
+    'password_hash_seconds': ('histogram', 'Tempo do bcrypt por operação (hash ou verificação).', LATENCY_BUCKETS),
+    'password_rejected_total': ('counter', 'Logins recusados sem calcular hash (limite de tentativas ou pool cheio).', None),
+}
+
+
+class Instrumentation:
+    def __init__(self, app=None, directory=None, n_plus_one_threshold=10, flush_interval=5.0):
+        self.directory = directory
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.flush_interval = flush_interval
+        self._values = {name: {} for name in METRICS}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = 0.0
+        # Só grava retratos depois de atender alguma requisição; _written diz se o
+        # arquivo com o pid atual foi gravado por este processo
+        self._served = False
+        self._written = False
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            atexit.register(self.flush, force=True)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        before_render_template.connect(self._template_started, app)
+        template_rendered.connect(self._template_finished, app)
+        event.listen(Engine, 'before_cursor_execute', self._query_started)
+        event.listen(Engine, 'after_cursor_execute', self._query_finished)
+        if hasattr(os, 'register_at_fork'):
+            # Um worker criado por fork começa do zero, sem os números do processo pai
+            os.register_at_fork(after_in_child=self.reset)
+
+    # --- Registro ---
+
+    def inc(self, name, labels, value=1.0):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            series[key] = series.get(key, 0.0) + value
+
+    def observe(self, name, labels, value):
+        buckets = METRICS[name][2]
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._values[name]
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    @contextmanager
+    def timed(self, name, **labels):
+        """Mede um trecho de código, ex.: `with metrics.timed('image_processing_seconds', operation='save')`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.observe(name, labels, elapsed)
+            stats = self._request_stats()
+            if stats is not None and name == 'image_processing_seconds':
+                stats['image_time'] += elapsed
+
+    def reset(self):
+        """Zera as métricas deste processo e apaga o retrato dele (ex.: depois do aquecimento).
+
+        Depois de um fork, um arquivo com o pid novo é de um processo antigo que
+        usou o mesmo pid: ele vai para o arquivo arquivado em vez de ser apagado.
+        """
+        with self._lock:
+            self._values = {name: {} for name in METRICS}
+        self._last_flush = 0.0
+        self._served = False
+        written, self._written = self._written, False
+        if not self.directory:
+            return
+        if written:
+            try:
+                os.remove(self._snapshot_path())
+            except FileNotFoundError:
+                pass
+        else:
+            self._archive([self._snapshot_path()])
+
+    def clear(self):
+        """Apaga todos os retratos (chamado pelo mestre do gunicorn ao subir)."""
+        if not self.directory:
+            return
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # --- Ganchos do Flask e do SQLAlchemy ---
+
+    def _request_stats(self):
+        return g.get('_request_stats') if has_request_context() else None
+
+    def _start_request(self):
+        g._request_stats = {
+            'started': time.perf_counter(), 'queries': 0, 'db_time': 0.0,
+            'statements': Counter(), 'template_time': 0.0, 'image_time': 0.0, 'templates': [],
+        }
+
+    def _query_started(self, conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._instrumentation_started = time.perf_counter()
+
+    def _query_finished(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_instrumentation_started', None)
+        stats = self._request_stats()
+        if stats is not None and started is not None:
+            stats['queries'] += 1
+            stats['db_time'] += time.perf_counter() - started
+            stats['statements'][statement] += 1
+
+    def _template_started(self, sender, template, context, **extra):
+        stats = self._request_stats()
+        if stats is not None:
+            stats['templates'].append(time.perf_counter())
+
+    def _template_finished(self, sender, template, context, **extra):
+        stats = self._request_stats()
+        if stats is not None and stats['templates']:
+            elapsed = time.perf_counter() - stats['templates'].pop()
+            # Templates renderizados dentro de outro não contam duas vezes no total
+            if not stats['templates']:
+                stats['template_time'] += elapsed
+            self.observe('template_render_seconds', {'template': template.name or 'string'}, elapsed)
+
+    def _finish_request(self, response):
+        stats = self._request_stats()
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats['started']
+        self._served = True
+        endpoint = request.endpoint or 'not_found'
+        labels = {'endpoint': endpoint, 'method': request.method}
+        self.inc('http_requests_total', dict(labels, status=str(response.status_code)))
+        self.observe('http_request_duration_seconds', labels, elapsed)
+        self.observe('db_queries_per_request', {'endpoint': endpoint}, stats['queries'])
+        self.inc('db_query_duration_seconds_total', {'endpoint': endpoint}, stats['db_time'])
+
+        if stats['statements']:
+            statement, repeats = stats['statements'].most_common(1)[0]
+            if repeats > self.n_plus_one_threshold:
+                self.inc('db_n_plus_one_warnings_total', {'endpoint': endpoint})
+                self.app.logger.warning(
+                    "Possível N+1 em %s %s: a mesma consulta rodou %d vezes (%d consultas no total): %s",
+                    request.method, request.path, repeats, stats['queries'], ' '.join(statement.split())[:200]
+                )
+
+        timings = [
+            ('app', elapsed, None),
+            ('db', stats['db_time'], f"{stats['queries']} consulta" + ('s' if stats['queries'] != 1 else '')),
+            ('tpl', stats['template_time'], None),
+        ]
+        if stats['image_time']:
+            timings.append(('img', stats['image_time'], None))
+        response.headers['Server-Timing'] = ', '.join(
+            f"{name};dur={seconds * 1000:.1f}" + (f';desc="{desc}"' if desc else '')
+            for name, seconds, desc in timings
+        )
+        self.flush()
+        return response
+
+    # --- Agregação entre workers ---
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: [[list(map(list, key)), value if isinstance(value, float) else dict(value, buckets=list(value['buckets']))]
+                       for key, value in series.items()]
+                for name, series in self._values.items()
+            }
+
+    def _snapshot_path(self):
+        return os.path.join(self.directory, f"worker-{os.getpid()}.json")
+
+    def flush(self, force=False):
+        """Grava o retrato deste worker (no máximo a cada flush_interval segundos)."""
+        if not self.directory or not self._served:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        # Com workers de threads, uma gravação por vez (as outras threads não esperam)
+        if not self._flush_lock.acquire(blocking=force):
+            return
+        try:
+            self._last_flush = now
+            path = self._snapshot_path()
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.snapshot(), f)
+            os.replace(tmp_path, path)
+            self._written = True
+        finally:
+            self._flush_lock.release()
+
+    @contextmanager
+    def _archive_lock(self):
+        if fcntl is None:
+            yield
+            return
+        fd = os.open(os.path.join(self.directory, 'archive.lock'), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _archive(self, paths):
+        """Soma os retratos de `paths` ao arquivo arquivado e os apaga."""
+        with self._archive_lock():
+            snapshots = [_read_snapshot(path) for path in paths]
+            if not any(snapshots):
+                return
+            archive_path = os.path.join(self.directory, ARCHIVE_FILE)
+            merged = _merge([_read_snapshot(archive_path)] + snapshots)
+            tmp_path = archive_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(_as_snapshot(merged), f)
+            os.replace(tmp_path, archive_path)
+            for path in paths:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def _archive_dead_workers(self):
+        dead = []
+        for path in glob.glob(os.path.join(self.directory, 'worker-*.json')):
+            try:
+                pid = int(os.path.basename(path)[len('worker-'):-len('.json')])
+            except ValueError:
+                continue
+            if pid != os.getpid() and not _pid_alive(pid):
+                dead.append(path)
+        if dead:
+            self._archive(dead)
+
+    def collect(self):
+        """Soma os retratos de todos os workers (incluindo os que já terminaram)."""
+        if not self.directory:
+            return _merge([self.snapshot()])
+        self.flush(force=True)
+        self._archive_dead_workers()
+        paths = glob.glob(os.path.join(self.directory, 'worker-*.json'))
+        return _merge([_read_snapshot(path) for path in paths + [os.path.join(self.directory, ARCHIVE_FILE)]])
+
+    def render_prometheus(self):
+        """Métricas de todos os workers no formato de texto do Prometheus."""
+        lines = []
+        for name, series in self.collect().items():
+            kind, help_text, buckets = METRICS[name]
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(series.items()):
+                if kind != 'histogram':
+                    lines.append(f"{name}{_labels(key)} {_number(value)}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets, value['buckets']):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_labels(key + (('le', _number(bound)),))} {cumulative}")
+                lines.append(f"{name}_bucket{_labels(key + (('le', '+Inf'),))} {value['count']}")
+                lines.append(f"{name}_sum{_labels(key)} {_number(value['sum'])}")
+                lines.append(f"{name}_count{_labels(key)} {value['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError: # PermissionError: existe, mas é de outro usuário
+        return True
+    return True
+
+
+def _read_snapshot(path):
+    """Retrato gravado em `path`, ou None se não existir (ou estiver corrompido)."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(snapshots):
+    merged = {name: {} for name in METRICS}
+    for snapshot in snapshots:
+        for name, series in (snapshot or {}).items():
+            if name not in merged:
+                continue
+            for key, value in series:
+                key = tuple(tuple(pair) for pair in key)
+                current = merged[name].get(key)
+                if not isinstance(value, dict):
+                    merged[name][key] = (current or 0.0) + value
+                elif current is None:
+                    merged[name][key] = dict(value, buckets=list(value['buckets']))
+                else:
+                    current['buckets'] = [a + b for a, b in zip(current['buckets'], value['buckets'])]
+                    current['sum'] += value['sum']
+                    current['count'] += value['count']
+    return merged
+
+
+def _as_snapshot(merged):
+    """O inverso de `_merge`: volta ao formato gravado por `Instrumentation.snapshot`."""
+    return {name: [[list(map(list, key)), value] for key, value in series.items()] for name, series in merged.items()}
+
+
+def _labels(key):
+    if not key:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in key)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + '}'
+
+
+def _number(value):
+    if isinstance(value, float) and math.isinf(value):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,344 @@
+"""Comandos de manutenção da loja: `python manage.py --help`.
+
+    python manage.py import produtos.csv --create-categories
+    python manage.py export -o - --format ndjson --gzip
+    python manage.py create-admin --username admin
+    python manage.py gc --quarantine
+    python manage.py reindex
+    python manage.py related
+    python manage.py sqlite --backup instance/backups
+    python manage.py bundle export -o catalogo.tar --against destino.json
+    python manage.py bulk edit --category 3 --adjust-price -10 --dry-run
+    python manage.py sortear --ganhadores 1 --suplentes 2 --ate "2025-10-31 23:59:59"
+
+O app é criado sem as rotas (app.py nunca é importado) e cada comando importa só
+o que usa: só `reindex --images` carrega o Pillow, `create-admin` não carrega o
+catálogo, e nenhum deles carrega formulários ou o alembic. Os comandos
+reaproveitam as funções dos scripts de scripts/.
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup, ScriptInfo
+
+import image_storage
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
+
+
+def _create_app():
+    from factory import create_app
+    return create_app(migrations=False)
+
+
+cli = AppGroup('manage', help="Comandos de manutenção da Suporte Smart.")
+
+
+@cli.command('import')
+@click.argument('csv_filename', metavar='CSV', default='produtos_exportados.csv')
+@click.option('--dry-run', is_flag=True, help="Mostra o que mudaria, sem gravar nada.")
+@click.option('--create-categories', is_flag=True, help="Cria as categorias que não existirem.")
+@click.option('--batch-size', type=int, default=1000, show_default=True, help="Linhas por lote.")
+@click.option('--resume', is_flag=True, help="Continua a partir do último checkpoint.")
+@click.option('--skip-related', is_flag=True, help="Não recalcula os produtos relacionados (rode `related` depois).")
+def import_command(csv_filename, dry_run, create_categories, batch_size, resume, skip_related):
+    """Importa (cria ou atualiza) produtos de um CSV exportado."""
+    from import_products import import_data
+    stats = import_data(csv_filename, batch_size=batch_size, dry_run=dry_run,
+                        create_categories=create_categories, resume=resume, related=not skip_related)
+    if stats is None:
+        sys.exit(1)
+
+
+@cli.command('export')
+@click.option('-o', '--output', help="Arquivo de saída, ou - para a saída padrão.")
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), default='csv', show_default=True)
+@click.option('--gzip', 'use_gzip', is_flag=True, help="Comprime a saída com gzip.")
+@click.option('--after-id', type=int, help="Exporta só produtos com id maior (só os novos).")
+@click.option('--since', metavar='DATA', help="Exporta só produtos criados ou alterados desde a data (UTC, ISO 8601).")
+def export_command(output, fmt, use_gzip, after_id, since):
+    """Exporta o catálogo em CSV ou NDJSON, em streaming."""
+    from catalog import parse_utc_datetime
+    from export_product import export_data, OUTPUT_FILENAME
+    if since is not None:
+        try:
+            since = parse_utc_datetime(since)
+        except ValueError:
+            raise click.BadParameter("use uma data ISO 8601, ex: 2026-10-01T00:00:00Z", param_hint='--since')
+    if output is None:
+        output = os.path.splitext(OUTPUT_FILENAME)[0] + '.' + fmt + ('.gz' if use_gzip else '')
+    export_data(output, fmt, use_gzip, after_id, since)
+
+
+@cli.command('create-admin')
+@click.option('--username', envvar='ADMIN_USERNAME', default='admin', show_default=True)
+@click.option('--password', envvar='ADMIN_PASSWORD', prompt=True, hide_input=True, confirmation_prompt=True,
+              help="Senha (ou ADMIN_PASSWORD); pedida no terminal se faltar.")
+def create_admin_command(username, password):
+    """Cria o usuário administrador, se ele ainda não existir."""
+    from create_admin import create_admin
+    create_admin(username, password)
+
+
+@cli.command('gc')
+@click.option('--quarantine', is_flag=True, help="Move os órfãos para a quarentena (sem isso, só mostra o relatório).")
+@click.option('--batch-size', type=int, default=image_storage.DEFAULT_BATCH_SIZE, show_default=True,
+              help="Arquivos movidos por lote (cada lote é conferido de novo no banco).")
+@click.option('--min-age', type=int, default=image_storage.DEFAULT_MIN_AGE, show_default=True, metavar='SEGUNDOS',
+              help="Arquivos sem referência mais novos que isso ainda não contam como órfãos.")
+@click.option('--top', type=int, default=20, show_default=True, help="Quantos produtos listar no espaço por produto.")
+@click.option('--restore', metavar='LOTE', help="Devolve à pasta os arquivos de um lote da quarentena.")
+@click.option('--purge', type=int, metavar='DIAS',
+              help="Apaga de vez os lotes da quarentena mais antigos que DIAS.")
+@click.option('-v', '--verbose', is_flag=True, help="Lista cada arquivo órfão e cada arquivo faltando.")
+def gc_command(quarantine, batch_size, min_age, top, restore, purge, verbose):
+    """Audita static/product_pics e cuida da quarentena das imagens órfãs."""
+    from gc_images import collect
+    sys.exit(collect(quarantine, batch_size, min_age, top, restore, purge, verbose))
+
+
+@cli.command('reindex')
+@click.option('--images', is_flag=True, help="Gera também os derivados que faltam das imagens (carrega o Pillow).")
+def reindex_command(images):
+    """Reconstrói o índice de busca e invalida os caches do catálogo de todos os workers."""
+    from catalog import bump_catalog_version, get_search_index
+    if images:
+        from generate_image_variants import generate_variants
+        generate_variants()
+    started = time.perf_counter()
+    # Os workers do site percebem a nova versão e reconstroem o índice deles na próxima busca
+    bump_catalog_version()
+    index = get_search_index()
+    click.echo(f"Índice de busca: {len(index)} produtos em {(time.perf_counter() - started) * 1000:.0f} ms.")
+
+
+@cli.command('related')
+def related_command():
+    """Recalcula a tabela de produtos relacionados ("Você também pode gostar")."""
+    from catalog import bump_catalog_version, rebuild_related
+    started = time.perf_counter()
+    products, rows = rebuild_related()
+    bump_catalog_version()
+    click.echo(f"Relacionados: {products} produtos, {rows} sugestões em {time.perf_counter() - started:.1f} s.")
+
+
+@cli.command('sqlite')
+@click.option('--checkpoint/--no-checkpoint', default=True, show_default=True,
+              help="Copia o WAL para o banco e zera o arquivo -wal.")
+@click.option('--optimize/--no-optimize', default=True, show_default=True,
+              help="PRAGMA optimize (estatísticas do planejador).")
+@click.option('--backup', 'backup_dir', metavar='PASTA', help="Grava um backup online (VACUUM INTO) nesta pasta.")
+@click.option('--keep', type=click.IntRange(min=1), default=7, show_default=True,
+              help="Quantos backups manter na pasta.")
+def sqlite_command(checkpoint, optimize, backup_dir, keep):
+    """Manutenção do banco SQLite local: checkpoint, optimize e backup online (para o cron)."""
+    from extensions import db
+    import sqlite_tuning
+    if db.engine.dialect.name != 'sqlite' or sqlite_tuning.database_path(db.engine) is None:
+        click.echo("O banco configurado não é um arquivo SQLite; nada a fazer.")
+        sys.exit(1)
+    with db.engine.connect() as connection:
+        mode = connection.exec_driver_sql("PRAGMA journal_mode").scalar()
+        click.echo(f"Banco: {sqlite_tuning.database_path(db.engine)} (journal_mode={mode})")
+        if backup_dir:
+            started = time.perf_counter()
+            path = sqlite_tuning.backup(connection, backup_dir, keep)
+            click.echo(f"Backup: {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB "
+                       f"em {time.perf_counter() - started:.1f} s)")
+        if optimize:
+            sqlite_tuning.optimize(connection)
+            click.echo("PRAGMA optimize: ok")
+        if checkpoint and mode == 'wal':
+            busy, log, copied = sqlite_tuning.checkpoint(connection)
+            click.echo(f"Checkpoint: {copied} de {log} páginas do WAL copiadas"
+                       + (" (leitores ativos: rode de novo mais tarde)" if busy else ""))
+
+
+@cli.group('bundle')
+def bundle_group():
+    """Leva o catálogo (produtos, galerias e imagens) entre ambientes, só com as imagens que mudaram."""
+
+
+@bundle_group.command('inventory')
+@click.option('-o', '--output', default='-', show_default=True, help="Arquivo de saída, ou - para a saída padrão.")
+def bundle_inventory_command(output):
+    """Lista as imagens deste ambiente com o SHA-256 (rode no destino)."""
+    from sync_catalog import write_inventory
+    write_inventory(output)
+
+
+@bundle_group.command('export')
+@click.option('-o', '--output', default='catalogo.tar', show_default=True, help="Arquivo do pacote, ou - para a saída padrão.")
+@click.option('--against', metavar='INVENTARIO', help="Inventário do destino: só vão as imagens que ele não tem iguais.")
+@click.option('--gzip', 'use_gzip', is_flag=True, help="Comprime o pacote (as imagens já são comprimidas).")
+def bundle_export_command(output, against, use_gzip):
+    """Grava o pacote do catálogo (rode na origem)."""
+    from sync_catalog import export_bundle
+    export_bundle(output, against, use_gzip)
+
+
+@bundle_group.command('import')
+@click.argument('bundle', metavar='PACOTE')
+@click.option('--dry-run', is_flag=True, help="Confere o pacote e mostra o que mudaria, sem gravar nada.")
+@click.option('--skip-related', is_flag=True, help="Não atualiza os produtos relacionados (rode `related` depois).")
+def bundle_import_command(bundle, dry_run, skip_related):
+    """Confere e aplica um pacote do catálogo (rode no destino); PACOTE pode ser - (entrada padrão)."""
+    from sync_catalog import import_bundle
+    if not import_bundle(bundle, dry_run, related=not skip_related):
+        sys.exit(1)
+
+
+@cli.group('bulk')
+def bulk_group():
+    """Edição em massa de produtos (preço, promoção, destaque, categoria), com pré-visualização e desfazer."""
+
+
+def _ids(ctx, param, value):
+    try:
+        return [int(item) for item in value.split(',') if item.strip()] if value else None
+    except ValueError:
+        raise click.BadParameter("use ids separados por vírgula, ex: 12,15,40")
+
+
+def _money(value):
+    return '—' if value is None else f"{value:.2f}".replace('.', ',')
+
+
+@bulk_group.command('edit')
+@click.option('--ids', callback=_ids, metavar='1,2,3', help="Só estes produtos (ignora os filtros).")
+@click.option('--category', 'category_id', type=int, metavar='ID', help="Filtro: produtos desta categoria.")
+@click.option('--featured/--not-featured', default=None, help="Filtro: só os em destaque, ou só os fora.")
+@click.option('--name', metavar='TEXTO', help="Filtro: nome contém o texto (sem diferenciar maiúsculas).")
+@click.option('--all', 'everything', is_flag=True, help="Sem ids nem filtros: o catálogo inteiro.")
+@click.option('--set-price', metavar='VALOR', help="Novo preço.")
+@click.option('--adjust-price', metavar='PERCENTUAL', help="Ajusta o preço em % (negativo para baixar).")
+@click.option('--set-promo', metavar='VALOR', help="Novo preço promocional.")
+@click.option('--promo-discount', metavar='PERCENTUAL', help="Promoção este % abaixo do preço (do novo, se ele mudar).")
+@click.option('--clear-promo', is_flag=True, help="Remove a promoção.")
+@click.option('--set-featured/--unset-featured', 'set_featured', default=None, help="Põe ou tira dos destaques.")
+@click.option('--move-to', type=int, metavar='ID', help="Move para esta categoria.")
+@click.option('--dry-run', is_flag=True, help="Só mostra a pré-visualização, sem gravar nada.")
+@click.option('-y', '--yes', is_flag=True, help="Aplica sem pedir confirmação.")
+@click.option('--rows', type=int, default=20, show_default=True, help="Linhas da pré-visualização.")
+def bulk_edit_command(ids, category_id, featured, name, everything, set_price, adjust_price, set_promo, promo_discount,
+                      clear_promo, set_featured, move_to, dry_run, yes, rows):
+    """Altera de uma vez os produtos escolhidos, num único UPDATE (desfaça com `bulk undo`)."""
+    from decimal import Decimal, InvalidOperation
+    from bulk_edit import BulkChange, BulkEditError, Selection, apply_bulk_edit, preview_bulk_edit
+    if set_price and adjust_price or sum(bool(option) for option in (set_promo, promo_discount, clear_promo)) > 1:
+        raise click.UsageError("Escolha uma só operação para o preço e uma só para a promoção.")
+    try:
+        price_mode, price = ('set', set_price) if set_price else ('percent', adjust_price) if adjust_price else (None, None)
+        promo_mode, promo = (('set', set_promo) if set_promo else ('percent', promo_discount) if promo_discount
+                             else ('clear', None) if clear_promo else (None, None))
+        change = BulkChange(price_mode, None if price is None else Decimal(price.replace(',', '.')),
+                            promo_mode, None if promo is None else Decimal(promo.replace(',', '.')),
+                            set_featured, move_to)
+        selection = Selection(ids, category_id, featured, name, everything)
+        preview = preview_bulk_edit(selection, change, limit=rows)
+    except InvalidOperation:
+        raise click.UsageError("Valores e percentuais são números, ex: 1299.90 ou -10.")
+    except BulkEditError as e:
+        click.echo(f"ERRO: {e}")
+        sys.exit(1)
+
+    click.echo(f"Alteração: {change.describe()}")
+    click.echo(f"{preview.changed} de {preview.matched} produtos da seleção vão mudar.")
+    for row in preview.rows:
+        changes = [f"{label} {old} -> {new}" for label, old, new in (
+            ('preço', _money(row.price), _money(row.new_price)),
+            ('promoção', _money(row.promo_price), _money(row.new_promo_price)),
+            ('destaque', 'sim' if row.is_featured else 'não', 'sim' if row.new_is_featured else 'não'),
+            ('categoria', row.category, row.new_category),
+        ) if old != new]
+        click.echo(f"  {'!! ' if row.conflict else ''}{row.id} {row.name}: {'; '.join(changes)}")
+    if preview.changed > len(preview.rows):
+        click.echo(f"  ... e mais {preview.changed - len(preview.rows)}.")
+    if preview.conflicts:
+        click.echo(f"ERRO: {preview.conflicts} produto(s) (marcados com !!) ficariam com o preço zerado ou com a "
+                   "promoção igual ou acima do preço.")
+        sys.exit(1)
+    if dry_run or not preview.changed:
+        return
+    if not yes:
+        click.confirm("Aplicar?", abort=True)
+    try:
+        edit = apply_bulk_edit(selection, change)
+    except BulkEditError as e:
+        click.echo(f"ERRO: {e}")
+        sys.exit(1)
+    click.echo(f"Edição {edit.id}: {edit.product_count} produtos alterados. Para desfazer: python manage.py bulk undo {edit.id}")
+
+
+@bulk_group.command('undo')
+@click.argument('edit_id', metavar='ID', type=int, required=False)
+def bulk_undo_command(edit_id):
+    """Volta os produtos aos valores de antes de uma edição (sem ID, a última ainda não desfeita)."""
+    from bulk_edit import BulkEditError, undo_bulk_edit
+    try:
+        edit, restored, skipped = undo_bulk_edit(edit_id)
+    except BulkEditError as e:
+        click.echo(f"ERRO: {e}")
+        sys.exit(1)
+    click.echo(f"Edição {edit.id} desfeita: {restored} produtos restaurados"
+               + (f", {skipped} ignorados (alterados depois ou com a categoria antiga apagada)." if skipped else "."))
+
+
+@bulk_group.command('history')
+@click.option('--limit', type=int, default=10, show_default=True)
+def bulk_history_command(limit):
+    """Lista as últimas edições em massa."""
+    from bulk_edit import recent_bulk_edits
+    for edit in recent_bulk_edits(limit):
+        status = f"desfeita em {edit.undone_at:%Y-%m-%d %H:%M}" if edit.undone_at else "ativa"
+        click.echo(f"{edit.id}  {edit.created_at:%Y-%m-%d %H:%M} UTC  {edit.username or '(linha de comando)'}  "
+                   f"{edit.product_count} produtos  {status}  {edit.description}")
+
+
+def _until(ctx, param, value):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        pass
+    try:
+        day = datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise click.BadParameter("use AAAA-MM-DD ou 'AAAA-MM-DD HH:MM:SS'")
+    # Só a data: vale o dia inteiro, e não só até a meia-noite em que ele começa
+    return day.replace(hour=23, minute=59, second=59, microsecond=999999)
+
+
+@cli.command('sortear')
+@click.option('--ganhadores', 'winners', type=click.IntRange(min=1), default=1, show_default=True)
+@click.option('--suplentes', 'reserves', type=click.IntRange(min=0), default=2, show_default=True,
+              help="Sorteados a mais, na ordem, caso um ganhador não seja encontrado.")
+@click.option('--ate', 'until', callback=_until, metavar="'AAAA-MM-DD [HH:MM:SS]'",
+              help="Só inscrições feitas até esta data/hora (horário de Paragominas); só a data inclui o dia inteiro.")
+@click.option('--pasta', 'directory', metavar='PASTA', help="Onde gravar o registro do sorteio (padrão: instance/sorteios).")
+def draw_command(winners, reserves, until, directory):
+    """Sorteia os ganhadores entre as inscrições e grava o registro do sorteio."""
+    import sorteio
+    if until is not None:
+        until = sorteio.local_to_utc(until)
+    started = time.perf_counter()
+    result = sorteio.draw(winners + reserves, sorteio.iter_entries(until))
+    if not result.entries:
+        click.echo("Nenhuma inscrição para sortear.")
+        sys.exit(1)
+    path = sorteio.save_draw(result, winners, until, directory or sorteio.DRAWS_DIR)
+    click.echo(f"{result.eligible} inscrições elegíveis ({result.duplicates} repetidas ignoradas) "
+               f"em {time.perf_counter() - started:.1f} s; SHA-256 da lista: {result.digest}")
+    for position, row in enumerate(result.entries, start=1):
+        label = 'Ganhador' if position <= winners else 'Suplente'
+        click.echo(f"{position}. {label}: {row.name} - {sorteio.mask_email(row.email)} "
+                   f"- {sorteio.mask_whatsapp(row.whatsapp)} (inscrição {row.id})")
+    click.echo(f"Registro do sorteio: {path}")
+
+
+if __name__ == '__main__':
+    cli(obj=ScriptInfo(create_app=_create_app, set_debug_flag=False))
@@ -0,0 +1,35 @@
+"""updated_at em produtos e categorias
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+TABLES = ('category', 'product')
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        # Bancos que já passaram pelo antigo scripts/upgrade_db.py têm a coluna
+        if 'updated_at' in {c['name'] for c in inspector.get_columns(table)}:
+            continue
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+        op.execute(f'UPDATE {table} SET updated_at = CURRENT_TIMESTAMP')
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('updated_at')
@@ -0,0 +1,35 @@
+"""índices das consultas do catálogo
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 10:10:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product') as batch_op:
+        batch_op.create_index('ix_product_category_id_id', ['category_id', 'id'])
+        batch_op.create_index('ix_product_is_featured_id', ['is_featured', 'id'])
+        batch_op.create_index('ix_product_name', ['name'])
+        batch_op.create_index('ix_product_updated_at', ['updated_at'])
+    with op.batch_alter_table('product_image') as batch_op:
+        batch_op.create_index('ix_product_image_product_id_id', ['product_id', 'id'])
+
+
+def downgrade():
+    with op.batch_alter_table('product_image') as batch_op:
+        batch_op.drop_index('ix_product_image_product_id_id')
+    with op.batch_alter_table('product') as batch_op:
+        batch_op.drop_index('ix_product_updated_at')
+        batch_op.drop_index('ix_product_name')
+        batch_op.drop_index('ix_product_is_featured_id')
+        batch_op.drop_index('ix_product_category_id_id')
@@ -0,0 +1,33 @@
+"""carrinho guardado no servidor
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cart',
+    sa.Column('id', sa.String(length=43), nullable=False),
+    sa.Column('items', sa.JSON(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('cart') as batch_op:
+        batch_op.create_index('ix_cart_updated_at', ['updated_at'])
+
+
+def downgrade():
+    with op.batch_alter_table('cart') as batch_op:
+        batch_op.drop_index('ix_cart_updated_at')
+    op.drop_table('cart')
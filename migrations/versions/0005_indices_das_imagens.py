@@ -0,0 +1,29 @@
+"""índices nos nomes de arquivo das imagens (contagem de referências)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 13:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product') as batch_op:
+        batch_op.create_index('ix_product_image_file', ['image_file'])
+    with op.batch_alter_table('product_image') as batch_op:
+        batch_op.create_index('ix_product_image_image_filename', ['image_filename'])
+
+
+def downgrade():
+    with op.batch_alter_table('product_image') as batch_op:
+        batch_op.drop_index('ix_product_image_image_filename')
+    with op.batch_alter_table('product') as batch_op:
+        batch_op.drop_index('ix_product_image_file')
@@ -0,0 +1,28 @@
+"""índice (updated_at, id) para a sincronização incremental da API
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 22:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # O índice composto também atende o max(updated_at) do sitemap, então substitui o simples
+    with op.batch_alter_table('product') as batch_op:
+        batch_op.drop_index('ix_product_updated_at')
+        batch_op.create_index('ix_product_updated_at_id', ['updated_at', 'id'])
+
+
+def downgrade():
+    with op.batch_alter_table('product') as batch_op:
+        batch_op.drop_index('ix_product_updated_at_id')
+        batch_op.create_index('ix_product_updated_at', ['updated_at'])
@@ -0,0 +1,35 @@
+"""produtos relacionados pré-calculados
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_related',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('rank', sa.SmallInteger(), nullable=False),
+    sa.Column('related_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('product_id', 'rank')
+    )
+    with op.batch_alter_table('product_related') as batch_op:
+        batch_op.create_index('ix_product_related_related_id', ['related_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('product_related') as batch_op:
+        batch_op.drop_index('ix_product_related_related_id')
+    op.drop_table('product_related')
@@ -0,0 +1,38 @@
+"""participantes do sorteio
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # No banco do Render a tabela já existe, criada pelo antigo server.js com este
+    # mesmo formato (a restrição tem o nome que o PostgreSQL deu a ela lá)
+    if sa.inspect(op.get_bind()).has_table('participantes'):
+        return
+    op.create_table('participantes',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nome', sa.String(length=255), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('whatsapp', sa.String(length=50), nullable=False),
+    sa.Column('data_inscricao', sa.DateTime(timezone=True), server_default=sa.text('CURRENT_TIMESTAMP'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email', name='participantes_email_key')
+    )
+
+
+def downgrade():
+    # A tabela não é apagada: ela pode ser anterior a esta migração e guarda as
+    # inscrições de verdade
+    pass
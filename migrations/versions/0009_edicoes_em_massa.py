@@ -0,0 +1,37 @@
+"""edições em massa de produtos
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('product_bulk_edit',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('username', sa.String(length=20), nullable=True),
+    sa.Column('description', sa.String(length=255), nullable=False),
+    sa.Column('product_count', sa.Integer(), nullable=False),
+    sa.Column('snapshot', sa.JSON(), nullable=False),
+    sa.Column('undone_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('product_bulk_edit') as batch_op:
+        batch_op.create_index('ix_product_bulk_edit_created_at', ['created_at'])
+
+
+def downgrade():
+    with op.batch_alter_table('product_bulk_edit') as batch_op:
+        batch_op.drop_index('ix_product_bulk_edit_created_at')
+    op.drop_table('product_bulk_edit')
@@ -0,0 +1,32 @@
+"""produtos removidos, para a sincronização da API
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-20 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0010'
+down_revision = '0009'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('deleted_product',
+    sa.Column('product_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    with op.batch_alter_table('deleted_product') as batch_op:
+        batch_op.create_index('ix_deleted_product_deleted_at_id', ['deleted_at', 'product_id'])
+
+
+def downgrade():
+    with op.batch_alter_table('deleted_product') as batch_op:
+        batch_op.drop_index('ix_deleted_product_deleted_at_id')
+    op.drop_table('deleted_product')
@@ -0,0 +1,116 @@
+"""Modelos do banco de dados.
+
+Só dependem do SQLAlchemy (e do UserMixin do Flask-Login): os comandos de linha
+de comando e os scripts carregam este módulo sem puxar formulários, Pillow ou rotas.
+"""
+from datetime import datetime, timezone
+
+from flask_login import UserMixin
+
+from extensions import db, login_manager
+
+
+def utcnow():
+    """Data/hora atual em UTC, sem fuso (como é gravada nas colunas DateTime)."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+@login_manager.user_loader
+def load_user(user_id):
+    return db.session.get(User, int(user_id))
+
+class User(db.Model, UserMixin):
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(20), unique=True, nullable=False)
+    password = db.Column(db.String(60), nullable=False)
+
+class Category(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(50), unique=True, nullable=False)
+    products = db.relationship('Product', backref='category', lazy=True)
+    updated_at = db.Column(db.DateTime, nullable=True, default=utcnow, onupdate=utcnow)
+
+class Product(db.Model):
+    # Índices das consultas quentes: listagem por categoria e destaques, ambas
+    # ordenadas por id (paginação por cursor), e a sincronização da API por data
+    __table_args__ = (
+        db.Index('ix_product_category_id_id', 'category_id', 'id'),
+        db.Index('ix_product_is_featured_id', 'is_featured', 'id'),
+        db.Index('ix_product_updated_at_id', 'updated_at', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    # Indexado para a importação, que localiza os produtos pelo nome
+    name = db.Column(db.String(100), nullable=False, index=True)
+    description = db.Column(db.Text, nullable=True) # Alterado para Text para descrições mais longas
+    price = db.Column(db.Numeric(10, 2), nullable=False)
+    promo_price = db.Column(db.Numeric(10, 2), nullable=True)
+    # Esta será a imagem principal/de capa
+    image_file = db.Column(db.String(100), nullable=False, default='placeholder.png', index=True)
+    is_featured = db.Column(db.Boolean, nullable=False, default=False)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    # Relação com a nova tabela de imagens
+    images = db.relationship('ProductImage', backref='product', lazy=True, cascade="all, delete-orphan")
+    # Última alteração do produto ou da sua galeria (usada no <lastmod> do sitemap)
+    updated_at = db.Column(db.DateTime, nullable=True, default=utcnow, onupdate=utcnow)
+
+# Produtos apagados, para a API avisar quem sincroniza por updated_since (veja
+# /api/v1/produtos/removidos). Só o id e a data: o produto já não existe.
+class DeletedProduct(db.Model):
+    __table_args__ = (
+        db.Index('ix_deleted_product_deleted_at_id', 'deleted_at', 'product_id'),
+    )
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=utcnow)
+
+# NOVA TABELA PARA A GALERIA DE IMAGENS
+class ProductImage(db.Model):
+    # Galeria de um produto (página do produto) e faixas de produtos (sitemap)
+    __table_args__ = (
+        db.Index('ix_product_image_product_id_id', 'product_id', 'id'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    image_filename = db.Column(db.String(100), nullable=False, index=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False)
+
+# Produtos relacionados pré-calculados (veja catalog.refresh_related): os K vizinhos
+# de cada produto, lidos pela chave primária na página do produto. related_id não é
+# chave estrangeira de propósito: quando um produto some, as linhas que apontam para
+# ele ficam até a próxima atualização, que as encontra pelo índice e as refaz.
+class ProductRelated(db.Model):
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id', ondelete='CASCADE'), primary_key=True)
+    rank = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    related_id = db.Column(db.Integer, nullable=False, index=True)
+    score = db.Column(db.Float, nullable=False)
+
+# Carrinho guardado no servidor: o navegador só recebe o id (cookie 'cart_id').
+# Os itens são só {id do produto: quantidade}; nome, preço e imagem vêm do banco.
+class Cart(db.Model):
+    id = db.Column(db.String(43), primary_key=True)
+    items = db.Column(db.JSON, nullable=False, default=dict)
+    # Usado para apagar carrinhos abandonados
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow, index=True)
+
+# Inscrições do sorteio (veja sorteio.py). A tabela é a que o antigo server.js criava,
+# com os nomes de colunas dele; a data é gravada com fuso, em UTC.
+class RaffleEntry(db.Model):
+    __tablename__ = 'participantes'
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column('nome', db.String(255), nullable=False)
+    email = db.Column(db.String(255), nullable=False, unique=True)
+    whatsapp = db.Column(db.String(50), nullable=False)
+    created_at = db.Column('data_inscricao', db.DateTime(timezone=True), server_default=db.func.now(),
+                           default=lambda: datetime.now(timezone.utc))
+
+# Edições em massa de produtos (veja bulk_edit.py). O snapshot guarda os valores
+# de antes de cada produto alterado, para desfazer a edição; created_at é também
+# o updated_at gravado nesses produtos, e é por ele (e pelo updated_at de antes,
+# guardado no snapshot) que o desfazer reconhece os que não foram mexidos depois.
+class ProductBulkEdit(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=utcnow, index=True)
+    # Vazio quando a edição veio da linha de comando
+    username = db.Column(db.String(20), nullable=True)
+    description = db.Column(db.String(255), nullable=False)
+    product_count = db.Column(db.Integer, nullable=False)
+    # [[id, preço, preço promocional, destaque, id da categoria, updated_at], ...], preços e datas em texto
+    snapshot = db.Column(db.JSON, nullable=False)
+    undone_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,144 @@
+"""Hash e verificação de senhas (bcrypt) e limite de tentativas de login."""
+import os
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from flask import current_app, request
+from sqlalchemy.exc import OperationalError
+
+from config import INSTANCE_DIR
+from extensions import bcrypt, db, metrics
+from rate_limit import ProcessSlots, TokenBucketLimiter
+from sqlite_tuning import is_busy_error
+
+# --- SENHAS E LIMITE DE TENTATIVAS ---
+# O bcrypt ocupa a CPU por ~0,3s a cada senha. Cada hash precisa de uma das
+# PASSWORD_SLOTS vagas, contadas entre todos os workers do gunicorn (padrão: metade
+# deles), então uma rajada de logins nunca ocupa todos os workers: sem vaga, o
+# login espera até PASSWORD_WAIT segundos numa fila curta (PASSWORD_QUEUE por
+# worker) e, se a fila estiver cheia ou a vaga não vier, responde 503. Dentro do
+# worker, o hash roda num pool pequeno. Antes disso, um balde de fichas por IP e
+# outro por nome de usuário e IP recusam rajadas de tentativas sem calcular hash
+# nenhum. O balde do usuário só gasta ficha quando a senha está errada, e é por
+# IP para que quem erra a senha de outro IP não tranque o dono da conta.
+PASSWORD_SLOTS = int(os.environ.get('PASSWORD_SLOTS', max(1, int(os.environ.get('WEB_CONCURRENCY', 2)) // 2)))
+PASSWORD_WORKERS = int(os.environ.get('PASSWORD_WORKERS', 2))
+PASSWORD_TIMEOUT = float(os.environ.get('PASSWORD_TIMEOUT', 5))
+PASSWORD_WAIT = float(os.environ.get('PASSWORD_WAIT', 2))
+PASSWORD_QUEUE = int(os.environ.get('PASSWORD_QUEUE', 4))
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_WORKERS, thread_name_prefix='senhas')
+_password_slots = ProcessSlots(os.path.join(INSTANCE_DIR, 'locks'), 'senha', PASSWORD_SLOTS, max_waiting=PASSWORD_QUEUE)
+# 10 tentativas seguidas por IP (depois, 1 a cada 6s); 5 senhas erradas por usuário
+# e IP (depois, 1 a cada 30s)
+login_ip_limiter = TokenBucketLimiter(int(os.environ.get('LOGIN_IP_BURST', 10)), float(os.environ.get('LOGIN_IP_REFILL', 6)))
+login_user_limiter = TokenBucketLimiter(int(os.environ.get('LOGIN_USER_BURST', 5)), float(os.environ.get('LOGIN_USER_REFILL', 30)))
+
+class PasswordBusy(Exception):
+    """O pool de senhas está cheio (ou não respondeu a tempo)."""
+
+def _password_job(operation, fn, *args):
+    slot = _password_slots.acquire(timeout=PASSWORD_WAIT)
+    if slot is None:
+        metrics.inc('password_rejected_total', {'reason': 'busy'})
+        raise PasswordBusy()
+    def timed_fn():
+        try:
+            with metrics.timed('password_hash_seconds', operation=operation):
+                return fn(*args)
+        finally:
+            # Solta a vaga antes de entregar o resultado, para o próximo login já a encontrar livre
+            _password_slots.release(slot)
+    try:
+        future = _password_pool.submit(timed_fn)
+    except RuntimeError:
+        _password_slots.release(slot)
+        raise
+    try:
+        return future.result(timeout=PASSWORD_TIMEOUT)
+    except FutureTimeoutError:
+        # A vaga só é liberada quando o hash terminar de fato
+        metrics.inc('password_rejected_total', {'reason': 'timeout'})
+        raise PasswordBusy() from None
+
+def hash_password(password):
+    """Hash bcrypt da senha (com o custo de BCRYPT_LOG_ROUNDS), calculado no pool."""
+    return _password_job('hash', bcrypt.generate_password_hash, password).decode('utf-8')
+
+_dummy_hash_value = None
+_dummy_hash_lock = threading.Lock()
+
+def _dummy_hash():
+    """Hash de uma senha aleatória, calculado uma vez (pelo pool, se o aquecimento não o fez)."""
+    global _dummy_hash_value
+    # Com a trava, uma rajada logo depois de subir calcula um hash só, e não um por thread
+    with _dummy_hash_lock:
+        if _dummy_hash_value is None:
+            _dummy_hash_value = hash_password(secrets.token_hex(16))
+    return _dummy_hash_value
+
+def prepare_dummy_hash():
+    """Calcula o hash de `_dummy_hash` na thread atual, no aquecimento.
+
+    Fora do pool de propósito: com preload o aquecimento roda no mestre do
+    gunicorn, e as threads de um pool criadas antes do fork não existem nos workers.
+    """
+    global _dummy_hash_value
+    with _dummy_hash_lock:
+        if _dummy_hash_value is None:
+            _dummy_hash_value = bcrypt.generate_password_hash(secrets.token_hex(16)).decode('utf-8')
+
+def needs_rehash(password_hash):
+    """Se o hash foi gravado com um custo diferente do configurado."""
+    try:
+        return int(password_hash.split('$')[2]) != current_app.config['BCRYPT_LOG_ROUNDS']
+    except (IndexError, ValueError):
+        return False
+
+def verify_password(user, password):
+    """Confere a senha no pool; se o custo mudou, grava um hash novo.
+
+    Para usuários que não existem a conta é feita contra um hash qualquer, para
+    que o tempo de resposta não revele quais nomes existem.
+    """
+    ok = _password_job('check', bcrypt.check_password_hash, user.password if user else _dummy_hash(), password)
+    if user is None or not ok:
+        return False
+    if needs_rehash(user.password):
+        try:
+            user.password = hash_password(password)
+            db.session.commit()
+        except PasswordBusy:
+            pass # Fica para o próximo login
+        except OperationalError as error:
+            # Banco ocupado: o login vale, e o hash novo fica para o próximo
+            db.session.rollback()
+            if not is_busy_error(error):
+                raise
+    return True
+
+def _login_user_key(username):
+    return (username.strip().lower(), request.remote_addr)
+
+def login_retry_after(username):
+    """0 se a tentativa pode seguir; senão, segundos até a próxima tentativa permitida.
+
+    Gasta uma ficha do IP; do balde do usuário só confere se ainda há ficha (quem
+    gasta é `login_failed`).
+    """
+    retry_after = login_ip_limiter.consume(request.remote_addr)
+    scope = 'ip'
+    if not retry_after:
+        retry_after = login_user_limiter.retry_after(_login_user_key(username))
+        scope = 'username'
+    if retry_after:
+        metrics.inc('password_rejected_total', {'reason': 'throttled_' + scope})
+    return retry_after
+
+def login_failed(username):
+    """Conta uma senha errada para o usuário, a partir deste IP."""
+    login_user_limiter.consume(_login_user_key(username))
+
+def login_succeeded(username):
+    """Devolve as fichas do usuário neste IP."""
+    login_user_limiter.reset(_login_user_key(username))
@@ -0,0 +1,133 @@
+"""Limite de tentativas por chave (IP, nome de usuário) com baldes de fichas.
+
+Cada chave tem um balde com `capacity` fichas que se recarrega à taxa de uma
+ficha a cada `refill_seconds`. Cada tentativa gasta uma ficha; com o balde
+vazio, a tentativa é recusada antes de qualquer trabalho caro, e o chamador
+recebe quantos segundos faltam para a próxima ficha.
+
+Os baldes ficam na memória do processo (como o cache do catálogo): com vários
+workers do gunicorn, o limite efetivo é o de um worker vezes o número de workers.
+
+`ProcessSlots` limita quantas tarefas pesadas rodam ao mesmo tempo somando todos
+os processos do servidor, com travas de arquivo (flock).
+"""
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError: # Windows: cada processo fica só com o limite dele
+    fcntl = None
+
+
+class TokenBucketLimiter:
+    def __init__(self, capacity, refill_seconds, max_keys=10000):
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # chave -> (fichas, instante da última recarga)
+        self._lock = threading.Lock()
+
+    def _tokens(self, key, now):
+        tokens, updated = self._buckets.get(key, (self.capacity, now))
+        return min(self.capacity, tokens + (now - updated) / self.refill_seconds)
+
+    def retry_after(self, key, now=None):
+        """Como `consume`, mas só olha o balde, sem gastar ficha."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens = self._tokens(key, now)
+        return 0 if tokens >= 1 else max(1, math.ceil((1 - tokens) * self.refill_seconds))
+
+    def consume(self, key, now=None):
+        """Gasta uma ficha de `key`; devolve 0 se a tentativa pode seguir, ou os
+        segundos (arredondados para cima) até a próxima ficha."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens = self._tokens(key, now)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self._buckets.move_to_end(key)
+                return max(1, math.ceil((1 - tokens) * self.refill_seconds))
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+            # Esquece as chaves usadas há mais tempo (que provavelmente já estão cheias)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return 0
+
+    def reset(self, key):
+        """Devolve todas as fichas de `key` (ex.: depois de um login bem-sucedido)."""
+        with self._lock:
+            self._buckets.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class ProcessSlots:
+    """N vagas compartilhadas entre os processos, uma trava de arquivo por vaga.
+
+    `acquire` devolve a vaga obtida, ou None se todas continuam ocupadas depois
+    de `timeout` segundos. Enquanto espera, a tarefa fica numa fila de no máximo
+    `max_waiting` por processo; com a fila cheia, desiste na hora. Uma vaga de um
+    processo que morreu é liberada pelo sistema operacional.
+    """
+
+    def __init__(self, directory, name, count, max_waiting=0):
+        self.paths = [os.path.join(directory, f"{name}-{i}.lock") for i in range(count)]
+        self.max_waiting = max_waiting
+        self._local = threading.BoundedSemaphore(count)
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _try_acquire(self):
+        if not self._local.acquire(blocking=False):
+            return None
+        if fcntl is None:
+            return -1
+        for path in self.paths:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        self._local.release()
+        return None
+
+    def acquire(self, timeout=0):
+        slot = self._try_acquire()
+        if slot is not None or timeout <= 0:
+            return slot
+        with self._waiting_lock:
+            if self._waiting >= self.max_waiting:
+                return None
+            self._waiting += 1
+        try:
+            # flock não tem espera com prazo: tenta de novo em intervalos curtos
+            deadline = time.monotonic() + timeout
+            delay = 0.01
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                time.sleep(min(delay, remaining))
+                slot = self._try_acquire()
+                if slot is not None:
+                    return slot
+                delay = min(delay * 2, 0.1)
+        finally:
+            with self._waiting_lock:
+                self._waiting -= 1
+
+    def release(self, slot):
+        if slot != -1:
+            # Fechar o arquivo solta a trava
+            os.close(slot)
+        self._local.release()
@@ -0,0 +1,202 @@
+"""Similaridade entre produtos para a faixa "Você também pode gostar".
+
+Não depende do Flask nem do banco (como o search_index.py): o catálogo alimenta o
+índice com nome, descrição, categoria e preço de cada produto e pede os vizinhos
+mais parecidos de um deles. A nota de um par de produtos combina:
+
+- texto: cosseno entre os vetores TF-IDF (esparsos, termo -> peso) do nome e da
+  descrição, com a mesma normalização da busca (sem acentos, sem plural simples);
+- categoria: produtos da mesma categoria;
+- preço: faixas de preço em escala logarítmica; faixas vizinhas contam em parte.
+
+Os candidatos de um produto vêm do índice invertido (quem tem algum termo pouco
+comum em comum com ele) e da própria categoria na mesma faixa de preço ou nas
+vizinhas, então ninguém compara o produto com o catálogo inteiro. Candidatos e
+nota são simétricos: b é candidato de a se e só se a é candidato de b, e
+nota(a, b) == nota(b, a).
+"""
+import heapq
+import math
+import threading
+
+from search_index import strip_html, tokenize
+
+# Peso de cada componente na nota final (somam 1)
+TEXT_WEIGHT = 0.6
+CATEGORY_WEIGHT = 0.25
+PRICE_WEIGHT = 0.15
+# O nome descreve o produto melhor que a descrição
+FIELD_WEIGHTS = {'name': 3.0, 'description': 1.0}
+# Cada faixa de preço é 50% mais cara que a anterior; a afinidade cai a zero em 3 faixas
+PRICE_BAND_RATIO = 1.5
+PRICE_BAND_REACH = 3
+# Da própria categoria, só entram como candidatos (sem termo em comum) os produtos
+# até esta distância em faixas de preço
+CATEGORY_BAND_REACH = 1
+# Pares com nota menor que isso não são sugeridos
+MIN_SCORE = 0.2
+# Termos presentes em mais produtos que isso ("produto", "celular") não trazem
+# candidatos sozinhos, mas continuam contando no cosseno
+COMMON_TERM_DF = 100
+
+
+def price_band(price):
+    """Faixa de preço (inteiro) em escala logarítmica, ou None sem preço."""
+    if not price or price <= 0:
+        return None
+    return math.floor(math.log(float(price)) / math.log(PRICE_BAND_RATIO))
+
+
+class RelatedIndex:
+    """Vetores TF-IDF dos produtos, índice invertido e grupos por categoria e faixa de preço.
+
+    O IDF de cada termo é o do momento em que o produto foi adicionado: alterações
+    pontuais não recalculam os outros vetores, e a reconstrução completa
+    (`python manage.py related`) acerta todos de novo.
+    """
+
+    def __init__(self):
+        self._vectors = {}
+        self._meta = {}
+        # termo -> {id: peso do termo no vetor do produto}
+        self._postings = {}
+        # (categoria, faixa de preço) -> ids
+        self._buckets = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._vectors)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._vectors
+
+    def stamp(self, doc_id):
+        """Marca guardada com o produto (o updated_at), para saber se ele mudou no banco."""
+        meta = self._meta.get(doc_id)
+        return meta[2] if meta else None
+
+    def ids(self):
+        with self._lock:
+            return set(self._vectors)
+
+    def _term_frequencies(self, name, description):
+        weights = {}
+        for field, text in (('name', name), ('description', strip_html(description))):
+            for term in tokenize(text):
+                weights[term] = weights.get(term, 0.0) + FIELD_WEIGHTS[field]
+        return weights
+
+    def _vectorize(self, frequencies):
+        """TF-IDF com tf amortecido (1 + log) e norma L2 unitária."""
+        total = len(self._vectors) + 1
+        vector = {}
+        for term, weight in frequencies.items():
+            # +1: o próprio produto conta na frequência do termo
+            df = len(self._postings.get(term, ())) + 1
+            vector[term] = (1.0 + math.log(weight)) * math.log(1 + total / df)
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {term: w / norm for term, w in vector.items()} if norm else {}
+
+    def add(self, doc_id, name, description, category_id, price, stamp=None):
+        """Indexa (ou reindexa) um produto."""
+        with self._lock:
+            self.remove(doc_id)
+            vector = self._vectorize(self._term_frequencies(name, description))
+            for term, weight in vector.items():
+                self._postings.setdefault(term, {})[doc_id] = weight
+            self._vectors[doc_id] = vector
+            self._meta[doc_id] = (category_id, price_band(price), stamp)
+            self._buckets.setdefault(self._meta[doc_id][:2], set()).add(doc_id)
+
+    def add_many(self, rows):
+        """Carga inicial: (id, nome, descrição, categoria, preço, marca) de todos os produtos.
+
+        Os termos são contados antes, então o IDF de todos os vetores é o do catálogo inteiro.
+        """
+        with self._lock:
+            self.clear()
+            rows = [(row, self._term_frequencies(row[1], row[2])) for row in rows]
+            df = {}
+            for _, frequencies in rows:
+                for term in frequencies:
+                    df[term] = df.get(term, 0) + 1
+            total = len(rows)
+            for (doc_id, _, _, category_id, price, stamp), frequencies in rows:
+                vector = {term: (1.0 + math.log(weight)) * math.log(1 + total / df[term])
+                          for term, weight in frequencies.items()}
+                norm = math.sqrt(sum(w * w for w in vector.values()))
+                vector = {term: w / norm for term, w in vector.items()} if norm else {}
+                for term, weight in vector.items():
+                    self._postings.setdefault(term, {})[doc_id] = weight
+                self._vectors[doc_id] = vector
+                self._meta[doc_id] = (category_id, price_band(price), stamp)
+                self._buckets.setdefault(self._meta[doc_id][:2], set()).add(doc_id)
+
+    def remove(self, doc_id):
+        with self._lock:
+            for term in self._vectors.pop(doc_id, ()):
+                postings = self._postings[term]
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+            meta = self._meta.pop(doc_id, None)
+            if meta:
+                members = self._buckets[meta[:2]]
+                members.discard(doc_id)
+                if not members:
+                    del self._buckets[meta[:2]]
+
+    def clear(self):
+        with self._lock:
+            self._vectors.clear()
+            self._meta.clear()
+            self._postings.clear()
+            self._buckets.clear()
+
+    def scores(self, doc_id):
+        """{id: nota} de todos os candidatos do produto com nota de pelo menos MIN_SCORE."""
+        with self._lock:
+            vector = self._vectors.get(doc_id)
+            if vector is None:
+                return {}
+            category_id, band, _ = self._meta[doc_id]
+            # Produto escalar esparso, termo a termo: os termos raros somam direto das
+            # listas invertidas (e trazem os candidatos); os comuns, só nos candidatos
+            dots, common = {}, []
+            for term, weight in vector.items():
+                postings = self._postings[term]
+                if len(postings) > COMMON_TERM_DF:
+                    common.append((term, weight))
+                    continue
+                for other, other_weight in postings.items():
+                    dots[other] = dots.get(other, 0.0) + weight * other_weight
+            candidates = set(dots)
+            if band is None:
+                candidates |= self._buckets.get((category_id, None), set())
+            else:
+                for distance in range(-CATEGORY_BAND_REACH, CATEGORY_BAND_REACH + 1):
+                    candidates |= self._buckets.get((category_id, band + distance), set())
+            candidates.discard(doc_id)
+
+            scores = {}
+            for other in candidates:
+                text = dots.get(other, 0.0)
+                if common:
+                    other_vector = self._vectors[other]
+                    text += sum(weight * other_vector.get(term, 0.0) for term, weight in common)
+                other_category, other_band, _ = self._meta[other]
+                price = 0.0
+                if band is not None and other_band is not None:
+                    price = max(0.0, 1.0 - abs(band - other_band) / PRICE_BAND_REACH)
+                score = (TEXT_WEIGHT * text + CATEGORY_WEIGHT * (other_category == category_id)
+                         + PRICE_WEIGHT * price)
+                if score >= MIN_SCORE:
+                    scores[other] = score
+            return scores
+
+    def neighbours(self, doc_id, k, scores=None):
+        """Os `k` produtos mais parecidos: [(id, nota)], da maior nota para a menor."""
+        if scores is None:
+            scores = self.scores(doc_id)
+        # Empate: o produto mais novo (id maior) primeiro
+        return heapq.nlargest(k, scores.items(), key=lambda item: (item[1], item[0]))
@@ -0,0 +1,86 @@
+# scripts/bench_import.py
+
+import argparse
+import csv
+import random
+import tempfile
+import time
+# Importa as configurações do app a partir do diretório pai
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+HEADER = ['name', 'description', 'price', 'promo_price', 'image_file', 'is_featured', 'category_name']
+
+
+def generate_csv(path, rows, categories, seed=42, price_shift=0):
+    """Gera um CSV sintético no formato de export_product.py."""
+    rng = random.Random(seed)
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for i in range(rows):
+            price = rng.randint(1000, 500000) / 100 + price_shift
+            writer.writerow([
+                f"Produto Sintético {i}",
+                f"<p>Descrição do produto sintético {i}. Película, capa e carregador.</p>",
+                f"{price:.2f}",
+                f"{price * 0.9:.2f}" if i % 7 == 0 else '',
+                f"{i:016x}.jpg",
+                'True' if i % 25 == 0 else 'False',
+                categories[i % len(categories)],
+            ])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mede a velocidade de import_products.py com um catálogo sintético.")
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--categories', type=int, default=12)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--database-url', help="banco a usar (padrão: SQLite temporário)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_import_')
+    # O app lê estas variáveis no import, então precisam vir antes dele
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['CATALOG_VERSION_FILE'] = os.path.join(workdir, 'catalog_version')
+    from extensions import db
+    from factory import create_app
+    from models import Category
+    from import_products import import_data
+
+    app = create_app()
+
+    categories = [f"Categoria {i}" for i in range(args.categories)]
+    with app.app_context():
+        dialect = db.engine.dialect.name
+        db.create_all()
+        db.session.add_all(Category(name=name) for name in categories if not Category.query.filter_by(name=name).first())
+        db.session.commit()
+
+    csv_path = os.path.join(workdir, 'produtos.csv')
+    runs = [
+        ("carga inicial (INSERT)", 0),
+        ("reimportação sem mudanças", 0),
+        ("reimportação com preços novos (upsert)", 1),
+    ]
+    results = []
+    for label, price_shift in runs:
+        generate_csv(csv_path, args.rows, categories, price_shift=price_shift)
+        started = time.perf_counter()
+        with app.app_context():
+            # Só a importação: os relacionados são recalculados à parte (manage.py related)
+            stats = import_data(csv_path, batch_size=args.batch_size, quiet=True, related=False)
+        elapsed = time.perf_counter() - started
+        results.append((label, elapsed, stats))
+
+    print()
+    print(f"=== {args.rows} linhas, lotes de {args.batch_size}, banco {dialect} ===")
+    for label, elapsed, stats in results:
+        print(f"{label:40s} {elapsed:7.2f}s  {args.rows / elapsed:9.0f} linhas/s  "
+              f"(criados {stats.created}, atualizados {stats.updated}, sem mudança {stats.unchanged})")
+    print(f"Arquivos temporários em {workdir}")
+
+
+if __name__ == '__main__':
+    main()
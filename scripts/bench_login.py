@@ -0,0 +1,168 @@
+# scripts/bench_login.py
+
+import argparse
+import http.client
+import os
+import random
+import re
+import secrets
+import tempfile
+import threading
+import time
+import urllib.parse
+from collections import Counter
+# Importa as configurações do app a partir do diretório pai
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from bench_routes import start_gunicorn, summarize
+
+_CSRF_RE = re.compile(r'name="csrf_token" type="hidden" value="([^"]+)"')
+
+
+def measure_loja(base_url, concurrency, duration):
+    """Latência de /loja durante `duration` segundos com `concurrency` conexões."""
+    target = base_url.split('://', 1)[1]
+    samples, errors = [], 0
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker():
+        nonlocal errors
+        conn = http.client.HTTPConnection(target, timeout=60)
+        while time.perf_counter() < deadline:
+            t = time.perf_counter()
+            try:
+                conn.request('GET', '/loja')
+                response = conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(target, timeout=60)
+                with lock:
+                    errors += 1
+                continue
+            with lock:
+                samples.append(time.perf_counter() - t)
+                errors += response.status >= 400
+        conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(samples, [], time.perf_counter() - started, errors)
+
+
+def stuff_credentials(base_url, attackers, ips, stop, statuses):
+    """Rajada de logins com senhas erradas, de `ips` IPs (0 = um IP novo por tentativa)."""
+    target = base_url.split('://', 1)[1]
+    lock = threading.Lock()
+    rng = random.Random(1)
+
+    def worker(n):
+        conn = http.client.HTTPConnection(target, timeout=60)
+        conn.request('GET', '/login')
+        response = conn.getresponse()
+        token = _CSRF_RE.search(response.read().decode('utf-8')).group(1)
+        cookie = response.getheader('Set-Cookie', '').split(';', 1)[0]
+        attempt = 0
+        while not stop.is_set():
+            attempt += 1
+            ip = f"10.{n}.{attempt // 250 % 250}.{attempt % 250}" if not ips else f"10.0.0.{(n + attempt) % ips + 1}"
+            body = urllib.parse.urlencode({
+                'csrf_token': token,
+                'username': rng.choice(['admin', 'suporte', f'usuario{attempt % 50}']),
+                'password': f'senha{attempt}',
+            })
+            try:
+                conn.request('POST', '/login', body=body, headers={
+                    'Content-Type': 'application/x-www-form-urlencoded', 'Cookie': cookie, 'X-Forwarded-For': ip,
+                })
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(target, timeout=60)
+                status = 'erro'
+            with lock:
+                statuses[status] += 1
+        conn.close()
+
+    return [threading.Thread(target=worker, args=(n,)) for n in range(attackers)]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mede a latência de /loja durante uma rajada de logins com senhas erradas (credential stuffing).")
+    parser.add_argument('--products', type=int, default=1000, help="produtos sintéticos no catálogo")
+    parser.add_argument('--workers', type=int, default=2, help="workers do gunicorn")
+    parser.add_argument('--attackers', type=int, default=16, help="conexões disparando logins")
+    parser.add_argument('--ips', type=int, default=4, help="IPs de origem dos ataques (0 = um IP novo por tentativa)")
+    parser.add_argument('--concurrency', type=int, default=2, help="conexões medindo /loja")
+    parser.add_argument('--duration', type=float, default=10, help="segundos de cada fase")
+    parser.add_argument('--no-throttle', action='store_true', help="desliga o limite de tentativas (para comparar)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_login_')
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(workdir, 'bench.db'),
+               CATALOG_VERSION_FILE=os.path.join(workdir, 'catalog_version'),
+               METRICS_DIR=os.path.join(workdir, 'metrics'),
+               # O IP de cada ataque vem no X-Forwarded-For, como atrás do proxy do Render
+               TRUSTED_PROXIES='1')
+    if args.no_throttle:
+        env.update(LOGIN_IP_BURST='1000000000', LOGIN_USER_BURST='1000000000')
+    os.environ.update({key: env[key] for key in ('DATABASE_URL', 'CATALOG_VERSION_FILE', 'METRICS_DIR')})
+    from extensions import db
+    from factory import create_app
+    from models import Product, User
+    from passwords import hash_password
+    from explain_queries import seed_catalog
+    from upgrade_db import upgrade
+
+    with create_app().app_context():
+        upgrade()
+        if db.session.query(Product.id).first() is None:
+            seed_catalog(args.products)
+        db.session.add(User(username='admin', password=hash_password(secrets.token_urlsafe(16))))
+        db.session.commit()
+
+    process, base_url = start_gunicorn(args.workers, env)
+    try:
+        measure_loja(base_url, args.concurrency, 2)  # aquecimento
+        baseline = measure_loja(base_url, args.concurrency, args.duration)
+
+        stop, statuses = threading.Event(), Counter()
+        attackers = stuff_credentials(base_url, args.attackers, args.ips, stop, statuses)
+        started = time.perf_counter()
+        for thread in attackers:
+            thread.start()
+        under_attack = measure_loja(base_url, args.concurrency, args.duration)
+        stop.set()
+        for thread in attackers:
+            thread.join()
+        elapsed = time.perf_counter() - started
+    finally:
+        process.terminate()
+        process.wait()
+
+    mode = "sem limite de tentativas" if args.no_throttle else "com limite de tentativas"
+    print(f"\n=== /loja, {args.workers} workers, {args.concurrency} conexões, {mode} ===")
+    print(f"{'fase':20s} {'req':>6s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'req/s':>8s} {'erros':>6s}")
+    for name, r in (('sem ataque', baseline), ('durante o ataque', under_attack)):
+        print(f"{name:20s} {r['requests']:6d} {r['p50_ms'] or 0:9.2f} {r['p95_ms'] or 0:9.2f} "
+              f"{r['p99_ms'] or 0:9.2f} {r['throughput_rps'] or 0:8.1f} {r['errors']:6d}")
+    total = sum(statuses.values())
+    print(f"\nTentativas de login: {total} ({total / elapsed:.0f}/s, {args.attackers} conexões, "
+          f"{args.ips or 'um IP novo a cada tentativa'}{' IPs' if args.ips else ''})")
+    for status, count in sorted(statuses.items(), key=lambda item: str(item[0])):
+        print(f"  {status}: {count}")
+    print(f"Arquivos temporários em {workdir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,361 @@
+# scripts/bench_routes.py
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import re
+import resource
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+# Importa as configurações do app a partir do diretório pai
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+# Uma rota "piorou" se o p95 subir mais que a tolerância e mais que este mínimo
+REGRESSION_MIN_MS = 1.0
+_QUERIES_RE = re.compile(r'db;dur=[\d.]+;desc="(\d+) consulta')
+
+
+def percentile(sorted_values, p):
+    """Percentil pelo método do posto mais próximo (valores já ordenados)."""
+    if not sorted_values:
+        return None
+    rank = max(1, round(p / 100 * len(sorted_values) + 0.5))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(latencies, queries, elapsed, errors=0):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3) if latencies else None,
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3) if latencies else None,
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'queries_per_request': round(sum(queries) / len(queries), 2) if queries else None,
+    }
+
+
+def build_routes(app, db, Product, User, bcrypt):
+    """Rotas públicas e do painel, com ids reais do catálogo sintético."""
+    from sqlalchemy import select
+    with app.app_context():
+        product_ids = db.session.scalars(select(Product.id).order_by(Product.id)).all()
+        middle = product_ids[len(product_ids) // 2]
+        category_id = db.session.scalar(select(Product.category_id).where(Product.id == middle))
+        admin = User.query.filter_by(username='bench').first()
+        if admin is None:
+            admin = User(username='bench', password=bcrypt.generate_password_hash('bench').decode('utf-8'))
+            db.session.add(admin)
+            db.session.commit()
+        admin_id = admin.id
+    # (nome no relatório, método, URL, exige login)
+    routes = [
+        ('GET /', 'GET', '/', False),
+        ('GET /loja', 'GET', '/loja', False),
+        ('GET /loja?cursor', 'GET', f'/loja?cursor={middle}', False),
+        ('GET /loja/produtos', 'GET', f'/loja/produtos?cursor={middle}', False),
+        ('GET /categoria/<id>', 'GET', f'/categoria/{category_id}', False),
+        ('GET /produto/<id>', 'GET', f'/produto/{middle}', False),
+        ('GET /busca', 'GET', '/busca?q=produto+sintetico', False),
+        ('GET /busca/sugestoes', 'GET', '/busca/sugestoes?q=sint', False),
+        ('GET /sitemap.xml', 'GET', '/sitemap.xml', False),
+        ('GET /robots.txt', 'GET', '/robots.txt', False),
+        ('POST /carrinho/adicionar/<id>', 'POST', f'/carrinho/adicionar/{middle}', False),
+        ('GET /carrinho', 'GET', '/carrinho', False),
+        ('GET /admin', 'GET', '/admin', True),
+        ('GET /admin/produto/editar/<id>', 'GET', f'/admin/produto/editar/{middle}', True),
+        ('GET /admin/produto/galeria/<id>', 'GET', f'/admin/produto/galeria/{middle}', True),
+        ('GET /admin/categorias', 'GET', '/admin/categorias', True),
+        ('GET /admin/usuarios', 'GET', '/admin/usuarios', True),
+        ('GET /admin/exportar', 'GET', '/admin/exportar', True),
+        ('GET /admin/metrics', 'GET', '/admin/metrics', True),
+    ]
+    return routes, admin_id
+
+
+def run_test_client(app, caches, routes, admin_id, requests, cold):
+    """Mede cada rota com o test client do Flask; `cold` esvazia os caches do catálogo antes de cada requisição."""
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+    results = {}
+    for name, method, url, needs_login in routes:
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            if cold:
+                for cache in caches:
+                    cache.clear()
+            t = time.perf_counter()
+            response = client.open(url, method=method)
+            response.get_data()
+            latencies.append(time.perf_counter() - t)
+            if response.status_code >= 400 or (needs_login and response.status_code == 302):
+                errors += 1
+            match = _QUERIES_RE.search(response.headers.get('Server-Timing', ''))
+            if match:
+                queries.append(int(match.group(1)))
+        results[name] = summarize(latencies, queries, time.perf_counter() - started, errors)
+    cookie = client.get_cookie('session')
+    return results, cookie.value if cookie else None
+
+
+def run_http(base_url, routes, session_cookie, concurrency, duration):
+    """Carga HTTP concorrente: cada thread mantém uma conexão e percorre as rotas em rodízio."""
+    target = base_url.split('://', 1)[1]
+    samples = {name: [] for name, *_ in routes}
+    queries = {name: [] for name, *_ in routes}
+    errors = {name: 0 for name, *_ in routes}
+    lock = threading.Lock()
+
+    # Aquecimento: cada worker monta caches e índice de busca antes da medição
+    for _ in range(4):
+        for name, method, url, needs_login in routes:
+            conn = http.client.HTTPConnection(target, timeout=60)
+            conn.request(method, url, headers={'Cookie': f'session={session_cookie}'} if needs_login and session_cookie else {})
+            conn.getresponse().read()
+            conn.close()
+    deadline = time.perf_counter() + duration
+
+    def worker(offset):
+        conn = http.client.HTTPConnection(target, timeout=30)
+        i = offset
+        while time.perf_counter() < deadline:
+            name, method, url, needs_login = routes[i % len(routes)]
+            i += 1
+            headers = {'Accept-Encoding': 'gzip, br'}
+            if needs_login and session_cookie:
+                headers['Cookie'] = f'session={session_cookie}'
+            t = time.perf_counter()
+            try:
+                conn.request(method, url, headers=headers)
+                response = conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                conn = http.client.HTTPConnection(target, timeout=30)
+                with lock:
+                    errors[name] += 1
+                continue
+            elapsed = time.perf_counter() - t
+            match = _QUERIES_RE.search(response.getheader('Server-Timing', ''))
+            with lock:
+                samples[name].append(elapsed)
+                if response.status >= 400 or (needs_login and response.status == 302):
+                    errors[name] += 1
+                if match:
+                    queries[name].append(int(match.group(1)))
+        conn.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    results = {name: summarize(samples[name], queries[name], elapsed, errors[name]) for name in samples}
+    all_samples = [value for values in samples.values() for value in values]
+    results['total'] = summarize(all_samples, [q for values in queries.values() for q in values],
+                                 elapsed, sum(errors.values()))
+    return results
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_gunicorn(workers, env, worker_class='sync', threads=1, preload=True):
+    """Sobe um gunicorn local com o gunicorn.conf.py do projeto."""
+    port = _free_port()
+    env = dict(env, GUNICORN_WORKER_CLASS=worker_class, GUNICORN_THREADS=str(threads),
+               GUNICORN_PRELOAD='1' if preload else '0')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-w', str(workers),
+         '-b', f'127.0.0.1:{port}', 'app:app'],
+        cwd=ROOT_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    for _ in range(300):
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.1):
+                return process, f'http://127.0.0.1:{port}'
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("O gunicorn não subiu a tempo.")
+
+
+def wait_ready(base_url, path='/'):
+    """Espera a primeira resposta 200 do servidor; devolve o instante (perf_counter)."""
+    target = base_url.split('://', 1)[1]
+    for _ in range(600):
+        try:
+            conn = http.client.HTTPConnection(target, timeout=60)
+            conn.request('GET', path)
+            if conn.getresponse().status == 200:
+                return time.perf_counter()
+        except (OSError, http.client.HTTPException):
+            pass
+        finally:
+            conn.close()
+        time.sleep(0.05)
+    raise RuntimeError("O gunicorn não respondeu a tempo.")
+
+
+def worker_peak_rss_kb(parent_pid):
+    """Maior pico de memória (VmHWM) entre os workers do gunicorn, lido do /proc (Linux)."""
+    peak = None
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else ():
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            if ppid != parent_pid:
+                continue
+            with open(f'/proc/{entry}/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        peak = max(peak or 0, int(line.split()[1]))
+        except (OSError, ValueError, IndexError):
+            continue
+    return peak
+
+
+def compare(results, baseline, tolerance):
+    """Lista as rotas cujo p95 piorou em relação à linha de base."""
+    regressions = []
+    for mode in ('test_client_cold', 'test_client_warm', 'http'):
+        for name, current in results.get(mode, {}).items():
+            previous = baseline.get(mode, {}).get(name)
+            if not previous or previous.get('p95_ms') is None or current.get('p95_ms') is None:
+                continue
+            old, new = previous['p95_ms'], current['p95_ms']
+            if new > old * (1 + tolerance) and new - old > REGRESSION_MIN_MS:
+                regressions.append((mode, name, old, new))
+    return regressions
+
+
+def print_table(title, results):
+    print(f"\n=== {title} ===")
+    print(f"{'rota':38s} {'req':>6s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'req/s':>8s} {'SQL/req':>8s} {'erros':>6s}")
+    for name, r in results.items():
+        cells = [r['p50_ms'], r['p95_ms'], r['p99_ms'], r['throughput_rps'], r['queries_per_request']]
+        cells = ['-' if value is None else f"{value:.2f}" if isinstance(value, float) else str(value) for value in cells]
+        print(f"{name:38s} {r['requests']:6d} {cells[0]:>9s} {cells[1]:>9s} {cells[2]:>9s} {cells[3]:>8s} {cells[4]:>8s} {r['errors']:6d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das rotas com um catálogo sintético (test client e carga HTTP).")
+    parser.add_argument('--products', type=int, default=1000, help="produtos sintéticos (ex.: 1000, 10000, 100000)")
+    parser.add_argument('--images', type=int, default=2, help="imagens de galeria por produto")
+    parser.add_argument('--categories', type=int, default=12)
+    parser.add_argument('--database-url', help="banco vazio a usar (padrão: SQLite temporário)")
+    parser.add_argument('--requests', type=int, default=50, help="requisições por rota no test client")
+    parser.add_argument('--http', action='store_true', help="também roda a carga HTTP num gunicorn local")
+    parser.add_argument('--workers', type=int, default=2, help="workers do gunicorn na carga HTTP")
+    parser.add_argument('--worker-class', choices=('sync', 'gthread', 'gevent'), default='sync',
+                        help="tipo de worker do gunicorn na carga HTTP")
+    parser.add_argument('--threads', type=int, default=4, help="threads por worker com --worker-class gthread")
+    parser.add_argument('--no-preload', action='store_true', help="carrega o app em cada worker (sem --preload)")
+    parser.add_argument('--concurrency', type=int, default=8, help="conexões simultâneas na carga HTTP")
+    parser.add_argument('--duration', type=float, default=15, help="segundos de carga HTTP")
+    parser.add_argument('--save', metavar='ARQUIVO', help="grava os resultados em JSON (linha de base)")
+    parser.add_argument('--compare', metavar='ARQUIVO', help="compara com uma linha de base gravada antes")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="piora aceitável do p95 (padrão: 20%%)")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_routes_')
+    # O app lê estas variáveis no import, então precisam vir antes dele
+    os.environ['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    os.environ['CATALOG_VERSION_FILE'] = os.path.join(workdir, 'catalog_version')
+    os.environ['METRICS_DIR'] = os.path.join(workdir, 'metrics')
+    from app import app
+    from catalog import catalog_cache, page_cache
+    from extensions import db, bcrypt
+    from models import Product, User
+    from explain_queries import seed_catalog
+    from upgrade_db import upgrade
+
+    with app.app_context():
+        upgrade()
+        if db.session.query(Product.id).first() is not None:
+            print("ERRO: o benchmark precisa de um banco sem produtos.")
+            return 2
+        dialect = db.engine.dialect.name
+        started = time.perf_counter()
+        seed_catalog(args.products, categories=args.categories, images=args.images)
+        print(f"Catálogo sintético: {args.products} produtos, {args.images} imagens cada, "
+              f"{args.categories} categorias ({time.perf_counter() - started:.1f}s)")
+
+    routes, admin_id = build_routes(app, db, Product, User, bcrypt)
+    results = {
+        'meta': {
+            'date': datetime.now().isoformat(timespec='seconds'),
+            'products': args.products, 'images': args.images, 'categories': args.categories,
+            'database': dialect, 'python': platform.python_version(), 'requests_per_route': args.requests,
+        },
+    }
+    results['test_client_cold'], session_cookie = run_test_client(app, (catalog_cache, page_cache), routes, admin_id, args.requests, cold=True)
+    results['test_client_warm'], _ = run_test_client(app, (catalog_cache, page_cache), routes, admin_id, args.requests, cold=False)
+    # ru_maxrss vem em KB no Linux
+    results['meta']['test_client_peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print_table("test client, cache frio", results['test_client_cold'])
+    print_table("test client, cache quente", results['test_client_warm'])
+
+    if args.http:
+        threads = args.threads if args.worker_class == 'gthread' else 1
+        started = time.perf_counter()
+        process, base_url = start_gunicorn(args.workers, dict(os.environ), args.worker_class, threads,
+                                           preload=not args.no_preload)
+        try:
+            results['meta']['http_ready_seconds'] = round(wait_ready(base_url) - started, 2)
+            results['http'] = run_http(base_url, routes, session_cookie, args.concurrency, args.duration)
+            results['meta']['http_worker_peak_rss_kb'] = worker_peak_rss_kb(process.pid)
+        finally:
+            process.terminate()
+            process.wait()
+        results['meta'].update(workers=args.workers, worker_class=args.worker_class, threads=threads,
+                               preload=not args.no_preload, concurrency=args.concurrency, duration=args.duration)
+        label = args.worker_class + (f" x{threads} threads" if threads > 1 else '') + ('' if args.no_preload else ', preload')
+        print_table(f"HTTP, {args.workers} workers {label}, {args.concurrency} conexões, {args.duration:.0f}s", results['http'])
+        print(f"Primeira resposta do gunicorn em {results['meta']['http_ready_seconds']:.2f}s (com aquecimento)")
+
+    print(f"\nPico de memória (RSS): test client {results['meta']['test_client_peak_rss_kb'] / 1024:.0f} MB"
+          + (f", worker do gunicorn {results['meta']['http_worker_peak_rss_kb'] / 1024:.0f} MB"
+             if results['meta'].get('http_worker_peak_rss_kb') else ''))
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Resultados salvos em '{args.save}'.")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n--- Rotas mais lentas que a linha de base (p95, tolerância {args.tolerance:.0%}) ---")
+            for mode, name, old, new in regressions:
+                print(f"{mode:18s} {name:38s} {old:8.2f} ms -> {new:8.2f} ms")
+            return 1
+        print("\nNenhuma rota piorou em relação à linha de base.")
+    print(f"Arquivos temporários em {workdir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,160 @@
+# scripts/bench_sqlite.py
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+# Importa as configurações do app a partir do diretório pai
+import sys
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT_DIR)
+
+MODES = [
+    ("padrão do SQLite (journal delete)", '0'),
+    ("produção (WAL, sqlite_tuning.py)", '1'),
+]
+
+
+def run_setup(products):
+    """Cria o esquema e o catálogo sintético no banco do ambiente."""
+    from factory import create_app
+    from explain_queries import seed_catalog
+    from upgrade_db import upgrade
+    with create_app().app_context():
+        upgrade()
+        seed_catalog(products)
+
+
+def run_reader(stop_file, out_file, seed):
+    """Lê o catálogo (sem os caches) até o arquivo de parada aparecer.
+
+    Cada leitura é o que uma página de categoria e uma página de produto fazem no
+    banco; grava (início, latência, ok) de cada uma para o processo principal.
+    """
+    from sqlalchemy.exc import OperationalError
+    from catalog import catalog_query, paginate_catalog
+    from extensions import db
+    from factory import create_app
+    from models import Product
+    rng = random.Random(seed)
+    samples = []
+    with create_app().app_context():
+        max_id = db.session.query(db.func.max(Product.id)).scalar()
+        while not os.path.exists(stop_file):
+            started = time.time()
+            ok = True
+            try:
+                query = catalog_query().filter(Product.category_id == rng.randint(1, 20))
+                paginate_catalog(query, cursor=rng.randint(1, max_id))
+                product = db.session.get(Product, rng.randint(1, max_id))
+                if product is not None:
+                    list(product.images)
+                db.session.rollback()
+            except OperationalError:
+                db.session.rollback()
+                ok = False
+            samples.append((started, time.time() - started, ok))
+            db.session.expunge_all()
+    with open(out_file, 'w') as f:
+        json.dump(samples, f)
+
+
+def window_stats(samples, start, end):
+    inside = [(latency, ok) for started, latency, ok in samples if start <= started < end]
+    latencies = sorted(latency * 1000 for latency, ok in inside if ok)
+    errors = sum(1 for _, ok in inside if not ok)
+    if not latencies:
+        return {'rate': 0, 'p50': 0, 'p99': 0, 'max': 0, 'errors': errors}
+    return {
+        'rate': len(latencies) / (end - start),
+        'p50': statistics.median(latencies),
+        'p99': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        'max': latencies[-1],
+        'errors': errors,
+    }
+
+
+def run_mode(workdir, tuning, args):
+    os.makedirs(workdir, exist_ok=True)
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(workdir, 'bench.db'),
+               CATALOG_VERSION_FILE=os.path.join(workdir, 'catalog_version'),
+               METRICS_DIR=os.path.join(workdir, 'metrics'),
+               SQLITE_TUNING=tuning,
+               WARM_UP='0')
+    script = os.path.abspath(__file__)
+    subprocess.run([sys.executable, script, '--role', 'setup', '--products', str(args.products)],
+                   env=env, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    from bench_import import generate_csv
+    csv_path = os.path.join(workdir, 'produtos.csv')
+    # Os primeiros produtos já existem (atualização de preço); o resto é novo
+    generate_csv(csv_path, args.import_rows, [f"Categoria {i}" for i in range(20)], price_shift=1)
+
+    stop_file = os.path.join(workdir, 'parar')
+    readers = []
+    for i in range(args.readers):
+        out_file = os.path.join(workdir, f'leitor{i}.json')
+        readers.append((out_file, subprocess.Popen(
+            [sys.executable, script, '--role', 'reader', '--stop-file', stop_file, '--out', out_file, '--seed', str(i)],
+            env=env)))
+    # Partida dos leitores (import do app) fora das janelas medidas
+    time.sleep(args.idle + 2)
+    idle_start = time.time() - args.idle
+    import_start = time.time()
+    subprocess.run([sys.executable, os.path.join(ROOT_DIR, 'manage.py'), 'import', csv_path,
+                    '--batch-size', str(args.batch_size), '--skip-related'],
+                   env=env, check=True, stdout=subprocess.DEVNULL, cwd=ROOT_DIR)
+    import_end = time.time()
+    open(stop_file, 'w').close()
+
+    samples = []
+    for out_file, process in readers:
+        process.wait()
+        with open(out_file) as f:
+            samples.extend(json.load(f))
+    return import_end - import_start, window_stats(samples, idle_start, import_start), \
+        window_stats(samples, import_start, import_end)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mede leituras concorrentes do catálogo durante uma importação, no SQLite padrão e no modo WAL.")
+    parser.add_argument('--products', type=int, default=5000, help="produtos no catálogo antes da importação")
+    parser.add_argument('--import-rows', type=int, default=20000, help="linhas do CSV importado")
+    parser.add_argument('--batch-size', type=int, default=1000, help="linhas por lote (um commit por lote)")
+    parser.add_argument('--readers', type=int, default=2, help="processos leitores (como workers do gunicorn)")
+    parser.add_argument('--idle', type=float, default=3, help="segundos de leitura sem importação (referência)")
+    parser.add_argument('--role', choices=['setup', 'reader'], help=argparse.SUPPRESS)
+    parser.add_argument('--stop-file', help=argparse.SUPPRESS)
+    parser.add_argument('--out', help=argparse.SUPPRESS)
+    parser.add_argument('--seed', type=int, default=0, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role == 'setup':
+        return run_setup(args.products)
+    if args.role == 'reader':
+        return run_reader(args.stop_file, args.out, args.seed)
+
+    workdir = tempfile.mkdtemp(prefix='bench_sqlite_')
+    results = []
+    for label, tuning in MODES:
+        print(f"Medindo: {label}...")
+        results.append((label,) + run_mode(os.path.join(workdir, 'modo' + tuning), tuning, args))
+
+    print(f"\n=== {args.readers} leitores, importação de {args.import_rows} linhas "
+          f"(lotes de {args.batch_size}) sobre {args.products} produtos ===")
+    print(f"{'modo':36s} {'importação':>10s} {'leituras/s':>16s} {'p50 ms':>7s} {'p99 ms':>7s} {'máx ms':>7s} {'erros':>6s}")
+    for label, import_seconds, idle, during in results:
+        print(f"{label:36s} {import_seconds:9.1f}s {idle['rate']:7.0f} -> {during['rate']:6.0f} "
+              f"{during['p50']:7.1f} {during['p99']:7.1f} {during['max']:7.0f} {during['errors']:6d}")
+    print("(leituras/s: sem importação -> durante a importação; latências durante a importação)")
+    print(f"Arquivos temporários em {workdir}")
+
+
+if __name__ == '__main__':
+    main()
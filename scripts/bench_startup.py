@@ -0,0 +1,108 @@
+# scripts/bench_startup.py
+
+import argparse
+import os
+import statistics
+import subprocess
+import tempfile
+import time
+from collections import Counter
+# Importa as configurações do app a partir do diretório pai
+import sys
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(ROOT_DIR)
+
+# Pacotes pesados que só alguns caminhos deveriam carregar
+WATCHED = ('alembic', 'PIL', 'wtforms', 'flask_wtf', 'bcrypt', 'flask_login', 'app')
+
+
+def targets(workdir):
+    """(nome, argumentos do python) de cada ponto de entrada medido."""
+    csv_path = os.path.join(workdir, 'produtos.csv')
+    return [
+        ('worker (import app)', ['-c', 'import app']),
+        ('manage.py --help', ['manage.py', '--help']),
+        ('manage.py export', ['manage.py', 'export', '-o', csv_path]),
+        ('manage.py import --dry-run', ['manage.py', 'import', csv_path, '--dry-run']),
+        ('manage.py create-admin', ['manage.py', 'create-admin', '--username', 'admin', '--password', 'senha-do-bench']),
+        ('manage.py gc', ['manage.py', 'gc', '--top', '1']),
+        ('manage.py reindex', ['manage.py', 'reindex']),
+    ]
+
+
+def parse_importtime(stderr):
+    """Soma o tempo próprio de cada import (-X importtime) por pacote de topo."""
+    packages, total = Counter(), 0
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        packages[package] += int(self_us)
+        total += int(self_us)
+    return total / 1000, packages
+
+
+def measure(args, env, runs):
+    walls, imports, packages = [], [], Counter()
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=ROOT_DIR, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        walls.append((time.perf_counter() - started) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"{' '.join(args)} falhou:\n{result.stderr[-2000:]}")
+        import_ms, packages = parse_importtime(result.stderr)
+        imports.append(import_ms)
+    return statistics.median(walls), statistics.median(imports), packages
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mede o tempo de partida (python -X importtime) do worker e de cada comando do manage.py.")
+    parser.add_argument('--products', type=int, default=1000, help="produtos sintéticos no catálogo")
+    parser.add_argument('--runs', type=int, default=5, help="execuções de cada ponto de entrada (vale a mediana)")
+    parser.add_argument('--top', type=int, default=8, help="pacotes mais caros listados para cada ponto de entrada")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_startup_')
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(workdir, 'bench.db'),
+               CATALOG_VERSION_FILE=os.path.join(workdir, 'catalog_version'),
+               METRICS_DIR=os.path.join(workdir, 'metrics'),
+               IMAGE_QUARANTINE_DIR=os.path.join(workdir, 'quarentena'),
+               # O bench mede a partida, não o custo do bcrypt
+               BCRYPT_LOG_ROUNDS='4',
+               # Sem o aquecimento do gunicorn, como num worker sem --preload
+               WARM_UP='0')
+    os.environ.update({key: env[key] for key in ('DATABASE_URL', 'CATALOG_VERSION_FILE', 'METRICS_DIR')})
+    from factory import create_app
+    from explain_queries import seed_catalog
+    from upgrade_db import upgrade
+
+    with create_app().app_context():
+        upgrade()
+        seed_catalog(args.products)
+    # Primeira passada fora da medição: cria o CSV usado pelo import e aquece os .pyc
+    for _, target in targets(workdir):
+        measure(target, env, 1)
+
+    print(f"\n=== Partida a frio, mediana de {args.runs} execuções, {args.products} produtos ===")
+    print(f"{'ponto de entrada':30s} {'total ms':>9s} {'imports ms':>11s}  carregados")
+    details = []
+    for name, target in targets(workdir):
+        wall, import_ms, packages = measure(target, env, args.runs)
+        loaded = ', '.join(package for package in WATCHED if package in packages) or '-'
+        print(f"{name:30s} {wall:9.0f} {import_ms:11.0f}  {loaded}")
+        details.append((name, packages))
+
+    print("\nPacotes mais caros (tempo próprio dos imports, ms):")
+    for name, packages in details:
+        top = ', '.join(f"{package} {us / 1000:.0f}" for package, us in packages.most_common(args.top))
+        print(f"  {name}: {top}")
+    print(f"Arquivos temporários em {workdir}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,22 @@
+# scripts/build_assets.py
+
+import time
+# Importa as configurações do app a partir do diretório pai
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from static_assets import brotli
+from extensions import static_manifest, sorteio_manifest
+
+def build_assets():
+    """Atualiza os manifestos de estáticos e gera as versões .gz/.br (rodar no deploy)."""
+    started = time.perf_counter()
+    for label, manifest in (('static', static_manifest), ('sorteio', sorteio_manifest)):
+        compressed = manifest.build()
+        print(f"{label}: {len(manifest)} arquivos no manifesto, {compressed} versões comprimidas geradas.")
+    if brotli is None:
+        print("AVISO: pacote Brotli não instalado; só as versões .gz foram geradas.")
+    print(f"Concluído em {time.perf_counter() - started:.2f}s.")
+
+if __name__ == '__main__':
+    build_assets()
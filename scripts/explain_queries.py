@@ -0,0 +1,189 @@
+# scripts/explain_queries.py
+
+import argparse
+import json
+import random
+import re
+# Importa as configurações do app a partir do diretório pai
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import event, func, insert, select
+from app import app
+from catalog import catalog_cache, page_cache, search_index
+from extensions import db
+from models import Product, Category, ProductImage, utcnow
+
+# Tabelas menores que isso podem ser lidas inteiras: o planejador faz certo em não usar índice
+SMALL_TABLE_ROWS = 1000
+SEED_BATCH = 5000
+
+
+def seed_catalog(products, categories=20, images=2, seed=42):
+    """Preenche um banco vazio com um catálogo sintético: `images` fotos de galeria por produto."""
+    rng = random.Random(seed)
+    db.session.execute(insert(Category), [{'name': f"Categoria {i}", 'updated_at': utcnow()} for i in range(categories)])
+    category_ids = db.session.scalars(select(Category.id)).all()
+    for start in range(0, products, SEED_BATCH):
+        rows = []
+        for i in range(start, min(start + SEED_BATCH, products)):
+            price = rng.randint(1000, 500000) / 100
+            rows.append({
+                'name': f"Produto Sintético {i}",
+                'description': f"<p>Descrição do produto sintético {i}.</p>",
+                'price': price,
+                'promo_price': round(price * 0.9, 2) if i % 7 == 0 else None,
+                'image_file': f"{i:016x}.jpg",
+                'is_featured': i % 500 == 0,
+                'category_id': category_ids[i % len(category_ids)],
+                'updated_at': utcnow(),
+            })
+        ids = db.session.scalars(insert(Product).returning(Product.id), rows).all()
+        gallery = [{'product_id': product_id, 'image_filename': f"{product_id:016x}_{n}.jpg"}
+                   for product_id in ids for n in range(images)]
+        if gallery:
+            db.session.execute(insert(ProductImage), gallery)
+        db.session.commit()
+    # Atualiza as estatísticas usadas pelo planejador
+    db.session.execute(db.text('ANALYZE'))
+    db.session.commit()
+
+
+def sample_routes():
+    """URLs públicas a verificar, com ids reais do banco."""
+    product_ids = db.session.scalars(select(Product.id).order_by(Product.id)).all()
+    if not product_ids:
+        return ['/', '/loja', '/sitemap.xml', '/busca?q=capa']
+    middle = product_ids[len(product_ids) // 2]
+    category_id = db.session.scalar(select(Product.category_id).where(Product.id == middle))
+    return [
+        '/',
+        '/loja',
+        f'/loja?cursor={middle}',
+        f'/loja/produtos?cursor={middle}',
+        f'/categoria/{category_id}',
+        f'/categoria/{category_id}?cursor={middle}',
+        f'/loja/produtos?categoria={category_id}&cursor={middle}',
+        f'/produto/{middle}',
+        '/busca?q=capa',
+        '/busca/sugestoes?q=pel',
+        '/sitemap.xml',
+        '/sitemap-1.xml',
+    ]
+
+
+def capture_queries(client, url):
+    """Requisita a URL com os caches vazios e devolve as consultas SQL executadas."""
+    queries = []
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            queries.append((statement, parameters))
+    catalog_cache.clear()
+    page_cache.clear()
+    search_index.clear()
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        response = client.get(url)
+        response.get_data()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return response.status_code, queries
+
+
+def _table_name(name):
+    # Apelidos gerados pelo SQLAlchemy ("category_1") apontam para a tabela real
+    return re.sub(r'_\d+$', '', name)
+
+
+def explain(conn, statement, parameters):
+    """Plano da consulta: (linhas do plano para exibir, tabelas lidas por inteiro)."""
+    if conn.dialect.name == 'postgresql':
+        plan = conn.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + statement, parameters).scalar()
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        lines, scans = [], []
+        def walk(node, depth):
+            relation = node.get('Relation Name')
+            lines.append('  ' * depth + node['Node Type'] + (f" on {relation}" if relation else '')
+                         + (f" using {node['Index Name']}" if 'Index Name' in node else ''))
+            if node['Node Type'] == 'Seq Scan':
+                scans.append(relation)
+            for child in node.get('Plans', ()):
+                walk(child, depth + 1)
+        walk(plan[0]['Plan'], 0)
+        return lines, scans
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).all()
+    lines = [row[-1] for row in rows]
+    # "SCAN tabela" (com ou sem índice) percorre a tabela inteira; "SEARCH" usa o índice
+    scans = [_table_name(line.split()[1]) for line in lines if line.startswith('SCAN ')]
+    return lines, scans
+
+
+def classify(statement, lines, scans, table_rows):
+    """Decide se as leituras completas da consulta são aceitáveis."""
+    sql = ' '.join(statement.upper().split())
+    large = [table for table in scans if table_rows.get(table, 0) >= SMALL_TABLE_ROWS]
+    if not large:
+        return 'ok'
+    if ' WHERE ' not in sql and (' LIMIT ' not in sql or ' OFFSET ' in sql):
+        # Sem filtro a consulta lê tudo de propósito (índice de busca, contagens e as
+        # fronteiras dos sitemaps, que ficam em cache até o catálogo mudar)
+        return 'leitura completa'
+    sorts = any('TEMP B-TREE' in line or line.strip().startswith('Sort') for line in lines)
+    if ' WHERE ' not in sql and ' LIMIT ' in sql and not sorts:
+        # Primeira página: percorre a chave primária já na ordem e para no LIMIT
+        return 'ok'
+    return 'SCAN: ' + ', '.join(sorted(set(large)))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Roda EXPLAIN nas consultas de cada rota pública e aponta leituras sequenciais.")
+    parser.add_argument('--seed', type=int, metavar='N',
+                        help="aplica as migrações e cria N produtos sintéticos (só em banco sem produtos)")
+    parser.add_argument('-v', '--verbose', action='store_true', help="mostra o SQL e o plano de todas as consultas")
+    args = parser.parse_args()
+
+    with app.app_context():
+        if args.seed:
+            from upgrade_db import upgrade
+            upgrade()
+            if db.session.scalar(select(func.count(Product.id))):
+                print("ERRO: --seed só pode ser usado em um banco sem produtos.")
+                return 2
+            print(f"Criando {args.seed} produtos sintéticos...")
+            seed_catalog(args.seed)
+
+        table_rows = {model.__tablename__: db.session.scalar(select(func.count()).select_from(model))
+                      for model in (Category, Product, ProductImage)}
+        dialect = db.engine.dialect.name
+        print(f"Banco {dialect}: " + ', '.join(f"{table} = {rows} linhas" for table, rows in table_rows.items()))
+
+        client = app.test_client()
+        problems = 0
+        for url in sample_routes():
+            status, queries = capture_queries(client, url)
+            print(f"\n{url} -> {status}, {len(queries)} consultas")
+            with db.engine.connect() as conn:
+                for statement, parameters in queries:
+                    lines, scans = explain(conn, statement, parameters)
+                    verdict = classify(statement, lines, scans, table_rows)
+                    if verdict.startswith('SCAN'):
+                        problems += 1
+                    if args.verbose or verdict != 'ok':
+                        print(f"  [{verdict}] {' '.join(statement.split())[:160]}")
+                        for line in lines:
+                            print(f"      {line}")
+                    else:
+                        print(f"  [ok] {' '.join(statement.split())[:100]}")
+
+        print()
+        if problems:
+            print(f"{problems} consultas fazem leitura sequencial de tabelas grandes.")
+            return 1
+        print("Nenhuma rota pública faz leitura sequencial de tabelas grandes.")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
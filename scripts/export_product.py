@@ -1,47 +1,70 @@
 # scripts/export_products.py
 
-import csv
+import argparse
 # Importa as configurações do app a partir do diretório pai
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app import app, db, Product, Category
+from catalog import iter_export, iter_export_rows, iter_gzip, parse_utc_datetime, EXPORT_FORMATS
+from factory import create_app
 
 # Define o nome do arquivo de saída na pasta principal do projeto
 OUTPUT_FILENAME = os.path.join(os.path.dirname(__file__), '..', 'produtos_exportados.csv')
 
-def export_data():
-    """Lê os produtos do banco de dados e os salva em um arquivo CSV."""
-    with app.app_context():
-        print("Iniciando exportação de produtos do banco de dados local...")
-        
-        products = Product.query.all()
-        if not products:
-            print("Nenhum produto encontrado para exportar.")
-            return
-
-        with open(OUTPUT_FILENAME, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.writer(f)
-            
-            # Escreve o cabeçalho
-            writer.writerow([
-                'name', 'description', 'price', 'promo_price', 
-                'image_file', 'is_featured', 'category_name'
-            ])
-            
-            # Escreve os dados de cada produto
-            for product in products:
-                writer.writerow([
-                    product.name,
-                    product.description,
-                    str(product.price),
-                    str(product.promo_price) if product.promo_price else '',
-                    product.image_file,
-                    product.is_featured,
-                    product.category.name
-                ])
-
-        print(f"Exportação concluída! {len(products)} produtos salvos em '{OUTPUT_FILENAME}'.")
+def export_data(output=OUTPUT_FILENAME, fmt='csv', use_gzip=False, after_id=None, since=None):
+    """Lê os produtos do banco de dados e os grava em CSV ou NDJSON, em streaming.
+
+    Precisa de um contexto do app (o `__main__` e o `manage.py export` criam um).
+    """
+    print("Iniciando exportação de produtos do banco de dados local...", file=sys.stderr)
+
+    exported, last_updated = 0, None
+    def counted(rows):
+        nonlocal exported, last_updated
+        for row in rows:
+            exported += 1
+            if row['updated_at'] and (last_updated is None or row['updated_at'] > last_updated):
+                last_updated = row['updated_at']
+            yield row
+
+    chunks = iter_export(counted(iter_export_rows(after_id, since)), fmt)
+    if use_gzip:
+        chunks = iter_gzip(chunks)
+
+    # "-" escreve na saída padrão, para encadear com outros comandos
+    if output == '-':
+        stream = sys.stdout.buffer if use_gzip else sys.stdout
+        for chunk in chunks:
+            stream.write(chunk)
+        stream.flush()
+    else:
+        mode = 'wb' if use_gzip else 'w'
+        with open(output, mode, **({} if use_gzip else {'newline': '', 'encoding': 'utf-8'})) as f:
+            for chunk in chunks:
+                f.write(chunk)
+
+    if not exported:
+        print("Nenhum produto encontrado para exportar.", file=sys.stderr)
+        return 0
+    print(f"Exportação concluída! {exported} produtos salvos em '{output}'.", file=sys.stderr)
+    if last_updated:
+        # Os produtos alterados nesse mesmo instante vêm de novo na próxima vez, o que é inofensivo
+        print(f"Para a próxima exportação incremental: --since {last_updated.isoformat()}", file=sys.stderr)
+    return exported
+
 
 if __name__ == '__main__':
-    export_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Exporta o catálogo de produtos em streaming.")
+    parser.add_argument('-o', '--output', help="arquivo de saída, ou - para a saída padrão")
+    parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+    parser.add_argument('--gzip', action='store_true', help="comprime a saída com gzip")
+    parser.add_argument('--after-id', type=int, help="exporta só produtos com id maior (só os novos)")
+    parser.add_argument('--since', type=parse_utc_datetime, metavar='DATA',
+                        help="exporta só produtos criados ou alterados desde a data (UTC, ISO 8601)")
+    args = parser.parse_args()
+
+    output = args.output
+    if output is None:
+        output = os.path.splitext(OUTPUT_FILENAME)[0] + '.' + args.format + ('.gz' if args.gzip else '')
+    with create_app().app_context():
+        export_data(output, args.format, args.gzip, args.after_id, args.since)
@@ -0,0 +1,92 @@
+# scripts/gc_images.py
+
+import argparse
+# Importa as configurações do app a partir do diretório pai
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import image_storage
+from factory import create_app
+from images import (audit_pictures, quarantine_orphans, restore_quarantine, purge_quarantine,
+                    QUARANTINE_DIR, QUARANTINE_DAYS)
+
+
+def _size(num_bytes):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if num_bytes < 1024 or unit == 'GB':
+            return f"{num_bytes:.0f} {unit}" if unit == 'B' else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Audita static/product_pics contra o banco e move as imagens órfãs para a quarentena.")
+    parser.add_argument('--quarantine', action='store_true', help="move os órfãos para a quarentena (sem isso, só mostra o relatório)")
+    parser.add_argument('--batch-size', type=int, default=image_storage.DEFAULT_BATCH_SIZE,
+                        help="arquivos movidos por lote (cada lote é conferido de novo no banco)")
+    parser.add_argument('--min-age', type=int, default=image_storage.DEFAULT_MIN_AGE, metavar='SEGUNDOS',
+                        help="arquivos sem referência mais novos que isso ainda não contam como órfãos")
+    parser.add_argument('--top', type=int, default=20, help="quantos produtos listar no espaço por produto")
+    parser.add_argument('--restore', metavar='LOTE', help="devolve à pasta os arquivos de um lote da quarentena")
+    parser.add_argument('--purge', type=int, nargs='?', const=QUARANTINE_DAYS, metavar='DIAS',
+                        help=f"apaga de vez os lotes da quarentena mais antigos que DIAS (padrão: {QUARANTINE_DAYS})")
+    parser.add_argument('-v', '--verbose', action='store_true', help="lista cada arquivo órfão e cada arquivo faltando")
+    args = parser.parse_args()
+
+    with create_app().app_context():
+        return collect(args.quarantine, args.batch_size, args.min_age, args.top, args.restore, args.purge, args.verbose)
+
+
+def collect(quarantine=False, batch_size=image_storage.DEFAULT_BATCH_SIZE, min_age=image_storage.DEFAULT_MIN_AGE,
+            top=20, restore=None, purge=None, verbose=False):
+    """Relatório, quarentena, restauração ou limpeza; devolve o código de saída.
+
+    Precisa de um contexto do app (o `main` e o `manage.py gc` criam um).
+    """
+    if restore:
+        if restore not in {name for name, _, _ in image_storage.quarantine_batches(QUARANTINE_DIR)}:
+            print(f"ERRO: lote '{restore}' não encontrado em {QUARANTINE_DIR}.")
+            return 2
+        print(f"{restore_quarantine(restore)} arquivos restaurados do lote {restore}.")
+        return 0
+    if purge is not None:
+        purged = purge_quarantine(purge)
+        for name, files, size in purged:
+            print(f"  {name}: {files} arquivos, {_size(size)}")
+        print(f"{len(purged)} lotes apagados da quarentena.")
+        return 0
+
+    report = audit_pictures(min_age=min_age)
+    print("--- Auditoria de static/product_pics ---")
+    print(f"Arquivos: {report.files} ({_size(report.total_bytes)})")
+    print(f"Órfãos: {len(report.orphans)} ({_size(report.reclaimable_bytes)} recuperáveis)")
+    if report.recent:
+        print(f"Sem referência, mas com menos de {min_age}s: {report.recent}")
+    print(f"Referências sem arquivo: {len(report.missing)}")
+    if verbose:
+        for name, size in report.orphans:
+            print(f"  órfão     {name} ({_size(size)})")
+        for product_id, filename in report.missing:
+            print(f"  faltando  produto {product_id}: {filename}")
+
+    print("\nProdutos que mais ocupam espaço:")
+    for product_id, size in report.largest_products(top):
+        print(f"  produto {product_id}: {_size(size)}")
+
+    batches = image_storage.quarantine_batches(QUARANTINE_DIR)
+    if batches:
+        print(f"\nQuarentena ({QUARANTINE_DIR}):")
+        for name, files, size in batches:
+            print(f"  {name}: {files} arquivos, {_size(size)}")
+
+    if quarantine and report.orphans:
+        batch_dir, moved = quarantine_orphans(report, batch_size)
+        print(f"\n{moved} arquivos movidos para {batch_dir}.")
+        print(f"Para desfazer: python scripts/gc_images.py --restore {os.path.basename(batch_dir)}")
+    elif report.orphans:
+        print("\nRode com --quarantine para mover os órfãos para a quarentena.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,50 @@
+# scripts/generate_image_variants.py
+
+# Importa as configurações do app a partir do diretório pai
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from PIL import Image, ImageOps
+from catalog import bump_catalog_version
+from factory import create_app
+from images import image_variants, save_image_variants, _picture_path, variant_formats
+from models import Product, ProductImage
+
+def generate_variants():
+    """Gera os derivados responsivos das imagens enviadas antes do pipeline existir.
+
+    Precisa de um contexto do app (o `__main__` e o `manage.py reindex --images` criam um).
+    """
+    print("Gerando derivados das imagens de produtos...")
+
+    filenames = {p.image_file for p in Product.query.all()}
+    filenames |= {i.image_filename for i in ProductImage.query.all()}
+
+    generated = skipped = missing = 0
+    for filename in sorted(filenames):
+        path = _picture_path(filename)
+        if not os.path.exists(path):
+            missing += 1
+            continue
+        # Já processada: tem derivados em todos os formatos modernos
+        if all(fmt in image_variants(filename) for fmt in variant_formats()):
+            skipped += 1
+            continue
+        with Image.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            image.load()
+            save_image_variants(image, filename)
+        generated += 1
+        print(f"  {filename}")
+
+    print("--- Resumo ---")
+    print(f"Imagens processadas: {generated}")
+    print(f"Já tinham derivados: {skipped}")
+    print(f"Arquivos não encontrados: {missing}")
+    if generated:
+        # As páginas em cache passam a ser geradas de novo, já com os derivados no srcset
+        bump_catalog_version()
+
+if __name__ == '__main__':
+    with create_app().app_context():
+        generate_variants()
@@ -1,12 +1,18 @@
 # scripts/import_products.py
 
+import argparse
 import csv
-from decimal import Decimal
+import time
+from decimal import Decimal, InvalidOperation
 # Importa as configurações do app a partir do diretório pai
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from app import app, db, Product, Category
+from sqlalchemy import insert, select, update
+from catalog import bump_catalog_version, update_related
+from extensions import db
+from factory import create_app
+from models import Product, Category, utcnow
 
 # ATENÇÃO: Altere este caminho dependendo de onde você vai rodar o script
 # Para rodar localmente, use o caminho relativo
@@ -14,76 +20,263 @@ CSV_FILENAME = 'produtos_exportados.csv'
 # Para rodar no Render com Disco Persistente, use o caminho absoluto do disco
 # CSV_FILENAME = '/var/data/produtos_exportados.csv'
 
-def import_data():
-    """Lê produtos do CSV e os cria ou atualiza no banco de dados."""
-    created_count = 0
-    updated_count = 0
-    
-    with app.app_context():
-        print("Iniciando importação/atualização de produtos...")
-        
-        try:
-            with open(CSV_FILENAME, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                header = next(reader) # Pula o cabeçalho
-
-                for row in reader:
-                    # Mapeia a linha do CSV para um dicionário para fácil acesso
-                    data = dict(zip(header, row))
-                    
-                    product_name = data.get('name')
-                    if not product_name:
-                        continue
+# Quantas linhas vão em cada lote (um INSERT e um upsert por lote, e um commit)
+BATCH_SIZE = 1000
+# Colunas comparadas para decidir se um produto existente mudou
+PRODUCT_FIELDS = ('description', 'price', 'promo_price', 'image_file', 'is_featured', 'category_id')
 
-                    category_name = data.get('category_name')
-                    category = Category.query.filter_by(name=category_name).first()
+class ImportStats:
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.skipped = 0
+        self.categories_created = 0
+        self.changed_ids = []
+        self.batches_committed = 0
+        self.started = time.perf_counter()
 
-                    if not category:
-                        print(f"AVISO: Categoria '{category_name}' não encontrada. Pulando produto '{product_name}'.")
-                        continue
-                    
-                    # Converte os valores
-                    price = Decimal(data.get('price'))
-                    promo_price = Decimal(data.get('promo_price')) if data.get('promo_price') else None
-                    is_featured = True if data.get('is_featured', '').lower() == 'true' else False
-
-                    # A LÓGICA PRINCIPAL: VERIFICA SE O PRODUTO JÁ EXISTE
-                    product = Product.query.filter_by(name=product_name).first()
-
-                    if product:
-                        # SE EXISTE, ATUALIZA
-                        product.description = data.get('description')
-                        product.price = price
-                        product.promo_price = promo_price
-                        product.image_file = data.get('image_file', 'placeholder.png')
-                        product.is_featured = is_featured
-                        product.category_id = category.id
-                        updated_count += 1
-                    else:
-                        # SE NÃO EXISTE, CRIA
-                        new_product = Product(
-                            name=product_name,
-                            description=data.get('description'),
-                            price=price,
-                            promo_price=promo_price,
-                            image_file=data.get('image_file', 'placeholder.png'),
-                            is_featured=is_featured,
-                            category_id=category.id
-                        )
-                        db.session.add(new_product)
-                        created_count += 1
-                
-                db.session.commit()
-                print("--- Resumo da Importação ---")
-                print(f"Produtos criados: {created_count}")
-                print(f"Produtos atualizados: {updated_count}")
-                print("----------------------------")
+    @property
+    def rate(self):
+        return self.rows / max(time.perf_counter() - self.started, 1e-9)
+
+
+def parse_row(data, categories, stats, create_categories, dry_run):
+    """Converte uma linha do CSV nos valores da tabela product (ou None para pular)."""
+    product_name = data.get('name')
+    if not product_name:
+        stats.skipped += 1
+        return None
+
+    category_name = data.get('category_name')
+    category_id = categories.get(category_name)
+    if category_id is None:
+        if not (create_categories and category_name):
+            print(f"AVISO: Categoria '{category_name}' não encontrada. Pulando produto '{product_name}'.")
+            stats.skipped += 1
+            return None
+        if dry_run:
+            # Id fictício só para o relatório; nada é gravado
+            category_id = -(len(categories) + 1)
+        else:
+            category_id = db.session.execute(
+                insert(Category).values(name=category_name).returning(Category.id)
+            ).scalar_one()
+        categories[category_name] = category_id
+        stats.categories_created += 1
+        print(f"Categoria criada: '{category_name}'")
+
+    try:
+        price = Decimal(data.get('price'))
+        promo_price = Decimal(data.get('promo_price')) if data.get('promo_price') else None
+    except (InvalidOperation, TypeError):
+        print(f"AVISO: Preço inválido para '{product_name}'. Pulando produto.")
+        stats.skipped += 1
+        return None
+
+    return {
+        'name': product_name,
+        'description': data.get('description') or None,
+        'price': price,
+        'promo_price': promo_price,
+        'image_file': data.get('image_file') or 'placeholder.png',
+        'is_featured': data.get('is_featured', '').lower() == 'true',
+        'category_id': category_id,
+    }
+
+
+def upsert_products(rows):
+    """Atualiza produtos existentes (pelo id) com um único comando por lote.
+
+    No PostgreSQL e no SQLite é um INSERT ... ON CONFLICT (id) DO UPDATE, que o
+    SQLAlchemy envia como um só INSERT com várias linhas; nos demais bancos cai
+    para um UPDATE em lote pela chave primária.
+    """
+    dialect = db.engine.dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        # Importado aqui: carregar os dois dialetos custa ~70ms a cada execução
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        stmt = dialect_insert(Product)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Product.id],
+            set_={field: stmt.excluded[field] for field in PRODUCT_FIELDS + ('updated_at',)}
+        )
+        db.session.execute(stmt, rows)
+    else:
+        db.session.execute(update(Product), rows)
+
+
+def flush_batch(batch, existing, stats, dry_run, report):
+    """Grava um lote: separa criações e atualizações usando o mapa de produtos pré-carregado."""
+    new_rows, changed_rows = [], []
+    for row in batch.values():
+        current = existing.get(row['name'])
+        if current is None:
+            new_rows.append(row)
+            continue
+        changes = {f: (current[f], row[f]) for f in PRODUCT_FIELDS if current[f] != row[f]}
+        if not changes:
+            stats.unchanged += 1
+            continue
+        # O upsert não passa pelo onupdate do modelo, então a data vai explícita
+        changed_rows.append(dict(row, id=current['id'], updated_at=utcnow()))
+        if report is not None:
+            report.append((row['name'], changes))
+
+    if new_rows and report is not None:
+        report.extend((row['name'], None) for row in new_rows)
+
+    if not dry_run:
+        if new_rows:
+            result = db.session.execute(insert(Product).returning(Product.id, Product.name), new_rows)
+            ids = dict((name, product_id) for product_id, name in result)
+            for row in new_rows:
+                existing[row['name']] = dict(row, id=ids[row['name']])
+            stats.changed_ids.extend(ids.values())
+        if changed_rows:
+            upsert_products(changed_rows)
+            for row in changed_rows:
+                existing[row['name']] = row
+            stats.changed_ids.extend(row['id'] for row in changed_rows)
+        db.session.commit()
+        stats.batches_committed += 1
+    else:
+        for row in new_rows:
+            existing[row['name']] = dict(row, id=None)
+        for row in changed_rows:
+            existing[row['name']] = row
+
+    stats.created += len(new_rows)
+    stats.updated += len(changed_rows)
 
+
+def read_checkpoint(path):
+    try:
+        with open(path) as f:
+            return int(f.read().strip() or 0)
+    except (FileNotFoundError, ValueError):
+        return 0
+
+
+def write_checkpoint(path, row_number):
+    with open(path, 'w') as f:
+        f.write(str(row_number))
+
+
+def import_data(csv_filename=CSV_FILENAME, batch_size=BATCH_SIZE, dry_run=False,
+                create_categories=False, resume=False, quiet=False, related=True):
+    """Lê produtos do CSV e os cria ou atualiza no banco de dados, em lotes.
+
+    O arquivo é lido em streaming; categorias e produtos existentes são carregados
+    uma única vez em dicionários, então cada lote custa poucos comandos SQL em vez
+    de duas consultas por linha. Cada lote é confirmado separadamente e registrado
+    em um arquivo de checkpoint, para que uma importação interrompida possa ser
+    retomada com --resume. No fim, com `related`, recalcula os produtos relacionados.
+
+    Precisa de um contexto do app (o `__main__` e o `manage.py import` criam um).
+    """
+    stats = ImportStats()
+    report = [] if dry_run else None
+    checkpoint_path = csv_filename + '.checkpoint'
+    start_row = read_checkpoint(checkpoint_path) if resume else 0
+
+    print("Iniciando importação/atualização de produtos..." + (" (simulação)" if dry_run else ""))
+
+    categories = dict(db.session.execute(select(Category.name, Category.id)).all())
+    existing = {}
+    columns = [Product.id, Product.name] + [getattr(Product, f) for f in PRODUCT_FIELDS]
+    # Nomes repetidos no banco: vale o primeiro (menor id), como no filter_by().first()
+    for row in db.session.execute(select(*columns).order_by(Product.id.desc())).mappings():
+        existing[row['name']] = dict(row)
+
+    try:
+        try:
+            with open(csv_filename, 'r', encoding='utf-8', newline='') as f:
+                batch = {}
+                for row_number, data in enumerate(csv.DictReader(f), start=1):
+                    if row_number <= start_row:
+                        continue
+                    stats.rows += 1
+                    row = parse_row(data, categories, stats, create_categories, dry_run)
+                    if row is not None:
+                        # O mesmo nome repetido no lote: vale a última linha
+                        if row['name'] in batch:
+                            stats.skipped += 1
+                        batch[row['name']] = row
+                    if len(batch) >= batch_size:
+                        flush_batch(batch, existing, stats, dry_run, report)
+                        batch = {}
+                        if not dry_run:
+                            write_checkpoint(checkpoint_path, row_number)
+                        if not quiet:
+                            print(f"  {start_row + stats.rows} linhas processadas ({stats.rate:.0f} linhas/s)")
+                if batch:
+                    flush_batch(batch, existing, stats, dry_run, report)
         except FileNotFoundError:
-            print(f"ERRO: Arquivo de importação '{CSV_FILENAME}' não foi encontrado.")
+            print(f"ERRO: Arquivo de importação '{csv_filename}' não foi encontrado.")
+            return None
         except Exception as e:
             db.session.rollback()
-            print(f"Ocorreu um erro inesperado. Nenhuma alteração foi salva. Erro: {e}")
+            print(f"Ocorreu um erro inesperado. Os lotes anteriores foram salvos; "
+                  f"use --resume para continuar do último checkpoint. Erro: {e}")
+            return None
+
+        if not dry_run:
+            if os.path.exists(checkpoint_path):
+                os.remove(checkpoint_path)
+            if related and stats.changed_ids:
+                # Com muitos produtos alterados, recalcular tudo sai mais barato que por produto
+                rebuilt = update_related(stats.changed_ids)
+                if rebuilt:
+                    print(f"Produtos relacionados recalculados: {rebuilt[1]} sugestões para {rebuilt[0]} produtos.")
+                else:
+                    print(f"Produtos relacionados atualizados em volta de {len(stats.changed_ids)} produtos.")
+    finally:
+        # Invalida o cache do catálogo de todos os workers do site, também quando a
+        # importação parou no meio (erro, Ctrl+C) depois de gravar algum lote
+        if stats.batches_committed:
+            bump_catalog_version()
+
+    if report:
+        print("--- Alterações previstas ---")
+        category_names = {category_id: name for name, category_id in categories.items()}
+        for name, changes in report:
+            if changes is None:
+                print(f"+ {name}")
+            else:
+                if 'category_id' in changes:
+                    old, new = changes.pop('category_id')
+                    changes['category'] = (category_names.get(old), category_names.get(new))
+                details = ', '.join(f"{field}: {old!r} -> {new!r}" for field, (old, new) in changes.items())
+                print(f"~ {name} ({details})")
+
+    print("--- Resumo da Importação ---" + (" (simulação, nada foi salvo)" if dry_run else ""))
+    print(f"Linhas lidas: {stats.rows}")
+    print(f"Produtos criados: {stats.created}")
+    print(f"Produtos atualizados: {stats.updated}")
+    print(f"Produtos sem alteração: {stats.unchanged}")
+    print(f"Linhas puladas: {stats.skipped}")
+    if create_categories:
+        print(f"Categorias criadas: {stats.categories_created}")
+    print(f"Velocidade: {stats.rate:.0f} linhas/s")
+    print("----------------------------")
+    return stats
+
 
 if __name__ == '__main__':
-    import_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Importa produtos de um CSV exportado por export_product.py.")
+    parser.add_argument('csv', nargs='?', default=CSV_FILENAME, help="arquivo CSV (padrão: %(default)s)")
+    parser.add_argument('--dry-run', action='store_true', help="mostra o que mudaria, sem gravar nada")
+    parser.add_argument('--create-categories', action='store_true', help="cria as categorias que não existirem")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="linhas por lote (padrão: %(default)s)")
+    parser.add_argument('--resume', action='store_true', help="continua a partir do último checkpoint")
+    parser.add_argument('--skip-related', action='store_true',
+                        help="não recalcula os produtos relacionados (rode manage.py related depois)")
+    args = parser.parse_args()
+    with create_app().app_context():
+        import_data(args.csv, batch_size=args.batch_size, dry_run=args.dry_run,
+                    create_categories=args.create_categories, resume=args.resume, related=not args.skip_related)
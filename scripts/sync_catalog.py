@@ -0,0 +1,236 @@
+# scripts/sync_catalog.py
+
+import argparse
+import csv
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+# Importa as configurações do app a partir do diretório pai
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from sqlalchemy import delete, insert, select, update
+import image_bundle
+import image_storage
+from catalog import bump_catalog_version, iter_export, iter_export_rows
+from config import INSTANCE_DIR, ROOT_DIR
+from extensions import db
+from factory import create_app
+from images import IMAGE_VARIANT_WIDTHS, PICTURES_DIR, picture_references
+from import_products import import_data
+from models import Product, ProductImage, utcnow
+
+# Levar o catálogo (produtos, galerias e imagens) de um ambiente para outro, ex.
+# do computador local para o disco persistente do Render, mandando só as imagens
+# que mudaram:
+#
+#   no destino:  python manage.py bundle inventory -o destino.json
+#   na origem:   python manage.py bundle export -o catalogo.tar --against destino.json
+#   no destino:  python manage.py bundle import catalogo.tar
+#
+# Ou de uma vez, por um pipe: ... bundle export -o - --against destino.json | ssh ... bundle import -
+PICTURES_PATH = os.path.join(ROOT_DIR, PICTURES_DIR)
+HASH_CACHE = os.path.join(INSTANCE_DIR, 'product_pics_hashes.json')
+# O CSV dos produtos fica na memória até este tamanho, depois vai para um arquivo temporário
+SPOOL_SIZE = 8 * 1024 * 1024
+GALLERY_BATCH = 500
+
+
+def _open_output(output):
+    return sys.stdout.buffer if output == '-' else open(output, 'wb')
+
+
+def _open_input(source):
+    return sys.stdin.buffer if source == '-' else open(source, 'rb')
+
+
+def catalog_files(references):
+    """Arquivos de product_pics que o catálogo usa: os referenciados, seus derivados e os protegidos."""
+    stems = {os.path.splitext(filename)[0] for _, filename in references}
+    names = set()
+    with os.scandir(PICTURES_PATH) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name.startswith('.') or entry.name.endswith('.tmp'):
+                continue
+            if (entry.name in image_storage.PROTECTED_FILES
+                    or os.path.splitext(entry.name)[0] in stems
+                    or image_storage.variant_base(entry.name, IMAGE_VARIANT_WIDTHS) in stems):
+                names.add(entry.name)
+    return names
+
+
+def current_galleries():
+    """{nome do produto: [arquivos da galeria, em ordem]}, numa consulta."""
+    galleries = defaultdict(list)
+    rows = db.session.execute(
+        select(Product.name, ProductImage.image_filename).join(ProductImage.product).order_by(ProductImage.id))
+    for name, filename in rows:
+        galleries[name].append(filename)
+    return dict(galleries)
+
+
+def write_inventory(output):
+    """Grava o inventário das imagens deste ambiente (arquivo e SHA-256)."""
+    started = time.perf_counter()
+    hashes = image_bundle.HashCache(PICTURES_PATH, HASH_CACHE)
+    files = hashes.scan()
+    hashes.save()
+    stream = _open_output(output)
+    try:
+        stream.write(json.dumps(image_bundle.inventory(files)).encode('utf-8'))
+    finally:
+        if stream is not sys.stdout.buffer:
+            stream.close()
+    print(f"Inventário: {len(files)} imagens em {time.perf_counter() - started:.1f} s.", file=sys.stderr)
+    return len(files)
+
+
+def export_bundle(output, against=None, compress=False):
+    """Grava o pacote do catálogo; com `against`, só as imagens que o destino não tem iguais.
+
+    Precisa de um contexto do app (o `__main__` e o `manage.py bundle export` criam um).
+    """
+    started = time.perf_counter()
+    hashes = image_bundle.HashCache(PICTURES_PATH, HASH_CACHE)
+    files = {name: hashes.digest(name) for name in catalog_files(picture_references())}
+    files = {name: entry for name, entry in files.items() if entry is not None}
+    hashes.save()
+    target = {}
+    if against:
+        with open(against, 'rb') as f:
+            target = image_bundle.load_inventory(f)
+    included = [name for name, entry in files.items() if target.get(name) != entry]
+    manifest = image_bundle.make_manifest(files, current_galleries(), included)
+
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_SIZE) as products_csv:
+        products = 0
+        for chunk in iter_export(iter_export_rows()):
+            products += chunk.count('\n')
+            products_csv.write(chunk.encode('utf-8'))
+        stream = _open_output(output)
+        try:
+            image_bundle.write_bundle(stream, manifest, products_csv, PICTURES_PATH, compress)
+        finally:
+            if stream is sys.stdout.buffer:
+                stream.flush()
+            else:
+                stream.close()
+
+    size = sum(files[name][1] for name in included)
+    print(f"Pacote: {products - 1} produtos, {len(included)} de {len(files)} imagens "
+          f"({size / 1024 / 1024:.1f} MB) em {time.perf_counter() - started:.1f} s.", file=sys.stderr)
+    return len(included)
+
+
+def sync_galleries(galleries, names, dry_run=False):
+    """Deixa a galeria de cada produto do pacote igual à do pacote; devolve quantas mudaram."""
+    ids = {}
+    # Nomes repetidos no banco: vale o primeiro (menor id), como na importação
+    for product_id, name in db.session.execute(select(Product.id, Product.name).order_by(Product.id.desc())):
+        ids[name] = product_id
+    current = {ids[name]: filenames for name, filenames in current_galleries().items() if name in ids}
+    changed = {}
+    for name in names:
+        product_id = ids.get(name)
+        if product_id is not None and current.get(product_id, []) != galleries.get(name, []):
+            changed[product_id] = galleries.get(name, [])
+    if dry_run or not changed:
+        return len(changed)
+    product_ids = sorted(changed)
+    for start in range(0, len(product_ids), GALLERY_BATCH):
+        chunk = product_ids[start:start + GALLERY_BATCH]
+        db.session.execute(delete(ProductImage).where(ProductImage.product_id.in_(chunk)))
+        db.session.execute(update(Product).where(Product.id.in_(chunk)).values(updated_at=utcnow()))
+    rows = [{'product_id': product_id, 'image_filename': filename}
+            for product_id in product_ids for filename in changed[product_id]]
+    if rows:
+        db.session.execute(insert(ProductImage), rows)
+    db.session.commit()
+    return len(changed)
+
+
+def import_bundle(source, dry_run=False, related=True):
+    """Aplica um pacote: confere e põe as imagens no lugar, importa os produtos e acerta as galerias.
+
+    As imagens recebidas vão para uma pasta temporária dentro de product_pics e
+    só entram no lugar depois de todas conferidas, e de conferido que as que não
+    vieram no pacote já estão aqui iguais. Só então o banco é alterado. Devolve
+    False (sem alterar nada) se o pacote não servir.
+    """
+    started = time.perf_counter()
+    staging = tempfile.mkdtemp(prefix='.pacote-', dir=PICTURES_PATH)
+    csv_path = os.path.join(staging, '.' + image_bundle.PRODUCTS_NAME)
+    try:
+        try:
+            manifest = _receive_bundle(source, staging, csv_path, dry_run)
+        except image_bundle.BundleError as e:
+            print(f"ERRO: {e}")
+            return False
+        # Os produtos entram pela importação de sempre (por nome, criando as categorias)
+        stats = import_data(csv_path, dry_run=dry_run, create_categories=True, quiet=True, related=related)
+        if stats is None:
+            return False
+        with open(csv_path, encoding='utf-8', newline='') as f:
+            names = [row['name'] for row in csv.DictReader(f) if row.get('name')]
+        galleries = sync_galleries(manifest['galleries'], names, dry_run)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    if galleries and not dry_run:
+        bump_catalog_version()
+    print(f"Galerias {'a alterar' if dry_run else 'alteradas'}: {galleries}")
+    print(f"Sincronização concluída em {time.perf_counter() - started:.1f} s."
+          + (" (simulação, nada foi salvo)" if dry_run else ""))
+    return True
+
+
+def _receive_bundle(source, staging, csv_path, dry_run):
+    """Lê e confere o pacote e põe as imagens recebidas no lugar; devolve o manifesto."""
+    stream = _open_input(source)
+    try:
+        with open(csv_path, 'wb') as products_csv:
+            manifest, received = image_bundle.read_bundle(stream, staging, products_csv)
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
+
+    hashes = image_bundle.HashCache(PICTURES_PATH, HASH_CACHE)
+    stale = [name for name, entry in manifest['files'].items()
+             if name not in received and hashes.digest(name) != tuple(entry)]
+    hashes.save()
+    if stale:
+        raise image_bundle.BundleError(
+            f"{len(stale)} imagens do catálogo não vieram no pacote e não estão iguais aqui "
+            f"(ex.: {', '.join(sorted(stale)[:5])}). Gere o inventário de novo e exporte outra vez.")
+    print(f"Pacote conferido: {len(received)} imagens recebidas, "
+          f"{len(manifest['files']) - len(received)} já estavam aqui.")
+    if not dry_run:
+        for name, (digest, size) in received.items():
+            os.replace(os.path.join(staging, name), os.path.join(PICTURES_PATH, name))
+            hashes.record(name, digest, size)
+        hashes.save()
+    return manifest
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Leva o catálogo (produtos, galerias e imagens) entre ambientes.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    inventory_parser = commands.add_parser('inventory', help="lista as imagens deste ambiente (rode no destino)")
+    inventory_parser.add_argument('-o', '--output', default='-', help="arquivo de saída, ou - para a saída padrão")
+    export_parser = commands.add_parser('export', help="grava o pacote do catálogo (rode na origem)")
+    export_parser.add_argument('-o', '--output', default='catalogo.tar', help="arquivo do pacote, ou - para a saída padrão")
+    export_parser.add_argument('--against', help="inventário do destino: só vão as imagens que ele não tem iguais")
+    export_parser.add_argument('--gzip', action='store_true', help="comprime o pacote (as imagens já são comprimidas)")
+    import_parser = commands.add_parser('import', help="aplica um pacote (rode no destino)")
+    import_parser.add_argument('bundle', help="arquivo do pacote, ou - para a entrada padrão")
+    import_parser.add_argument('--dry-run', action='store_true', help="confere o pacote e mostra o que mudaria")
+    import_parser.add_argument('--skip-related', action='store_true',
+                               help="não atualiza os produtos relacionados (rode manage.py related depois)")
+    args = parser.parse_args()
+    with create_app().app_context():
+        if args.command == 'inventory':
+            write_inventory(args.output)
+        elif args.command == 'export':
+            export_bundle(args.output, args.against, args.gzip)
+        elif not import_bundle(args.bundle, args.dry_run, related=not args.skip_related):
+            sys.exit(1)
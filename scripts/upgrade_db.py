@@ -0,0 +1,37 @@
+# scripts/upgrade_db.py
+
+# Importa as configurações do app a partir do diretório pai
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from flask import current_app
+from sqlalchemy import inspect
+from catalog import bump_catalog_version
+from extensions import db
+from factory import create_app, init_migrations, MIGRATIONS_DIR
+
+# Revisão que corresponde às tabelas criadas pelo antigo db.create_all()
+BASELINE_REVISION = '0001'
+
+def upgrade():
+    """Aplica as migrações pendentes (equivale a `flask db upgrade`).
+
+    Bancos criados antes das migrações (com db.create_all()) não têm a tabela
+    alembic_version; eles são marcados como estando no esquema inicial antes de
+    aplicar o resto, para que as tabelas existentes não sejam recriadas.
+
+    Precisa de um contexto do app (o de quem chama, ou o criado no __main__).
+    """
+    init_migrations(current_app)
+    from flask_migrate import stamp, upgrade as migrate_upgrade
+    tables = inspect(db.engine).get_table_names()
+    if 'product' in tables and 'alembic_version' not in tables:
+        print("Banco criado sem migrações: marcando o esquema inicial.")
+        stamp(MIGRATIONS_DIR, BASELINE_REVISION)
+    migrate_upgrade(MIGRATIONS_DIR)
+    bump_catalog_version()
+    print("Banco de dados atualizado.")
+
+if __name__ == '__main__':
+    with create_app().app_context():
+        upgrade()
@@ -0,0 +1,147 @@
+"""Índice invertido em memória para a busca de produtos.
+
+Não depende do Flask nem do banco: o app alimenta o índice com os textos de cada
+produto (nome, descrição sem HTML e nome da categoria) e consulta por termos.
+A normalização ignora acentos e maiúsculas ("película" == "pelicula"), e o último
+termo da consulta é tratado como prefixo, para a busca enquanto se digita.
+"""
+import html
+import math
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+# Peso de cada campo no ranking: o nome do produto vale mais que a descrição
+FIELD_WEIGHTS = {'name': 3.0, 'category': 2.0, 'description': 1.0}
+# Um termo que só casa por prefixo vale menos que o termo exato
+PREFIX_FACTOR = 0.6
+STOP_WORDS = {'a', 'as', 'o', 'os', 'e', 'de', 'da', 'das', 'do', 'dos', 'em', 'na', 'no',
+              'com', 'para', 'por', 'um', 'uma'}
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def fold(text):
+    """Remove acentos e passa para minúsculas ("Película" -> "pelicula")."""
+    text = unicodedata.normalize('NFKD', text or '')
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+
+def strip_html(text):
+    return html.unescape(_TAG_RE.sub(' ', text or ''))
+
+
+def _normalize_term(term):
+    # Plural simples: "capas" -> "capa", "cabos" -> "cabo"
+    if len(term) > 3 and term.endswith('s') and not term.endswith('ss'):
+        return term[:-1]
+    return term
+
+
+def tokenize(text):
+    """Quebra o texto em termos normalizados, sem stop words."""
+    return [_normalize_term(t) for t in _WORD_RE.findall(fold(text)) if t not in STOP_WORDS]
+
+
+class SearchIndex:
+    """Índice invertido termo -> {id do documento: peso}, com prefixos via lista ordenada."""
+
+    def __init__(self):
+        self.version = None
+        self._postings = {}
+        self._doc_terms = {}
+        self._docs = {}
+        self._terms = []
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._docs
+
+    def document(self, doc_id):
+        """Metadados guardados junto ao documento (usados pelas sugestões)."""
+        return self._docs.get(doc_id)
+
+    def add(self, doc_id, fields, meta=None):
+        """Indexa (ou reindexa) um documento a partir de {campo: texto}."""
+        weights = {}
+        for field, text in fields.items():
+            if field == 'description':
+                text = strip_html(text)
+            for term in tokenize(text):
+                weights[term] = weights.get(term, 0.0) + FIELD_WEIGHTS.get(field, 1.0)
+        with self._lock:
+            self.remove(doc_id)
+            for term, weight in weights.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = self._postings[term] = {}
+                    insort(self._terms, term)
+                # Amortece termos repetidos muitas vezes na descrição
+                postings[doc_id] = 1.0 + math.log(weight)
+            self._doc_terms[doc_id] = set(weights)
+            self._docs[doc_id] = meta or {}
+
+    def remove(self, doc_id):
+        with self._lock:
+            for term in self._doc_terms.pop(doc_id, ()):
+                postings = self._postings[term]
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+                    del self._terms[bisect_left(self._terms, term)]
+            self._docs.pop(doc_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._postings.clear()
+            self._doc_terms.clear()
+            self._docs.clear()
+            self._terms.clear()
+            self.version = None
+
+    def _expand(self, term, prefix):
+        """Termos do índice que casam com `term` (exato, ou também por prefixo)."""
+        matches = {term: 1.0} if term in self._postings else {}
+        if prefix:
+            i = bisect_left(self._terms, term)
+            while i < len(self._terms) and self._terms[i].startswith(term):
+                matches.setdefault(self._terms[i], PREFIX_FACTOR)
+                i += 1
+        return matches
+
+    def search(self, query, limit=None, prefix=True):
+        """Ids dos documentos que contêm todos os termos da consulta, do mais relevante ao menos.
+
+        Com `prefix`, o último termo também casa com termos que começam com ele.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            total = len(self._docs) or 1
+            scores = None
+            for position, term in enumerate(terms):
+                matches = self._expand(term, prefix and position == len(terms) - 1)
+                term_scores = {}
+                for match, factor in matches.items():
+                    postings = self._postings[match]
+                    boost = math.log(1 + total / len(postings)) * factor
+                    for doc_id, weight in postings.items():
+                        score = weight * boost
+                        if score > term_scores.get(doc_id, 0.0):
+                            term_scores[doc_id] = score
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {d: s + term_scores[d] for d, s in scores.items() if d in term_scores}
+                if not scores:
+                    return []
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        if limit:
+            ranked = ranked[:limit]
+        return [doc_id for doc_id, _ in ranked]
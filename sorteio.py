@@ -0,0 +1,297 @@
+"""Sorteio de inauguração: as páginas de sorteio/, as inscrições e o sorteio auditável.
+
+As inscrições não gravam no banco durante a requisição: depois de validadas e
+normalizadas, entram numa fila limitada do worker, e uma thread grava o que
+acumulou num único INSERT com várias linhas (ON CONFLICT DO NOTHING, então um
+e-mail repetido é só ignorado). Num pico da promoção, cada inscrição custa uma
+validação e um `put` na fila, não uma ida ao banco. Se a fila encher, a
+inscrição é gravada na hora, como antes.
+
+O que está na fila fica na memória do worker até ser gravado (no máximo
+SORTEIO_FLUSH_INTERVAL segundos): ao sair, o worker grava o que sobrou, mas um
+worker morto à força (SIGKILL, falta de memória) perde essas inscrições.
+
+O sorteio (`python manage.py sortear`) percorre as inscrições com um cursor do
+lado do servidor e escolhe os ganhadores por amostragem de reservatório com o
+gerador do módulo `secrets`, sem carregar a tabela na memória.
+"""
+import atexit
+import hashlib
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from flask import Blueprint, current_app, redirect, request, send_from_directory, url_for
+
+from config import INSTANCE_DIR
+from extensions import db, SORTEIO_FOLDER
+from models import RaffleEntry
+
+# Inscrições esperando na fila de cada worker; com a fila cheia, a gravação é na
+# hora. 0 desliga a fila (cada inscrição é gravada na requisição)
+SORTEIO_QUEUE_SIZE = int(os.environ.get('SORTEIO_QUEUE_SIZE', 5000))
+# Linhas por INSERT
+SORTEIO_BATCH_SIZE = int(os.environ.get('SORTEIO_BATCH_SIZE', 200))
+# Quanto a thread espera juntando inscrições antes de gravar (segundos)
+SORTEIO_FLUSH_INTERVAL = float(os.environ.get('SORTEIO_FLUSH_INTERVAL', 0.5))
+# Novas tentativas de um lote que falhou (banco ocupado, conexão caiu)
+WRITE_RETRIES = 3
+# Horário de Paragominas (sem horário de verão), para as datas do regulamento
+LOCAL_TIMEZONE = timezone(timedelta(hours=-3), 'America/Belem')
+DRAWS_DIR = os.path.join(INSTANCE_DIR, 'sorteios')
+DRAW_CHUNK_ROWS = 1000
+
+sorteio = Blueprint('sorteio', __name__)
+
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+
+
+# --- INSCRIÇÕES ---
+def normalize_entry(form):
+    """Valida o formulário; devolve (inscrição, None) ou (None, mensagem de erro).
+
+    O e-mail vai em minúsculas (é ele que impede a inscrição repetida) e o WhatsApp
+    só com os dígitos do DDD e do número, sem o 55 nem o 0 da frente.
+    """
+    name = ' '.join(form.get('nome', '').split())
+    email = form.get('email', '').strip().lower()
+    whatsapp = re.sub(r'\D', '', form.get('whatsapp', ''))
+    if not name or not email or not whatsapp:
+        return None, "Por favor, preencha todos os campos."
+    if not form.get('lgpd'):
+        return None, "Para participar, aceite os termos do sorteio."
+    if len(name) > 255 or len(email) > 255 or not _EMAIL_RE.match(email):
+        return None, "Informe um nome e um e-mail válidos."
+    if len(whatsapp) in (12, 13) and whatsapp.startswith('55'):
+        whatsapp = whatsapp[2:]
+    elif len(whatsapp) in (11, 12) and whatsapp.startswith('0'):
+        whatsapp = whatsapp[1:]
+    if len(whatsapp) not in (10, 11) or whatsapp[0] == '0':
+        return None, "Informe o WhatsApp com DDD, ex.: (91) 98888-7777."
+    return {'name': name, 'email': email, 'whatsapp': whatsapp,
+            'created_at': datetime.now(timezone.utc)}, None
+
+
+def save_entries(entries):
+    """Grava as inscrições num único INSERT; devolve quantas eram novas.
+
+    No PostgreSQL e no SQLite é um INSERT ... ON CONFLICT (email) DO NOTHING com
+    várias linhas; e-mails já inscritos (ou repetidos no mesmo lote) são ignorados.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = (dialect_insert(RaffleEntry)
+            .on_conflict_do_nothing(index_elements=[RaffleEntry.email])
+            .returning(RaffleEntry.id))
+    inserted = len(db.session.execute(stmt, entries).all())
+    db.session.commit()
+    return inserted
+
+
+class RegistrationQueue:
+    """Fila limitada de inscrições, gravada em lotes por uma thread do worker.
+
+    A thread começa na primeira inscrição do processo: com `gunicorn --preload` o
+    app é importado no mestre, e cada worker (depois do fork) cria a sua.
+    """
+
+    def __init__(self, maxsize=SORTEIO_QUEUE_SIZE, batch_size=SORTEIO_BATCH_SIZE,
+                 interval=SORTEIO_FLUSH_INTERVAL):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def put(self, entry):
+        """Põe a inscrição na fila; False se a fila estiver cheia (ou desligada)."""
+        if self.maxsize <= 0:
+            return False
+        if self._pid != os.getpid():
+            self._start(current_app._get_current_object())
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            return False
+        return True
+
+    def _start(self, app):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(self.maxsize)
+            self._thread = threading.Thread(target=self._run, args=(app, self._queue),
+                                            name='sorteio-inscricoes', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _run(self, app, entries):
+        stop = False
+        while not stop:
+            batch = []
+            item = entries.get()
+            deadline = time.monotonic() + self.interval
+            while item is not None:
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = entries.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            stop = item is None
+            if batch:
+                with app.app_context():
+                    self._write(app, batch)
+
+    def _write(self, app, batch):
+        for attempt in range(WRITE_RETRIES + 1):
+            try:
+                inserted = save_entries(batch)
+                app.logger.info("Sorteio: %d inscrições gravadas (%d repetidas)", inserted, len(batch) - inserted)
+                return
+            except Exception:
+                db.session.rollback()
+                if attempt == WRITE_RETRIES:
+                    # Vão para o log inteiras, para poderem ser gravadas à mão
+                    app.logger.exception("Sorteio: lote de %d inscrições não gravado: %s", len(batch),
+                                         json.dumps(batch, default=str, ensure_ascii=False))
+                    return
+                time.sleep(0.2 * 2 ** attempt)
+
+    def close(self, timeout=10):
+        """Grava o que ainda está na fila e encerra a thread (na saída do worker)."""
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+
+registrations = RegistrationQueue()
+# O gunicorn encerra cada worker com sys.exit, o que roda os atexit
+atexit.register(registrations.close)
+
+
+# --- PÁGINAS ---
+@sorteio.route('/sorteio/')
+def index():
+    return send_from_directory(SORTEIO_FOLDER, 'index.html')
+
+
+@sorteio.route('/sorteio/<any("regulamento.html", "sucesso.html"):page>')
+def page(page):
+    return send_from_directory(SORTEIO_FOLDER, page)
+
+
+# O caminho é o mesmo do antigo server.js, para onde o formulário já envia
+@sorteio.route('/api/registrar-sorteio', methods=['POST'])
+def register():
+    entry, error = normalize_entry(request.form)
+    if error:
+        # Texto simples em português, como o server.js respondia
+        return error, 400, {'Content-Type': 'text/plain; charset=utf-8'}
+    if not registrations.put(entry):
+        # Fila cheia: grava na hora, como antes
+        save_entries([entry])
+    return redirect(url_for('sorteio.page', page='sucesso.html'), code=303)
+
+
+# --- SORTEIO ---
+Draw = namedtuple('Draw', 'entries eligible duplicates digest')
+
+
+def local_to_utc(value):
+    """Data/hora sem fuso, no horário de Paragominas, em UTC (como as inscrições são gravadas)."""
+    return value.replace(tzinfo=LOCAL_TIMEZONE).astimezone(timezone.utc)
+
+
+def iter_entries(until=None):
+    """Inscrições em ordem de e-mail (depois de id), lidas em blocos.
+
+    A ordem por e-mail põe as repetidas lado a lado: inscrições antigas (do
+    server.js) não tinham o e-mail normalizado, e só a primeira de cada e-mail conta.
+    """
+    email = db.func.lower(db.func.trim(RaffleEntry.email))
+    stmt = db.select(RaffleEntry.id, RaffleEntry.name, email.label('email'), RaffleEntry.whatsapp,
+                     RaffleEntry.created_at).order_by(email, RaffleEntry.id)
+    if until is not None:
+        stmt = stmt.where(RaffleEntry.created_at <= until)
+    # yield_per usa um cursor do lado do servidor no PostgreSQL
+    return db.session.execute(stmt.execution_options(yield_per=DRAW_CHUNK_ROWS))
+
+
+def draw(count, rows):
+    """Sorteia `count` inscrições distintas, na ordem do sorteio (a primeira ganha).
+
+    Amostragem de reservatório (algoritmo R): a i-ésima inscrição elegível entra no
+    reservatório com probabilidade count/i, então cada uma tem a mesma chance e só
+    `count` linhas ficam na memória. O gerador é o do sistema operacional
+    (`secrets.SystemRandom`), que não pode ser previsto nem repetido. O SHA-256 da
+    lista de inscrições elegíveis (id e e-mail, na ordem lida) vai no registro do
+    sorteio, para conferir depois que todas estavam lá.
+    """
+    rng = secrets.SystemRandom()
+    digest = hashlib.sha256()
+    reservoir, eligible, duplicates, previous = [], 0, 0, None
+    for row in rows:
+        if row.email == previous:
+            duplicates += 1
+            continue
+        previous = row.email
+        digest.update(f"{row.id};{row.email}\n".encode('utf-8'))
+        eligible += 1
+        if len(reservoir) < count:
+            reservoir.append(row)
+        else:
+            position = rng.randrange(eligible)
+            if position < count:
+                reservoir[position] = row
+    # O reservatório é um subconjunto sorteado, mas as posições não: embaralha para a ordem
+    rng.shuffle(reservoir)
+    return Draw(reservoir, eligible, duplicates, digest.hexdigest())
+
+
+def mask_email(email):
+    user, _, domain = email.partition('@')
+    return f"{user[:2]}***@{domain}"
+
+
+def mask_whatsapp(whatsapp):
+    # Inscrições antigas guardaram o número como foi digitado
+    digits = re.sub(r'\D', '', whatsapp)
+    return f"({digits[:2]}) *****-{digits[-4:]}"
+
+
+def save_draw(result, winners, until, directory=DRAWS_DIR):
+    """Grava o registro do sorteio em JSON (com os contatos completos); devolve o caminho."""
+    os.makedirs(directory, exist_ok=True)
+    now = datetime.now(LOCAL_TIMEZONE)
+    record = {
+        'realizado_em': now.isoformat(timespec='seconds'),
+        'inscricoes_ate': until.astimezone(LOCAL_TIMEZONE).isoformat(timespec='seconds') if until else None,
+        'metodo': "amostragem de reservatório (algoritmo R) com secrets.SystemRandom; "
+                  "inscrições em ordem de e-mail e id, só a primeira de cada e-mail",
+        'inscricoes_elegiveis': result.eligible,
+        'inscricoes_repetidas': result.duplicates,
+        'sha256_inscricoes': result.digest,
+        'sorteados': [
+            {'posicao': position, 'tipo': 'ganhador' if position <= winners else 'suplente',
+             'id': row.id, 'nome': row.name, 'email': row.email, 'whatsapp': row.whatsapp,
+             'data_inscricao': row.created_at.isoformat() if row.created_at else None}
+            for position, row in enumerate(result.entries, start=1)
+        ],
+    }
+    path = os.path.join(directory, f"sorteio-{now:%Y%m%d-%H%M%S}.json")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    return path
@@ -0,0 +1,150 @@
+"""Modo de produção do SQLite, o banco local usado quando não há DATABASE_URL.
+
+No modo padrão do SQLite (journal "delete"), cada commit trava o arquivo inteiro:
+durante uma importação ou uma edição no painel, as leituras dos outros workers
+esperam. Aqui cada conexão nova recebe os PRAGMAs de `Config.SQLITE_PRAGMAS`:
+
+- journal_mode=WAL: leitores não bloqueiam o escritor nem são bloqueados por ele;
+- synchronous=NORMAL: com WAL, sem fsync a cada commit (uma queda de energia pode
+  perder os últimos commits, mas não corrompe o banco);
+- mmap_size: leituras direto das páginas mapeadas em memória;
+- busy_timeout: quem encontra o banco ocupado espera em vez de falhar na hora;
+- foreign_keys=ON: sem isso o SQLite ignora as chaves estrangeiras.
+
+Escritas que ainda assim encontram o banco ocupado (a espera estourou, ou a
+transação leu antes de escrever e outro worker gravou no meio) são refeitas por
+`retry_on_busy`. Checkpoint do WAL, PRAGMA optimize e backup online ficam no fim
+deste módulo e rodam por `python manage.py sqlite`.
+"""
+import glob
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime
+from functools import partial, wraps
+
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.exc import OperationalError
+
+from extensions import db
+
+# Tentativas extras de uma rota de escrita que encontrou o banco ocupado
+BUSY_RETRIES = 3
+# Espera antes da primeira nova tentativa (segundos); dobra a cada tentativa, com variação
+BUSY_BACKOFF = 0.05
+BACKUP_PREFIX = 'suportesmart-'
+
+
+def _apply_pragmas(pragmas, dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def _count_commit(session):
+    session.info['commits'] = session.info.get('commits', 0) + 1
+
+
+def init_sqlite(app):
+    """Aplica os PRAGMAs a cada conexão dos bancos SQLite do app."""
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if not pragmas:
+        return
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if engine.dialect.name == 'sqlite':
+            event.listen(engine, 'connect', partial(_apply_pragmas, pragmas))
+
+
+# Conta os commits de cada sessão (uma por requisição), para retry_on_busy saber se
+# a rota já gravou alguma coisa
+event.listen(db.session, 'after_commit', _count_commit)
+
+
+def is_busy_error(error):
+    """Se o erro é o SQLite ocupado (SQLITE_BUSY/SQLITE_LOCKED)."""
+    orig = getattr(error, 'orig', None)
+    name = getattr(orig, 'sqlite_errorname', '')
+    return name.startswith(('SQLITE_BUSY', 'SQLITE_LOCKED')) or 'database is locked' in str(orig)
+
+
+def retry_on_busy(view):
+    """Decorator para rotas que gravam: refaz a rota se o SQLite estiver ocupado.
+
+    Só refaz enquanto nada foi confirmado na requisição; a partir do primeiro commit
+    o erro sobe normalmente, para que nada seja gravado duas vezes. A cada nova
+    tentativa a sessão é desfeita, o que a tentativa anterior guardou em `g` é
+    descartado e os arquivos enviados voltam ao início.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        attempt = 0
+        while True:
+            commits = db.session.info.get('commits', 0)
+            g_keys = set(g)
+            try:
+                return view(*args, **kwargs)
+            except OperationalError as error:
+                db.session.rollback()
+                if attempt >= BUSY_RETRIES or not is_busy_error(error) or db.session.info.get('commits', 0) != commits:
+                    raise
+            attempt += 1
+            current_app.logger.warning("Banco ocupado em %s; tentativa %d de %d", request.path, attempt, BUSY_RETRIES)
+            for key in set(g) - g_keys:
+                g.pop(key)
+            for upload in request.files.values():
+                upload.stream.seek(0)
+            time.sleep(BUSY_BACKOFF * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+    return wrapper
+
+
+# --- MANUTENÇÃO ---
+def database_path(engine):
+    """Caminho do arquivo do banco, ou None para um banco em memória."""
+    path = engine.url.database
+    return path if path and path != ':memory:' else None
+
+
+def checkpoint(connection, mode='TRUNCATE'):
+    """Copia o WAL de volta para o banco e (com TRUNCATE) zera o arquivo -wal.
+
+    Devolve (ocupado, páginas no WAL, páginas copiadas); ocupado=1 quando algum
+    leitor impediu o checkpoint completo (basta rodar de novo mais tarde).
+    """
+    return tuple(connection.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})").one())
+
+
+def optimize(connection):
+    """Atualiza as estatísticas do planejador só das tabelas em que isso compensa."""
+    connection.exec_driver_sql("PRAGMA optimize")
+
+
+def backup(connection, directory, keep=7):
+    """Backup online com VACUUM INTO: uma cópia compacta e consistente do banco.
+
+    No modo WAL a cópia é uma leitura só, então o site continua gravando enquanto
+    ela é feita. A cópia é conferida (quick_check) antes de entrar no lugar, e só
+    os `keep` backups mais recentes são mantidos. Devolve o caminho do backup.
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{BACKUP_PREFIX}{datetime.now():%Y%m%d-%H%M%S}.db")
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    connection.exec_driver_sql("VACUUM INTO ?", (tmp_path,))
+    copy = sqlite3.connect(tmp_path)
+    try:
+        result = copy.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        copy.close()
+    if result != 'ok':
+        os.remove(tmp_path)
+        raise RuntimeError(f"A cópia do banco não passou no quick_check: {result}")
+    os.replace(tmp_path, path)
+    for old in sorted(glob.glob(os.path.join(directory, BACKUP_PREFIX + '*.db')))[:-keep]:
+        os.remove(old)
+    return path
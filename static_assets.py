@@ -0,0 +1,258 @@
+"""Arquivos estáticos com impressão digital (hash no nome) e pré-comprimidos.
+
+O manifesto guarda o hash do conteúdo de cada arquivo de uma pasta, e o app usa
+esse hash no nome das URLs ("css/site.css" -> "css/site.1a2b3c4d5e6f.css"). Como
+a URL muda sempre que o conteúdo muda, ela pode ficar em cache por um ano
+(`immutable`). Arquivos de texto ganham versões .gz e .br ao lado do original.
+
+`StaticFiles` é uma camada WSGI que serve essas pastas antes de a requisição
+chegar ao Flask, escolhendo a versão comprimida pelo Accept-Encoding.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from email.utils import formatdate
+
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
+
+try:
+    import brotli
+except ImportError: # Sem o pacote Brotli, só a versão .gz é gerada
+    brotli = None
+
+HASH_LENGTH = 12
+# Só vale a pena comprimir texto: PNG, JPEG e WebP já são comprimidos
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.html', '.txt', '.xml', '.json', '.ico'}
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# Arquivos pedidos pelo nome original (sem hash) podem mudar, então o cache é curto
+DEFAULT_MAX_AGE = 3600
+# Do mais preferido ao menos: (codificação, extensão do arquivo)
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_HASHED_RE = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{%d})(?P<ext>\.[^./]+)$' % HASH_LENGTH)
+_MIME_TYPES = {
+    '.css': 'text/css; charset=utf-8', '.js': 'text/javascript; charset=utf-8',
+    '.html': 'text/html; charset=utf-8', '.txt': 'text/plain; charset=utf-8',
+    '.xml': 'application/xml', '.json': 'application/json', '.svg': 'image/svg+xml',
+    '.ico': 'image/x-icon', '.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif', '.webp': 'image/webp', '.avif': 'image/avif',
+}
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()[:HASH_LENGTH]
+
+
+def hashed_name(filename, digest):
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}.{digest}{ext}"
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def precompress(path):
+    """Grava path.gz (e path.br, se houver Brotli) quando faltam ou estão velhos."""
+    written = 0
+    mtime = os.stat(path).st_mtime_ns
+    for encoding, suffix in ENCODINGS:
+        if encoding == 'br' and brotli is None:
+            continue
+        target = path + suffix
+        if os.path.exists(target) and os.stat(target).st_mtime_ns >= mtime:
+            continue
+        with open(path, 'rb') as f:
+            data = f.read()
+        if encoding == 'br':
+            compressed = brotli.compress(data, quality=11)
+        else:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        _write_atomic(target, compressed)
+        written += 1
+    return written
+
+
+def accepted_encodings(header):
+    """Codificações aceitas no Accept-Encoding (ignorando as marcadas com q=0)."""
+    accepted = set()
+    for item in header.split(','):
+        name, _, params = item.partition(';')
+        quality = params.strip().lower()
+        if quality.startswith('q=') and quality[2:].strip() in ('0', '0.0', '0.00', '0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class AssetManifest:
+    """Mapa arquivo -> hash do conteúdo de uma pasta, salvo em JSON entre execuções.
+
+    Cada entrada guarda também tamanho e data de modificação, então reconstruir o
+    manifesto só recalcula o hash dos arquivos que mudaram. Arquivos novos (como
+    as fotos enviadas pelo painel) entram no manifesto na primeira vez que são pedidos.
+    """
+
+    def __init__(self, root, manifest_path, exclude=()):
+        self.root = os.path.abspath(root)
+        self.manifest_path = manifest_path
+        self.exclude = tuple(exclude)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def is_asset(self, filename):
+        return not filename.endswith(('.gz', '.br', '.tmp') + self.exclude)
+
+    def _stat_entry(self, filename, previous=None):
+        path = os.path.join(self.root, filename)
+        stat = os.stat(path)
+        if previous and previous[1] == stat.st_size and previous[2] == stat.st_mtime_ns:
+            return previous
+        return [file_hash(path), stat.st_size, stat.st_mtime_ns]
+
+    def build(self, compress=True):
+        """Percorre a pasta, atualiza os hashes e gera as versões comprimidas."""
+        previous = self._load()
+        entries, compressed = {}, 0
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for name in filenames:
+                if name.startswith('.'):
+                    continue
+                filename = os.path.relpath(os.path.join(dirpath, name), self.root).replace(os.sep, '/')
+                if not self.is_asset(filename):
+                    continue
+                entries[filename] = self._stat_entry(filename, previous.get(filename))
+                if compress and os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS:
+                    compressed += precompress(os.path.join(self.root, filename))
+        with self._lock:
+            self._entries = entries
+        self.save()
+        return compressed
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        with self._lock:
+            data = json.dumps(self._entries, sort_keys=True).encode('utf-8')
+        _write_atomic(self.manifest_path, data)
+
+    def digest(self, filename):
+        """Hash do conteúdo do arquivo, ou None se ele não existir."""
+        entry = self._entries.get(filename)
+        if entry is None:
+            if not self.is_asset(filename):
+                return None
+            path = safe_join(self.root, filename)
+            if path is None or not os.path.isfile(path):
+                return None
+            entry = self._stat_entry(filename)
+            with self._lock:
+                self._entries[filename] = entry
+        return entry[0]
+
+    def forget(self, filename):
+        """Tira do manifesto um arquivo apagado."""
+        with self._lock:
+            self._entries.pop(filename, None)
+
+    def url_path(self, filename):
+        """Nome com hash para usar na URL (ou o próprio nome, se o arquivo não existir)."""
+        digest = self.digest(filename)
+        return hashed_name(filename, digest) if digest else filename
+
+    def resolve(self, path):
+        """Converte o caminho da URL em (arquivo original, se o hash confere com o conteúdo)."""
+        match = _HASHED_RE.match(path)
+        if match:
+            filename = match['stem'] + match['ext']
+            digest = self.digest(filename)
+            if digest:
+                return filename, digest == match['hash']
+        return path, False
+
+
+class StaticFiles:
+    """Camada WSGI que serve as pastas de estáticos sem passar pelo Flask.
+
+    URLs com o hash certo recebem cache de um ano com `immutable`; as demais,
+    cache curto. Se o navegador aceitar, envia a versão .br ou .gz do arquivo.
+    O que não for encontrado segue para o app (que responde o 404 normal).
+    """
+
+    def __init__(self, app, mounts):
+        self.app = app
+        # {prefixo da URL: AssetManifest}, do prefixo mais longo ao mais curto
+        self.mounts = sorted(mounts.items(), key=lambda item: -len(item[0]))
+
+    def __call__(self, environ, start_response):
+        if environ['REQUEST_METHOD'] in ('GET', 'HEAD'):
+            path_info = environ.get('PATH_INFO', '')
+            for prefix, manifest in self.mounts:
+                if path_info.startswith(prefix):
+                    response = self.serve(environ, start_response, manifest, path_info[len(prefix):])
+                    if response is not None:
+                        return response
+                    break
+        return self.app(environ, start_response)
+
+    def serve(self, environ, start_response, manifest, path):
+        filename, immutable = manifest.resolve(path)
+        if not manifest.is_asset(filename):
+            return None
+        full_path = safe_join(manifest.root, filename)
+        if full_path is None or not os.path.isfile(full_path):
+            return None
+
+        headers = []
+        ext = os.path.splitext(filename)[1].lower()
+        if ext in COMPRESSIBLE_EXTENSIONS:
+            headers.append(('Vary', 'Accept-Encoding'))
+            accepted = accepted_encodings(environ.get('HTTP_ACCEPT_ENCODING', ''))
+            for encoding, suffix in ENCODINGS:
+                candidate = full_path + suffix
+                if encoding in accepted and os.path.isfile(candidate) \
+                        and os.stat(candidate).st_mtime_ns >= os.stat(full_path).st_mtime_ns:
+                    full_path = candidate
+                    headers.append(('Content-Encoding', encoding))
+                    break
+
+        stat = os.stat(full_path)
+        etag = f'"{manifest.digest(filename)}-{os.path.splitext(full_path)[1].lstrip(".")}"'
+        max_age = IMMUTABLE_MAX_AGE if immutable else DEFAULT_MAX_AGE
+        headers += [
+            ('Content-Type', _MIME_TYPES.get(ext, 'application/octet-stream')),
+            ('Cache-Control', f'public, max-age={max_age}' + (', immutable' if immutable else '')),
+            ('ETag', etag),
+            ('Last-Modified', formatdate(stat.st_mtime, usegmt=True)),
+        ]
+
+        if etag in environ.get('HTTP_IF_NONE_MATCH', ''):
+            start_response('304 Not Modified', headers)
+            return []
+        headers.append(('Content-Length', str(stat.st_size)))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        # wrap_file usa o sendfile do servidor (gunicorn) quando disponível
+        return wrap_file(environ, open(full_path, 'rb'))